@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -11,10 +11,21 @@ import {
 } from 'react-native';
 import { apiService } from '../services/api';
 
+const COMMENTS_PAGE_SIZE = 20;
+
+// Свой комментарий может прийти и из ответа, и из потока событий
+const prependComments = (fresh, current) => {
+  const known = new Set(current.map(comment => comment.id));
+  return [...fresh.filter(comment => !known.has(comment.id)), ...current];
+};
+
 export default function ArticleScreen({ route, navigation }) {
   const { slug, onArticleUpdate } = route.params || {};
   const [article, setArticle] = useState(null);
   const [comments, setComments] = useState([]);
+  const [commentsCursor, setCommentsCursor] = useState(null);
+  const [commentsSince, setCommentsSince] = useState(null);
+  const [moreCommentsLoading, setMoreCommentsLoading] = useState(false);
   const [newComment, setNewComment] = useState('');
   const [loading, setLoading] = useState(true);
   const [commentLoading, setCommentLoading] = useState(false);
@@ -32,8 +43,10 @@ export default function ArticleScreen({ route, navigation }) {
       const articleData = await apiService.getArticle(slug);
       setArticle(articleData);
       
-      const commentsData = await apiService.getComments(slug);
-      setComments(commentsData);
+      const commentsPage = await apiService.getComments(slug, { limit: COMMENTS_PAGE_SIZE });
+      setComments(commentsPage.comments);
+      setCommentsCursor(commentsPage.next_cursor);
+      setCommentsSince(commentsPage.since_cursor);
     } catch (error) {
       console.error('Error loading article:', error);
       Alert.alert('Ошибка', 'Не удалось загрузить статью');
@@ -47,6 +60,80 @@ export default function ArticleScreen({ route, navigation }) {
     loadArticle();
   }, [slug]);
 
+  // Следующая страница более старых комментариев
+  const loadMoreComments = async () => {
+    if (!commentsCursor || moreCommentsLoading) {
+      return;
+    }
+    try {
+      setMoreCommentsLoading(true);
+      const commentsPage = await apiService.getComments(slug, {
+        limit: COMMENTS_PAGE_SIZE,
+        cursor: commentsCursor,
+      });
+      setComments(current => [...current, ...commentsPage.comments]);
+      setCommentsCursor(commentsPage.next_cursor);
+    } catch (error) {
+      console.error('Error loading comments:', error);
+    } finally {
+      setMoreCommentsLoading(false);
+    }
+  };
+
+  // Догружаем только комментарии новее тех, что уже на экране
+  const loadNewComments = async () => {
+    if (!commentsSince) {
+      const commentsPage = await apiService.getComments(slug, { limit: COMMENTS_PAGE_SIZE });
+      setComments(commentsPage.comments);
+      setCommentsCursor(commentsPage.next_cursor);
+      setCommentsSince(commentsPage.since_cursor);
+      return commentsPage.comments.length;
+    }
+
+    let since = commentsSince;
+    let fresh = [];
+    let hasMore = true;
+    while (hasMore) {
+      const commentsPage = await apiService.getComments(slug, { since, limit: COMMENTS_PAGE_SIZE });
+      fresh = [...commentsPage.comments, ...fresh];
+      since = commentsPage.since_cursor;
+      hasMore = commentsPage.has_more;
+    }
+    setComments(current => prependComments(fresh, current));
+    setCommentsSince(since);
+    return fresh.length;
+  };
+
+  // События статьи от сервера: счетчики приходят готовыми, комментарий - целиком
+  const handleEvent = (event) => {
+    if (event.type === 'like') {
+      setArticle(current => current && { ...current, likes_count: event.likes_count });
+    } else if (event.type === 'comment') {
+      setArticle(current => current && { ...current, comments_count: event.comments_count });
+      if (event.comment) {
+        setComments(current => prependComments([event.comment], current));
+      } else {
+        loadNewComments().catch(error => console.error('Error loading comments:', error));
+      }
+    } else if (event.type === 'resync') {
+      apiService.getArticle(slug)
+        .then(articleData => setArticle(articleData))
+        .catch(error => console.error('Error loading article:', error));
+      loadNewComments().catch(error => console.error('Error loading comments:', error));
+    }
+  };
+
+  // Подписка живет, пока открыт экран; обработчик берем из ref, чтобы видеть свежее состояние
+  const eventHandlerRef = useRef(handleEvent);
+  eventHandlerRef.current = handleEvent;
+
+  useEffect(() => {
+    if (!slug) {
+      return undefined;
+    }
+    return apiService.subscribeEvents({ article: slug }, event => eventHandlerRef.current(event));
+  }, [slug]);
+
   const handleLike = async () => {
     try {
       setLikeLoading(true);
@@ -82,14 +169,13 @@ export default function ArticleScreen({ route, navigation }) {
       await apiService.addComment(slug, newComment.trim());
       setNewComment('');
       
-      // Перезагружаем комментарии
-      const commentsData = await apiService.getComments(slug);
-      setComments(commentsData);
+      // Догружаем новые комментарии, включая свой
+      const added = await loadNewComments();
       
       if (article) {
         setArticle({
           ...article,
-          comments_count: commentsData.length
+          comments_count: (article.comments_count || 0) + added
         });
       }
       
@@ -164,7 +250,7 @@ export default function ArticleScreen({ route, navigation }) {
 
       {/* Комментарии */}
       <View style={styles.commentsSection}>
-        <Text style={styles.commentsTitle}>Комментарии ({comments.length})</Text>
+        <Text style={styles.commentsTitle}>Комментарии ({article.comments_count ?? comments.length})</Text>
         
         {/* Форма добавления комментария */}
         <View style={styles.commentForm}>
@@ -200,6 +286,20 @@ export default function ArticleScreen({ route, navigation }) {
           </View>
         ))}
 
+        {commentsCursor && (
+          <TouchableOpacity
+            style={styles.moreCommentsButton}
+            onPress={loadMoreComments}
+            disabled={moreCommentsLoading}
+          >
+            {moreCommentsLoading ? (
+              <ActivityIndicator size="small" color="#007AFF" />
+            ) : (
+              <Text style={styles.moreCommentsText}>Показать более ранние</Text>
+            )}
+          </TouchableOpacity>
+        )}
+
         {comments.length === 0 && (
           <Text style={styles.noComments}>Пока нет комментариев. Будьте первым!</Text>
         )}
@@ -358,4 +458,12 @@ const styles = StyleSheet.create({
     marginTop: 20,
     padding: 20,
   },
+  moreCommentsButton: {
+    alignItems: 'center',
+    padding: 12,
+  },
+  moreCommentsText: {
+    color: '#007AFF',
+    fontSize: 14,
+  },
 });
\ No newline at end of file
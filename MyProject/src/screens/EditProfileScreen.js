@@ -12,7 +12,7 @@ import {
 } from 'react-native';
 import { useNavigation } from '@react-navigation/native';
 import * as ImagePicker from 'expo-image-picker';
-import { apiService } from '../services/api';
+import { apiService, mediaUrl } from '../services/api';
 
 export default function EditProfileScreen({ route }) {
   const navigation = useNavigation();
@@ -140,7 +140,7 @@ export default function EditProfileScreen({ route }) {
           <Text style={styles.label}>Аватар</Text>
           <View style={styles.avatarContainer}>
             {photo ? (
-              <Image source={{ uri: photo }} style={styles.avatar} />
+              <Image source={{ uri: mediaUrl(photo, 160) }} style={styles.avatar} />
             ) : (
               <View style={styles.avatarPlaceholder}>
                 <Text style={styles.avatarPlaceholderText}>
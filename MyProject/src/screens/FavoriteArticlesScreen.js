@@ -9,7 +9,7 @@ import {
   Image,
 } from 'react-native';
 import { useNavigation } from '@react-navigation/native';
-import { apiService } from '../services/api';
+import { apiService, mediaUrl } from '../services/api';
 
 export default function FavoriteArticlesScreen() {
   const navigation = useNavigation();
@@ -44,7 +44,7 @@ export default function FavoriteArticlesScreen() {
     >
       {item.photo && (
         <Image 
-          source={{ uri: item.photo }} 
+          source={{ uri: mediaUrl(item.photo, 480) }} 
           style={styles.articleImage}
         />
       )}
@@ -54,7 +54,7 @@ export default function FavoriteArticlesScreen() {
           {item.author_name} • {new Date(item.created_at).toLocaleDateString('ru-RU')}
         </Text>
         <Text style={styles.articleExcerpt} numberOfLines={2}>
-          {item.content}
+          {item.excerpt}
         </Text>
         <View style={styles.articleStats}>
           <Text style={styles.stat}>👁️ {item.views || 0}</Text>
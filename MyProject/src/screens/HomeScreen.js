@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   View,
   Text,
@@ -12,7 +12,7 @@ import {
   Modal,
   ScrollView,
 } from 'react-native';
-import { apiService } from '../services/api';
+import { apiService, mediaUrl } from '../services/api';
 
 export default function HomeScreen({ navigation, route }) {
   const [articles, setArticles] = useState([]);
@@ -21,12 +21,16 @@ export default function HomeScreen({ navigation, route }) {
   const [refreshing, setRefreshing] = useState(false);
   const [error, setError] = useState(null);
   const [lastUpdate, setLastUpdate] = useState(Date.now());
+  // Токен дельта-синхронизации: после первой загрузки обновляем только изменившиеся статьи
+  const syncTokenRef = useRef(null);
   
   // Состояния для фильтров
   const [searchQuery, setSearchQuery] = useState('');
   const [selectedCategory, setSelectedCategory] = useState('all');
   const [sortBy, setSortBy] = useState('newest');
   const [showFilters, setShowFilters] = useState(false);
+  // Результаты серверного поиска по полному тексту, пока запрос не пустой
+  const [searchResults, setSearchResults] = useState(null);
   
   // Список категорий
   const categories = [
@@ -46,8 +50,11 @@ export default function HomeScreen({ navigation, route }) {
     try {
       setError(null);
       console.log('🔄 Loading articles...');
+      // Токен берем до загрузки: изменения во время загрузки придут при следующей синхронизации
+      const { sync_token } = await apiService.getArticleChanges();
       const data = await apiService.getArticles();
       console.log('✅ Loaded articles:', data.length);
+      syncTokenRef.current = sync_token;
       setArticles(data);
       setLastUpdate(Date.now());
     } catch (err) {
@@ -59,19 +66,71 @@ export default function HomeScreen({ navigation, route }) {
     }
   };
 
-  // Фильтрация и сортировка статей
-  useEffect(() => {
-    let filtered = [...articles];
+  // Догружает только изменения с прошлой синхронизации
+  const syncArticles = async () => {
+    if (!syncTokenRef.current) {
+      return loadArticles();
+    }
 
-    // Фильтрация по поисковому запросу
-    if (searchQuery.trim()) {
-      const query = searchQuery.toLowerCase().trim();
-      filtered = filtered.filter(article => 
-        article.title.toLowerCase().includes(query) ||
-        article.content.toLowerCase().includes(query) ||
-        article.author_name.toLowerCase().includes(query)
-      );
+    try {
+      setError(null);
+      let token = syncTokenRef.current;
+      let hasMore = true;
+      const changed = new Map();
+      const deleted = new Set();
+      while (hasMore) {
+        const changes = await apiService.getArticleChanges(token);
+        changes.articles.forEach(article => changed.set(article.id, article));
+        changes.deleted.forEach(id => deleted.add(id));
+        token = changes.sync_token;
+        hasMore = changes.has_more;
+      }
+      console.log('✅ Synced articles:', changed.size, 'changed,', deleted.size, 'deleted');
+
+      syncTokenRef.current = token;
+      setArticles(current => [
+        ...[...changed.values()].filter(article => !deleted.has(article.id)),
+        ...current.filter(article => !changed.has(article.id) && !deleted.has(article.id)),
+      ]);
+      setLastUpdate(Date.now());
+    } catch (err) {
+      console.error('❌ Error syncing articles:', err);
+      syncTokenRef.current = null;
+      return loadArticles();
+    } finally {
+      setLoading(false);
+      setRefreshing(false);
     }
+  };
+
+  // Поиск идет на сервере (GET /api/articles/search): в списке есть только анонсы статей
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const data = await apiService.searchArticles(query, { limit: 100 });
+        if (!cancelled) setSearchResults(data.articles);
+      } catch (err) {
+        console.error('❌ Error searching articles:', err);
+        if (!cancelled) setSearchResults([]);
+      }
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, lastUpdate]);
+
+  // Фильтрация и сортировка статей
+  useEffect(() => {
+    // При непустом запросе показываем найденные сервером статьи
+    let filtered = searchQuery.trim() ? [...(searchResults || [])] : [...articles];
 
     // Фильтрация по категории
     if (selectedCategory !== 'all') {
@@ -99,31 +158,50 @@ export default function HomeScreen({ navigation, route }) {
     });
 
     setFilteredArticles(filtered);
-  }, [articles, searchQuery, selectedCategory, sortBy]);
+  }, [articles, searchResults, searchQuery, selectedCategory, sortBy]);
 
   useEffect(() => {
     loadArticles();
   }, []);
 
+  // События ленты: счетчики обновляем на месте, новые статьи догружаем синхронизацией
+  const handleFeedEvent = (event) => {
+    if (event.type === 'like' || event.type === 'comment') {
+      const counter = event.type === 'like'
+        ? { likes_count: event.likes_count }
+        : { comments_count: event.comments_count };
+      setArticles(current => current.map(article =>
+        article.id === event.article_id ? { ...article, ...counter } : article
+      ));
+    } else if (event.type === 'article' || event.type === 'resync') {
+      syncArticles();
+    }
+  };
+
+  const feedEventHandlerRef = useRef(handleFeedEvent);
+  feedEventHandlerRef.current = handleFeedEvent;
+
+  useEffect(() => apiService.subscribeEvents({}, event => feedEventHandlerRef.current(event)), []);
+
   // Обновляем статьи при возврате с других экранов
   useEffect(() => {
     console.log('🔄 Route params changed:', route.params);
     if (route.params?.refresh) {
       console.log('🔄 Refreshing articles from route params');
-      loadArticles();
+      syncArticles();
     }
   }, [route.params?.refresh]);
 
   const onRefresh = () => {
     console.log('🔄 Manual refresh...');
     setRefreshing(true);
-    loadArticles();
+    syncArticles();
   };
 
   const navigateToArticle = (slug) => {
     navigation.navigate('Article', { 
       slug: slug,
-      onArticleUpdate: loadArticles
+      onArticleUpdate: syncArticles
     });
   };
 
@@ -165,7 +243,7 @@ export default function HomeScreen({ navigation, route }) {
       onPress={() => navigateToArticle(item.slug)}
     >
       {item.photo && (
-        <Image source={{ uri: item.photo }} style={styles.articleImage} />
+        <Image source={{ uri: mediaUrl(item.photo, 480) }} style={styles.articleImage} />
       )}
       <View style={styles.articleContent}>
         {item.category && (
@@ -176,7 +254,7 @@ export default function HomeScreen({ navigation, route }) {
           {item.author_name} • {new Date(item.created_at).toLocaleDateString('ru-RU')}
         </Text>
         <Text style={styles.articleExcerpt} numberOfLines={2}>
-          {item.content}
+          {item.excerpt}
         </Text>
         <View style={styles.articleStats}>
           <Text style={styles.stat}>👁️ {item.views || 0}</Text>
@@ -10,7 +10,7 @@ import {
   Alert,
 } from 'react-native';
 import { useNavigation, useFocusEffect } from '@react-navigation/native';
-import { apiService } from '../services/api';
+import { apiService, mediaUrl } from '../services/api';
 
 export default function MyArticlesScreen() {
   const navigation = useNavigation();
@@ -50,8 +50,15 @@ export default function MyArticlesScreen() {
     loadMyArticles();
   };
 
-  const handleEditArticle = (article) => {
-    navigation.navigate('EditArticle', { article });
+  const handleEditArticle = async (article) => {
+    try {
+      // В списке только анонс, полный текст для редактирования загружаем отдельно
+      const fullArticle = await apiService.getArticle(article.slug);
+      navigation.navigate('EditArticle', { article: fullArticle });
+    } catch (error) {
+      console.error('Error loading article:', error);
+      Alert.alert('Ошибка', 'Не удалось загрузить статью');
+    }
   };
 
   const handleViewArticle = (article) => {
@@ -88,7 +95,7 @@ export default function MyArticlesScreen() {
     <View style={styles.articleCard}>
       {item.photo && (
         <Image 
-          source={{ uri: item.photo }} 
+          source={{ uri: mediaUrl(item.photo, 480) }} 
           style={styles.articleImage}
         />
       )}
@@ -99,7 +106,7 @@ export default function MyArticlesScreen() {
           {item.category && ` • ${item.category}`}
         </Text>
         <Text style={styles.articleExcerpt} numberOfLines={2}>
-          {item.content}
+          {item.excerpt}
         </Text>
         <View style={styles.articleStats}>
           <Text style={styles.stat}>👁️ {item.views || 0}</Text>
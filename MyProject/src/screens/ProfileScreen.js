@@ -10,7 +10,7 @@ import {
   Image,
 } from 'react-native';
 import { useNavigation, useFocusEffect } from '@react-navigation/native';
-import { apiService } from '../services/api';
+import { apiService, mediaUrl } from '../services/api';
 
 export default function ProfileScreen({ onLogout }) {
   const navigation = useNavigation();
@@ -23,17 +23,37 @@ export default function ProfileScreen({ onLogout }) {
     favoritesCount: 0
   });
 
-  // Загрузка данных пользователя
+  // Загрузка профиля и статистики одним пакетным запросом
   const loadUserData = async () => {
     try {
       setLoading(true);
       console.log('🔄 Loading user data...');
-      const userData = await apiService.getCurrentUser();
+      const results = await apiService.batch([
+        { id: 'profile', path: '/users/profile' },
+        { id: 'articles', path: '/users/articles?fields=id' },
+        { id: 'likes', path: '/users/likes' },
+        { id: 'comments', path: '/users/comments' },
+        { id: 'favorites', path: '/users/favorites?fields=id' },
+      ]);
+
+      if (results.profile.status !== 200) {
+        throw new Error(`HTTP error! status: ${results.profile.status}`);
+      }
+      const userData = results.profile.body;
       console.log('✅ User data loaded:', userData);
       setUser(userData);
-      
-      // Загружаем дополнительную статистику
-      await loadUserStatistics();
+
+      // Если отдельный список не загрузился, берем счетчик из профиля
+      const count = (result, fallback) =>
+        result.status === 200 ? result.body.length || 0 : fallback || 0;
+      const statistics = {
+        articlesCount: count(results.articles, userData.articles_count),
+        likesCount: count(results.likes, userData.likes_count),
+        commentsCount: count(results.comments, userData.comments_count),
+        favoritesCount: count(results.favorites, 0),
+      };
+      console.log('✅ Statistics loaded:', statistics);
+      setStats(statistics);
       
     } catch (error) {
       console.error('❌ Error loading user data:', error);
@@ -46,53 +66,6 @@ export default function ProfileScreen({ onLogout }) {
     }
   };
 
-  // Загрузка статистики пользователя
-  const loadUserStatistics = async () => {
-    try {
-      console.log('🔄 Loading user statistics...');
-      
-      // Загрузка количества статей пользователя
-      const userArticles = await apiService.getUserArticles();
-      const articlesCount = userArticles.length || 0;
-
-      // Загрузка количества лайков пользователя
-      const userLikes = await apiService.getUserLikes();
-      const likesCount = userLikes.length || 0;
-
-      // Загрузка количества комментариев пользователя
-      const userComments = await apiService.getUserComments();
-      const commentsCount = userComments.length || 0;
-
-      // Загрузка понравившихся статей
-      const favoriteArticles = await apiService.getFavoriteArticles();
-      const favoritesCount = favoriteArticles.length || 0;
-
-      console.log('✅ Statistics loaded:', {
-        articlesCount,
-        likesCount,
-        commentsCount,
-        favoritesCount
-      });
-
-      setStats({
-        articlesCount,
-        likesCount,
-        commentsCount,
-        favoritesCount
-      });
-
-    } catch (error) {
-      console.error('❌ Error loading statistics:', error);
-      // Используем базовые данные если API не доступно
-      setStats({
-        articlesCount: user?.articles_count || 0,
-        likesCount: user?.likes_count || 0,
-        commentsCount: user?.comments_count || 0,
-        favoritesCount: 0
-      });
-    }
-  };
-
   // Обновляем данные при фокусе на экране
   useFocusEffect(
     React.useCallback(() => {
@@ -215,7 +188,7 @@ export default function ProfileScreen({ onLogout }) {
       <View style={styles.header}>
         <View style={styles.avatar}>
           {user.photo ? (
-            <Image source={{ uri: user.photo }} style={styles.avatarImage} />
+            <Image source={{ uri: mediaUrl(user.photo, 160) }} style={styles.avatarImage} />
           ) : (
             <Text style={styles.avatarText}>
               {user.username ? user.username.charAt(0).toUpperCase() : 'U'}
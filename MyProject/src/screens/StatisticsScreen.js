@@ -39,13 +39,6 @@ const SimpleBarChart = ({ data }) => {
   );
 };
 
-// Функция для получения номера недели в году
-const getWeekNumber = (date) => {
-  const firstDayOfYear = new Date(date.getFullYear(), 0, 1);
-  const pastDaysOfYear = (date - firstDayOfYear) / 86400000;
-  return Math.ceil((pastDaysOfYear + firstDayOfYear.getDay() + 1) / 7);
-};
-
 // Функция для форматирования дат недели
 const formatWeekRange = (startDate, endDate) => {
   const formatDate = (date) => {
@@ -80,57 +73,19 @@ export default function StatisticsScreen() {
     try {
       setLoading(true);
       
-      // Получаем статьи пользователя
-      const userArticles = await apiService.getUserArticles();
-      
-      // Группируем по неделям
-      const articlesByWeek = {};
-      
-      userArticles.forEach(article => {
-        const date = new Date(article.created_at);
-        const { start, end } = getWeekStartEnd(date);
-        const weekKey = `${start.getFullYear()}-${getWeekNumber(start)}`;
-        const weekRange = formatWeekRange(start, end);
-        
-        if (!articlesByWeek[weekKey]) {
-          articlesByWeek[weekKey] = {
-            week: weekRange,
-            count: 0,
-            startDate: start,
-            year: start.getFullYear(),
-            weekNumber: getWeekNumber(start)
-          };
-        }
-        articlesByWeek[weekKey].count++;
+      // Сервер сам группирует статьи по неделям (последние 8 недель)
+      const profile = await apiService.getCurrentUser();
+      const stats = await apiService.getUserStatistics(profile.id, { bucket: 'week' });
+
+      const statsData = stats.periods.map((period, index) => {
+        const { start, end } = getWeekStartEnd(new Date(`${period}T00:00:00`));
+        return {
+          week: formatWeekRange(start, end),
+          count: stats.articles[index],
+          startDate: start
+        };
       });
       
-      // Преобразуем в массив и сортируем по дате
-      const statsData = Object.values(articlesByWeek)
-        .sort((a, b) => a.startDate - b.startDate);
-      
-      // Если нет данных, показываем последние 8 недель
-      if (statsData.length === 0) {
-        const currentDate = new Date();
-        
-        for (let i = 7; i >= 0; i--) {
-          const date = new Date(currentDate);
-          date.setDate(date.getDate() - i * 7);
-          const { start, end } = getWeekStartEnd(date);
-          const weekRange = formatWeekRange(start, end);
-          
-          statsData.push({
-            week: weekRange,
-            count: 0,
-            startDate: start
-          });
-        }
-      } else {
-        // Показываем только последние 8 недель для лучшей читаемости
-        const recentWeeks = statsData.slice(-8);
-        setStatistics(recentWeeks);
-        return;
-      }
-      
       setStatistics(statsData);
       
     } catch (error) {
@@ -163,17 +118,15 @@ export default function StatisticsScreen() {
 
   const generateAIAnalytics = async () => {
     try {
-      const userArticles = await apiService.getUserArticles();
-      
+      // Сервер считает аналитику по своим данным, статьи отправлять не нужно
       const analytics = await apiService.generateAIAnalytics({
-        articles: userArticles,
         period: 'all_time'
       });
 
       // Показываем AI-аналитику
       Alert.alert(
         '🤖 AI Аналитика вашего контента',
-        `На основе анализа ваших ${userArticles.length} статей:\n\n` +
+        `На основе анализа ваших ${analytics.stats.total_articles} статей:\n\n` +
         `📊 ${analytics.insights}\n\n` +
         `💡 ${analytics.recommendations}`,
         [{ text: 'Понятно' }]
@@ -1,8 +1,19 @@
 const API_BASE_URL = 'http://192.168.1.3:5000/api'; 
+const SERVER_URL = API_BASE_URL.replace(/\/api$/, '');
+
+// Ссылки на хранилище (/api/media/...) превращаем в полный URL, при необходимости с миниатюрой
+export const mediaUrl = (photo, size) => {
+  if (!photo || !photo.startsWith('/api/media/')) {
+    return photo;
+  }
+  return size ? `${SERVER_URL}${photo}?size=${size}` : `${SERVER_URL}${photo}`;
+};
 
 class ApiService {
   constructor() {
     this.token = null;
+    // Кэш GET-ответов по ETag: url -> { etag, data }
+    this.etagCache = new Map();
   }
 
   async request(endpoint, options = {}) {
@@ -27,10 +38,26 @@ class ApiService {
       config.body = JSON.stringify(options.body);
     }
 
+    // Для FormData заголовок с boundary выставит сам fetch
+    if (options.body instanceof FormData) {
+      delete config.headers['Content-Type'];
+    }
+
+    // Отправляем валидатор, чтобы сервер мог ответить 304 без тела
+    const isGet = !config.method || config.method === 'GET';
+    const cached = isGet ? this.etagCache.get(url) : null;
+    if (cached) {
+      config.headers['If-None-Match'] = cached.etag;
+    }
+
     try {
       const response = await fetch(url, config);
       
       console.log('📡 Response status:', response.status);
+
+      if (response.status === 304 && cached) {
+        return cached.data;
+      }
       
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
@@ -38,6 +65,11 @@ class ApiService {
 
       const data = await response.json();
       console.log('✅ Response data:', data);
+
+      const etag = response.headers.get('ETag');
+      if (isGet && etag) {
+        this.etagCache.set(url, { etag, data });
+      }
       return data;
       
     } catch (error) {
@@ -87,14 +119,148 @@ class ApiService {
     return result;
   }
 
+  // Отзывает токен на сервере и очищает его локально
+  async logout() {
+    try {
+      await this.request('/logout', { method: 'POST' });
+    } finally {
+      this.clearToken();
+    }
+  }
+
+  // Несколько вызовов за один сетевой обход: [{ id, path, method, body }] -> { id: { status, body } }.
+  // Изменяющие подзапросы сервер выполняет только при allowWrites
+  async batch(requests, { allowWrites = false } = {}) {
+    const cachedItems = requests.map(item =>
+      !item.method || item.method === 'GET' ? this.etagCache.get(`${API_BASE_URL}${item.path}`) : null
+    );
+
+    const result = await this.request('/batch', {
+      method: 'POST',
+      body: {
+        allow_writes: allowWrites,
+        requests: requests.map((item, index) => ({
+          id: item.id,
+          method: item.method || 'GET',
+          path: `/api${item.path}`,
+          body: item.body,
+          if_none_match: cachedItems[index]?.etag,
+        })),
+      },
+    });
+
+    const responses = {};
+    result.responses.forEach((response, index) => {
+      const cached = cachedItems[index];
+      const url = `${API_BASE_URL}${requests[index].path}`;
+      if (response.status === 304 && cached) {
+        responses[response.id] = { status: 200, body: cached.data };
+        return;
+      }
+      if (response.etag && response.status === 200) {
+        this.etagCache.set(url, { etag: response.etag, data: response.body });
+      }
+      responses[response.id] = response;
+    });
+    return responses;
+  }
+
   // Users
   async getCurrentUser() {
     return this.request('/users/profile');
   }
 
+  // Собирает query string, пропуская пустые значения
+  buildQuery(params = {}) {
+    const query = Object.entries(params)
+      .filter(([, value]) => value !== undefined && value !== null && value !== '')
+      .map(([key, value]) => `${encodeURIComponent(key)}=${encodeURIComponent(value)}`)
+      .join('&');
+    return query ? `?${query}` : '';
+  }
+
   // Articles
-  async getArticles() {
-    return this.request('/articles');
+  // С параметрами { limit, cursor } возвращает { articles, next_cursor }
+  async getArticles(params) {
+    return this.request(`/articles${this.buildQuery(params)}`);
+  }
+
+  // Изменения ленты после токена: { articles, deleted, sync_token, has_more }.
+  // Без токена возвращает только sync_token для следующей синхронизации.
+  // Изменение одних просмотров (views) статью в изменения не добавляет
+  async getArticleChanges(since, params = {}) {
+    return this.request(`/articles/changes${this.buildQuery({ since, ...params })}`);
+  }
+
+  // Поток событий (SSE): { article } - события одной статьи, без параметров - всей ленты.
+  // onEvent получает { type: 'comment' | 'like' | 'article' | 'resync', ... }.
+  // Возвращает функцию отписки. Сервер без асинхронного режима отвечает 404 - тогда молча выходим
+  subscribeEvents(params, onEvent) {
+    const url = `${API_BASE_URL}/events${this.buildQuery(params)}`;
+    let xhr = null;
+    let offset = 0;
+    let retryDelay = 5000;
+    let retryTimer = null;
+    let stopped = false;
+
+    const connect = () => {
+      xhr = new XMLHttpRequest();
+      offset = 0;
+      xhr.open('GET', url);
+      xhr.setRequestHeader('Accept', 'text/event-stream');
+      xhr.onprogress = () => {
+        // Разбираем только завершенные события (до пустой строки)
+        const end = xhr.responseText.lastIndexOf('\n\n');
+        if (end < offset) {
+          return;
+        }
+        const chunk = xhr.responseText.slice(offset, end);
+        offset = end + 2;
+        chunk.split('\n\n').forEach((block) => {
+          block.split('\n').forEach((line) => {
+            if (line.startsWith('retry: ')) {
+              retryDelay = parseInt(line.slice(7), 10) || retryDelay;
+            } else if (line.startsWith('data: ')) {
+              try {
+                onEvent(JSON.parse(line.slice(6)));
+              } catch (error) {
+                console.error('❌ Event parse failed:', error);
+              }
+            }
+          });
+        });
+      };
+      const reconnect = () => {
+        if (stopped || xhr.status === 404) {
+          return;
+        }
+        // За время обрыва события могли пропасть - пусть экран перечитает данные
+        onEvent({ type: 'resync' });
+        retryTimer = setTimeout(connect, retryDelay);
+      };
+      xhr.onerror = reconnect;
+      xhr.onload = reconnect;
+      xhr.send();
+    };
+
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      if (xhr) {
+        xhr.abort();
+      }
+    };
+  }
+
+  // Полнотекстовый поиск на сервере: { articles, next_cursor }
+  async searchArticles(q, params = {}) {
+    return this.request(`/articles/search${this.buildQuery({ q, ...params })}`);
+  }
+
+  // Статьи рядом: { lat, lng, radius (м), limit, cursor }
+  async getNearbyArticles(params) {
+    return this.request(`/articles/nearby${this.buildQuery(params)}`);
   }
 
   async getArticle(slug) {
@@ -104,13 +270,32 @@ class ApiService {
   async createArticle(articleData) {
     return this.request('/articles', {
       method: 'POST',
-      body: articleData,
+      body: { ...articleData, photo: await this.uploadPhoto(articleData.photo) },
     });
   }
 
+  // Загружает локальное фото в хранилище и возвращает ссылку на него
+  async uploadPhoto(photo) {
+    if (!photo || photo.startsWith('/api/media/') || photo.startsWith('http')) {
+      return photo;
+    }
+
+    let result;
+    if (photo.startsWith('data:')) {
+      result = await this.request('/media', { method: 'POST', body: { data: photo } });
+    } else {
+      const form = new FormData();
+      form.append('file', { uri: photo, name: 'photo.jpg', type: 'image/jpeg' });
+      result = await this.request('/media', { method: 'POST', body: form });
+    }
+    return result.photo;
+  }
+
   // Comments
-  async getComments(slug) {
-    return this.request(`/articles/${slug}/comments`);
+  // С параметрами { limit, cursor } или { since } возвращает
+  // { comments, next_cursor, since_cursor, has_more }
+  async getComments(slug, params) {
+    return this.request(`/articles/${slug}/comments${this.buildQuery(params)}`);
   }
 
   async addComment(slug, text) {
@@ -131,7 +316,7 @@ class ApiService {
   async updateProfile(profileData) {
     return this.request('/users/profile', {
       method: 'PUT',
-      body: profileData,
+      body: { ...profileData, photo: await this.uploadPhoto(profileData.photo) },
     });
   }
 
@@ -151,6 +336,7 @@ class ApiService {
   // Очистка токена
   clearToken() {
     this.token = null;
+    this.etagCache.clear();
     if (typeof window !== 'undefined' && window.localStorage) {
       localStorage.removeItem('authToken');
     }
@@ -176,13 +362,13 @@ class ApiService {
     return this.request(`/users/${userId}/statistics`);
   }
 
-  async getFavoriteArticles() {
-    return this.request('/users/favorites');
+  async getFavoriteArticles(params) {
+    return this.request(`/users/favorites${this.buildQuery(params)}`);
   }
 
   // Получение статей пользователя
-  async getUserArticles() {
-    return this.request('/users/articles');
+  async getUserArticles(params) {
+    return this.request(`/users/articles${this.buildQuery(params)}`);
   }
 
   // Получение лайков пользователя
@@ -195,9 +381,9 @@ class ApiService {
     return this.request('/users/comments');
   }
 
-  // Получение статистики пользователя
-  async getUserStatistics(userId) {
-    return this.request(`/users/${userId}/statistics`);
+  // Получение статистики пользователя: { bucket, from, to }
+  async getUserStatistics(userId, params) {
+    return this.request(`/users/${userId}/statistics${this.buildQuery(params)}`);
   }
 
   // В api.js добавьте эти методы:
@@ -206,7 +392,7 @@ class ApiService {
   async updateArticle(slug, articleData) {
     return this.request(`/articles/${slug}`, {
       method: 'PUT',
-      body: articleData,
+      body: { ...articleData, photo: await this.uploadPhoto(articleData.photo) },
     });
   }
 
@@ -218,11 +404,27 @@ class ApiService {
   }
 
   // AI методы в api.js
+  // Генерация идет на сервере в фоне: ставим задачу и опрашиваем ее, пока не будет результата.
+  // Повторный запрос той же темы сервер отдает из кэша сразу со статусом done
   async generateAIContent(params) {
-    return this.request('/ai/generate-article', {
+    let job = await this.request('/ai/generate-article', {
       method: 'POST',
       body: params,
     });
+    let delay = 500;
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, delay));
+      delay = Math.min(delay * 1.5, 3000);
+      job = await this.getAIJob(job.job_id);
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Не удалось сгенерировать статью');
+    }
+    return job;
+  }
+
+  async getAIJob(jobId) {
+    return this.request(`/ai/jobs/${jobId}`);
   }
 
   async generateAIAnalytics(params) {
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class GenerationQueueFull(Exception):
+    pass
+
+
+WORD_COUNTS = {
+    'short': '100-200',
+    'medium': '300-500',
+    'long': '500+'
+}
+
+
+class FakeArticleGenerator:
+    # Локальный генератор без внешнего API: для разработки и проверок.
+    # delay имитирует время ответа настоящей модели
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def generate(self, topic, style, length):
+        if self.delay:
+            time.sleep(self.delay)
+
+        content = f"""# {topic}
+
+Это демонстрационная статья, сгенерированная искусственным интеллектом. В реальном приложении здесь был бы уникальный контент, созданный нейросетью.
+
+## Основные аспекты темы
+
+Статья написана в {style} стиле и содержит примерно {WORD_COUNTS.get(length, '300-500')} слов. ИИ анализирует тему и создает релевантный контент с учетом выбранного стиля написания.
+
+## Ключевые преимущества AI-генерации
+
+• Уникальный контент
+• Быстрое создание
+• Различные стили написания
+• Адаптация под целевую аудиторию
+
+## Заключение
+
+Искусственный интеллект открывает новые возможности для создания качественного контента."""
+
+        return {'title': f'AI Статья: {topic}', 'content': content}
+
+
+class GenerationWorkerPool:
+    # Генерация ждет ответа модели по сети, поэтому хватает потоков. Очередь ограничена:
+    # лишние задачи отклоняются сразу, а не копятся в памяти воркера
+    def __init__(self, generator, max_workers=4, queue_limit=100):
+        self.generator = generator
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-generation')
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def owned_by_current_process(self):
+        return self._pid == os.getpid()
+
+    def reserve(self):
+        # Место в очереди берется до создания задачи в БД, чтобы не оставлять ее без исполнителя
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise GenerationQueueFull('Очередь генерации переполнена')
+        with self._lock:
+            self._pending += 1
+
+    def release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args):
+        # Вызывается только после reserve(); место освобождается по завершении задачи
+        def run():
+            try:
+                fn(*args)
+            finally:
+                with self._lock:
+                    self.completed += 1
+                self.release()
+        return self._executor.submit(run)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'generator': type(self.generator).__name__,
+                'max_workers': self.max_workers,
+                'queue_limit': self.queue_limit,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,8 +1,7 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, send_file, abort, stream_with_context
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from werkzeug.security import generate_password_hash, check_password_hash
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from config import Config
 import os
 from datetime import datetime, timedelta
@@ -10,11 +9,40 @@ import unicodedata
 import re
 import secrets
 import jwt
+import threading
+import click
+import base64
+import csv
+import hashlib
+import io
+import json
+import time
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import HTTPException
+from werkzeug.utils import import_string
+from auth_cache import TTLCache, RevocationList, token_digest
+from db_pool import ConnectionPool, PoolTimeout, SharedConnection
+from view_buffer import ViewCounterBuffer, LikeCounterBuffer
+from password_hashing import PasswordHasher, HashingQueueFull
+from ai_jobs import GenerationWorkerPool, GenerationQueueFull
+from media_store import MediaStore, InvalidImage
+from json_provider import OrjsonProvider
+from compression import ResponseCompressor
 
 app = Flask(__name__)
 app.config.from_object(Config())
 app.config['SECRET_KEY'] = 'your-super-secret-jwt-key-2024'  # Ваш секретный ключ
-CORS(app, supports_credentials=True)
+CORS(app, supports_credentials=True, expose_headers=['ETag'])
+if app.config['JSON_PROVIDER'] == 'orjson':
+    app.json = OrjsonProvider(app)
+if app.config['COMPRESS_ENABLED']:
+    ResponseCompressor(
+        app,
+        min_size=app.config['COMPRESS_MIN_SIZE'],
+        gzip_level=app.config['COMPRESS_GZIP_LEVEL'],
+        brotli_quality=app.config['COMPRESS_BROTLI_QUALITY']
+    )
 
 
 # JWT функции
@@ -26,24 +54,86 @@ def generate_token(user_id):
     return jwt.encode(payload, app.config['SECRET_KEY'], algorithm='HS256')
 
 
+# Проверенные токены: digest -> (user_id, exp). Запись живет не дольше exp токена
+_token_cache = TTLCache(app.config['AUTH_CACHE_SIZE'], app.config['AUTH_CACHE_TTL'])
+_role_cache = TTLCache(app.config['AUTH_CACHE_SIZE'], app.config['AUTH_ROLE_CACHE_TTL'])
+
+
+def load_revoked_tokens():
+    conn = get_db_pool().getconn()
+    try:
+        cur = conn.cursor()
+        cur.execute('''
+            SELECT token_hash, EXTRACT(EPOCH FROM expires_at)
+            FROM revoked_tokens
+            WHERE expires_at > CURRENT_TIMESTAMP
+        ''')
+        rows = [(token_hash, float(exp)) for token_hash, exp in cur.fetchall()]
+        cur.close()
+        return rows
+    finally:
+        conn.close()
+
+
+_revoked_tokens = RevocationList(load_revoked_tokens, app.config['AUTH_REVOCATION_REFRESH'])
+
+
 def verify_token(token):
+    digest = token_digest(token)
+    if digest in _revoked_tokens:
+        return None
+
+    cached = _token_cache.get(digest)
+    if cached is not None:
+        return cached[0]
+
     try:
         payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-        return payload['user_id']
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
 
+    _token_cache.set(digest, (payload['user_id'], payload['exp']), expires_at=payload['exp'])
+    return payload['user_id']
+
+
+def revoke_token(token):
+    digest = token_digest(token)
+    cached = _token_cache.pop(digest)
+    if cached is not None:
+        exp = cached[1]
+    else:
+        try:
+            exp = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])['exp']
+        except jwt.InvalidTokenError:
+            return
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            INSERT INTO revoked_tokens (token_hash, expires_at)
+            VALUES (%s, to_timestamp(%s))
+            ON CONFLICT (token_hash) DO NOTHING
+        ''', (digest, exp))
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    _revoked_tokens.add(digest, exp)
+
+
+def get_bearer_token():
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.split(' ')[1]
+    return None
+
 
 # Middleware для проверки JWT токена
 def get_current_user():
-    token = None
-    if 'Authorization' in request.headers:
-        auth_header = request.headers['Authorization']
-        if auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-
+    token = get_bearer_token()
     if not token:
         return None
 
@@ -51,32 +141,73 @@ def get_current_user():
     return user_id
 
 
-def create_slug(text):
-    if not text:
-        return secrets.token_hex(8)
+def get_user_role(user_id):
+    role = _role_cache.get(user_id)
+    if role is None:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT role FROM users WHERE id = %s', (user_id,))
+            row = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
+        role = row[0] if row else None
+        if role is not None:
+            _role_cache.set(user_id, role)
+    return role
+
+
+# Декоратор для защищенных маршрутов: кладет id (и при with_role=True роль) пользователя в g
+def require_auth(view=None, *, with_role=False):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            user_id = get_current_user()
+            if not user_id:
+                return jsonify({'error': 'Не авторизован'}), 401
+            g.user_id = user_id
+            if with_role:
+                g.user_role = get_user_role(user_id)
+            return view(*args, **kwargs)
+        return wrapped
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+# Служебные маршруты (состояние пулов и буферов) доступны только администраторам
+def require_admin(view):
+    @wraps(view)
+    @require_auth(with_role=True)
+    def wrapped(*args, **kwargs):
+        if g.user_role != 'admin':
+            return jsonify({'error': 'Недостаточно прав'}), 403
+        return view(*args, **kwargs)
+    return wrapped
 
-    text = text.lower().strip()
 
-    cyrillic_map = {
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
-        'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
-        'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
-        'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
-        'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-    }
+# Транслитерация за один проход str.translate: кириллица -> латиница, пробел и _ -> дефис,
+# собственные дефисы заголовка выбрасываются (как и прочая пунктуация)
+SLUG_TRANSLATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    '-': '', ' ': '-', '_': '-',
+})
+SLUG_INVALID_RE = re.compile(r'[^\w-]|_')
+SLUG_DASHES_RE = re.compile(r'-+')
 
-    slug_chars = []
-    for char in text:
-        if char in cyrillic_map:
-            slug_chars.append(cyrillic_map[char])
-        elif char == ' ' or char == '_':
-            slug_chars.append('-')
-        elif char.isalnum():
-            slug_chars.append(char)
 
-    slug = ''.join(slug_chars)
-    slug = re.sub(r'-+', '-', slug)
-    slug = slug.strip('-')
+def create_slug(text):
+    if not text:
+        return secrets.token_hex(8)
+
+    slug = SLUG_INVALID_RE.sub('', text.lower().strip().translate(SLUG_TRANSLATION))
+    slug = SLUG_DASHES_RE.sub('-', slug).strip('-')
 
     if not slug:
         slug = secrets.token_hex(8)
@@ -84,17 +215,1038 @@ def create_slug(text):
     return slug
 
 
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    global _db_pool
+    # После fork у каждого воркера должен быть свой пул
+    if _db_pool is None or not _db_pool.owned_by_current_process():
+        with _db_pool_lock:
+            if _db_pool is None or not _db_pool.owned_by_current_process():
+                _db_pool = ConnectionPool(
+                    app.config['DB_POOL_MIN'],
+                    app.config['DB_POOL_MAX'],
+                    timeout=app.config['DB_POOL_TIMEOUT'],
+                    check_on_checkout=app.config['DB_POOL_CHECK_ON_CHECKOUT'],
+                    host=app.config['DB_HOST'],
+                    database=app.config['DB_NAME'],
+                    user=app.config['DB_USER'],
+                    password=app.config['DB_PASSWORD'],
+                    port=app.config['DB_PORT']
+                )
+    return _db_pool
+
+
+# Keyset-пагинация
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+
+def encode_cursor(*values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Некорректный курсор')
+    if not isinstance(values, list):
+        raise ValueError('Некорректный курсор')
+    return values
+
+
+# Ключи, которые бывают дробными: расстояние (nearby) и ранг (search)
+CURSOR_FLOAT_COLUMNS = ('distance', 'rank')
+
+
+def parse_keyset(values, column='created_at'):
+    # Курсор приходит от клиента: типы проверяем здесь, чтобы чужой или испорченный
+    # курсор давал 400, а не ошибку сравнения в БД
+    if len(values) != 2:
+        raise ValueError('Некорректный курсор')
+    value, after_id = values
+    if not isinstance(after_id, int) or isinstance(after_id, bool):
+        raise ValueError('Некорректный курсор')
+    if column == 'created_at':
+        # В курсоре время лежит строкой ISO 8601, драйверу передаем datetime
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError('Некорректный курсор')
+    elif column in CURSOR_FLOAT_COLUMNS:
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError('Некорректный курсор')
+    elif not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError('Некорректный курсор')
+    return value, after_id
+
+
+def get_page_args(args=None, column='created_at', sort=None):
+    # Возвращает None, если клиент не просил пагинацию (старый формат ответа).
+    # Для списка статей (sort) курсор начинается с режима сортировки
+    args = request.args if args is None else args
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return None
+
+    try:
+        limit = int(limit) if limit is not None else DEFAULT_PAGE_LIMIT
+    except ValueError:
+        raise ValueError('Некорректный limit')
+    limit = max(1, min(limit, MAX_PAGE_LIMIT))
+
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None:
+        if sort is not None:
+            # Значение колонки одного режима нельзя сравнивать с колонкой другого
+            if not after or after[0] != sort:
+                raise ValueError('Курсор не подходит к параметру sort')
+            after = after[1:]
+            column = ARTICLE_SORT_MODES[sort][0]
+        after = parse_keyset(after, column)
+    return limit, after
+
+
+def keyset_condition(after, alias='a', column='created_at', descending=True):
+    if after is None:
+        return 'TRUE', ()
+    op = '<' if descending else '>'
+    value, after_id = after
+    return f'({alias}.{column}, {alias}.id) {op} (%s, %s)', (value, after_id)
+
+
+# Режимы сортировки списка статей: (колонка, по убыванию).
+# Для каждого режима есть индекс (колонка, id) и (category, колонка, id)
+ARTICLE_SORT_MODES = {
+    'newest': ('created_at', True),
+    'oldest': ('created_at', False),
+    'most_views': ('views', True),
+    'most_likes': ('likes_count', True),
+    'most_comments': ('comments_count', True),
+}
+
+
+def make_page(rows, limit, key=lambda row: (row['created_at'], row['id'])):
+    # Запрашиваем limit + 1 строк: лишняя строка означает, что есть следующая страница
+    items = rows[:limit]
+    next_cursor = encode_cursor(*key(rows[limit - 1])) if len(rows) > limit else None
+    return items, next_cursor
+
+
+# Краткое представление статьи для списков: полный текст отдает только /api/articles/<slug>
+ARTICLE_SUMMARY_FIELDS = {
+    'id': 'a.id',
+    'slug': 'a.slug',
+    'title': 'a.title',
+    'category': 'a.category',
+    'author_id': 'a.author_id',
+    'author_name': 'u.username',
+    'excerpt': 'a.excerpt',
+    'reading_time': 'a.reading_time',
+    'photo': 'a.photo',
+    'location_lat': 'a.location_lat',
+    'location_lng': 'a.location_lng',
+    'views': 'a.views',
+    'likes_count': 'a.likes_count',
+    'comments_count': 'a.comments_count',
+    'created_at': 'a.created_at',
+    'updated_at': 'a.updated_at',
+    'version': 'a.version',
+}
+
+
+def get_fields_arg(args=None):
+    # ?fields=id,slug,title - только перечисленные поля краткого представления
+    fields = (request.args if args is None else args).get('fields')
+    if not fields:
+        return list(ARTICLE_SUMMARY_FIELDS)
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in requested if field not in ARTICLE_SUMMARY_FIELDS]
+    if unknown or not requested:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown) or fields}")
+    return requested
+
+
+def summary_columns(fields, *required):
+    # required - колонки для курсора, в ответ они попадают только если запрошены
+    names = dict.fromkeys([*fields, *required])
+    return ', '.join(f'{ARTICLE_SUMMARY_FIELDS[name]} AS {name}' for name in names)
+
+
+def project_fields(rows, fields):
+    # Без лишних колонок строки отдаются как есть, без копирования
+    if not rows or list(rows[0]) == fields:
+        return rows
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+EXCERPT_LENGTH = 200
+READING_WORDS_PER_MINUTE = 200
+MARKDOWN_PATTERNS = [
+    # Блоки кода в анонс не попадают целиком, вместе с ограждением
+    (re.compile(r'^\s*(```|~~~).*?(^\s*\1\s*$|\Z)', re.M | re.S), ''),
+    (re.compile(r'!\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'\[([^\]]*)\]\([^)]*\)'), r'\1'),
+    (re.compile(r'<[^>]+>'), ' '),
+    (re.compile(r'^\s{0,3}(#{1,6}|>|[-*+]|\d+[.)])\s+', re.M), ''),
+    (re.compile(r'^\s*([-*_]\s*){3,}$', re.M), ''),
+    (re.compile(r'(?<!`)(`+)(?!`)(.+?)(?<!`)\1(?!`)'), r'\2'),
+]
+# Снимаем только парное выделение: snake_case и 2*3*4 остаются как есть.
+# Вложенное (***a***, **a *b* c**) снимается за несколько проходов
+MARKDOWN_EMPHASIS = re.compile(r'(?<![\w*~])(\*\*|__|~~|\*|_)(?=\S)(.+?)(?<=\S)\1(?![\w*~])')
+
+
+def article_summary(content):
+    # Анонс и время чтения считаются один раз при записи статьи
+    text = content or ''
+    for pattern, replacement in MARKDOWN_PATTERNS:
+        text = pattern.sub(replacement, text)
+    replaced = 1
+    while replaced:
+        text, replaced = MARKDOWN_EMPHASIS.subn(r'\2', text)
+    words = text.split()
+    text = ' '.join(words)
+
+    if len(text) > EXCERPT_LENGTH:
+        # Режем по границе слова, если она есть
+        cut = text[:EXCERPT_LENGTH + 1].rsplit(' ', 1)[0] if ' ' in text[:EXCERPT_LENGTH] else text[:EXCERPT_LENGTH]
+        text = cut.rstrip(' .,;:!?-') + '…'
+
+    reading_time = max(1, round(len(words) / READING_WORDS_PER_MINUTE))
+    return text, reading_time
+
+
+_view_buffer = None
+_view_buffer_lock = threading.Lock()
+
+
+def get_view_buffer():
+    global _view_buffer
+    if not app.config['VIEW_BUFFER_ENABLED']:
+        return None
+    if _view_buffer is None or not _view_buffer.owned_by_current_process():
+        with _view_buffer_lock:
+            if _view_buffer is None or not _view_buffer.owned_by_current_process():
+                _view_buffer = ViewCounterBuffer(
+                    lambda: get_db_pool().getconn(),
+                    flush_interval=app.config['VIEW_FLUSH_INTERVAL'],
+                    flush_threshold=app.config['VIEW_FLUSH_THRESHOLD']
+                )
+    return _view_buffer
+
+
+def bump_user_stats(cur, user_id, articles=0, likes=0, comments=0):
+    cur.execute('''
+        INSERT INTO user_stats (user_id, articles_count, likes_count, comments_count)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            articles_count = user_stats.articles_count + EXCLUDED.articles_count,
+            likes_count = user_stats.likes_count + EXCLUDED.likes_count,
+            comments_count = user_stats.comments_count + EXCLUDED.comments_count
+    ''', (user_id, articles, likes, comments))
+
+
+def bump_author_category_stats(cur, author_id, category, articles=0, views=0, likes=0, comments=0):
+    cur.execute('''
+        INSERT INTO author_category_stats (author_id, category, articles_count, views, likes, comments)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON CONFLICT (author_id, category) DO UPDATE SET
+            articles_count = author_category_stats.articles_count + EXCLUDED.articles_count,
+            views = author_category_stats.views + EXCLUDED.views,
+            likes = author_category_stats.likes + EXCLUDED.likes,
+            comments = author_category_stats.comments + EXCLUDED.comments
+    ''', (author_id, category or 'general', articles, views, likes, comments))
+
+
+def bump_article_engagement(cur, article_id, views=0, likes=0, comments=0):
+    # Категория и неделя автора статьи обновляются одним запросом
+    cur.execute('''
+        WITH a AS (
+            SELECT author_id, COALESCE(category, 'general') AS category
+            FROM articles WHERE id = %(article_id)s
+        ),
+        by_category AS (
+            INSERT INTO author_category_stats (author_id, category, views, likes, comments)
+            SELECT author_id, category, %(views)s, %(likes)s, %(comments)s FROM a
+            ON CONFLICT (author_id, category) DO UPDATE SET
+                views = author_category_stats.views + EXCLUDED.views,
+                likes = author_category_stats.likes + EXCLUDED.likes,
+                comments = author_category_stats.comments + EXCLUDED.comments
+        )
+        INSERT INTO author_weekly_stats (author_id, week, views, likes, comments)
+        SELECT author_id, date_trunc('week', CURRENT_DATE)::date, %(views)s, %(likes)s, %(comments)s FROM a
+        ON CONFLICT (author_id, week) DO UPDATE SET
+            views = author_weekly_stats.views + EXCLUDED.views,
+            likes = author_weekly_stats.likes + EXCLUDED.likes,
+            comments = author_weekly_stats.comments + EXCLUDED.comments
+    ''', {'article_id': article_id, 'views': views, 'likes': likes, 'comments': comments})
+
+
+_like_buffer = None
+_like_buffer_lock = threading.Lock()
+
+
+def get_like_buffer():
+    global _like_buffer
+    if not app.config['LIKE_BUFFER_ENABLED']:
+        return None
+    if _like_buffer is None or not _like_buffer.owned_by_current_process():
+        with _like_buffer_lock:
+            if _like_buffer is None or not _like_buffer.owned_by_current_process():
+                _like_buffer = LikeCounterBuffer(
+                    lambda: get_db_pool().getconn(),
+                    publish=publish_event,
+                    flush_interval=app.config['LIKE_FLUSH_INTERVAL'],
+                    flush_threshold=app.config['LIKE_FLUSH_THRESHOLD']
+                )
+    return _like_buffer
+
+
+# События для подписчиков (asgi.py, /api/events) через NOTIFY
+EVENTS_CHANNEL = 'article_events'
+NOTIFY_MAX_PAYLOAD = 7900
+
+
+def publish_event(cur, event):
+    # NOTIFY доставляется только после COMMIT, откат транзакции отменяет и событие
+    payload = app.json.dumps(event)
+    if len(payload.encode()) > NOTIFY_MAX_PAYLOAD:
+        # Лимит NOTIFY - 8000 байт: крупное тело клиент дочитает сам, остаются счетчики
+        payload = app.json.dumps({key: value for key, value in event.items() if not isinstance(value, dict)})
+    cur.execute('SELECT pg_notify(%s, %s)', (EVENTS_CHANNEL, payload))
+
+
+# Фотографии хранятся файлами, в строках БД остается только ссылка
+media_store = MediaStore(
+    app.config['MEDIA_ROOT'],
+    thumbnail_sizes=app.config['MEDIA_THUMBNAIL_SIZES'],
+    max_bytes=app.config['MEDIA_MAX_BYTES']
+)
+MEDIA_URL_PREFIX = '/api/media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def store_inline_photo(photo):
+    # data:image/...;base64,... сохраняем в хранилище, остальные значения не трогаем
+    if not photo or not photo.startswith('data:image/'):
+        return photo
+    try:
+        data = base64.b64decode(photo.split(',', 1)[1], validate=True)
+    except (IndexError, ValueError):
+        raise InvalidImage('Некорректное изображение в data URI')
+    return MEDIA_URL_PREFIX + media_store.save(data)
+
+
+@app.errorhandler(InvalidImage)
+def handle_invalid_image(e):
+    return jsonify({'error': str(e)}), 400
+
+
+# Условные запросы (ETag / If-None-Match)
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def is_not_modified(etag):
+    # Слабое сравнение: сжатые ответы отдаются со слабым ETag
+    return request.if_none_match.contains_weak(etag)
+
+
+def cacheable(response, etag):
+    # Клиент может хранить ответ, но обязан перепроверять его через If-None-Match
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag):
+    return cacheable(app.response_class(status=304), etag)
+
+
+# Полнотекстовый поиск
+SEARCH_DOCUMENT_SQL = '''
+    SELECT a.id,
+           setweight(to_tsvector('russian', COALESCE(a.title, '')), 'A') ||
+           setweight(to_tsvector('english', COALESCE(a.title, '')), 'A') ||
+           setweight(to_tsvector('simple', COALESCE(u.username, '')), 'B') ||
+           setweight(to_tsvector('russian', COALESCE(a.content, '')), 'C') ||
+           setweight(to_tsvector('english', COALESCE(a.content, '')), 'C')
+    FROM articles a
+    LEFT JOIN users u ON a.author_id = u.id
+'''
+
+
+def update_search_document(cur, article_id):
+    update_search_documents(cur, [article_id])
+
+
+def update_search_documents(cur, article_ids):
+    cur.execute('INSERT INTO article_search (article_id, document)' + SEARCH_DOCUMENT_SQL + '''
+        WHERE a.id = ANY(%s)
+        ON CONFLICT (article_id) DO UPDATE SET document = EXCLUDED.document
+    ''', (list(article_ids),))
+
+
+_password_hasher = None
+_password_hasher_lock = threading.Lock()
+
+
+def get_password_hasher():
+    global _password_hasher
+    if _password_hasher is None or not _password_hasher.owned_by_current_process():
+        with _password_hasher_lock:
+            if _password_hasher is None or not _password_hasher.owned_by_current_process():
+                _password_hasher = PasswordHasher(
+                    app.config['PASSWORD_HASH_METHOD'],
+                    max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                    queue_limit=app.config['PASSWORD_HASH_QUEUE_LIMIT'],
+                    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+                )
+    return _password_hasher
+
+
 def get_db_connection():
-    conn = psycopg2.connect(
-        host=app.config['DB_HOST'],
-        database=app.config['DB_NAME'],
-        user=app.config['DB_USER'],
-        password=app.config['DB_PASSWORD'],
-        port=app.config['DB_PORT']
-    )
+    # Внутри POST /api/batch подзапросы работают на одном соединении
+    shared = g.get('shared_db_connection')
+    if shared is not None:
+        return shared
+    conn = get_db_pool().getconn()
+    # Запоминаем соединение, чтобы вернуть его в пул в конце запроса
+    g.setdefault('db_connections', []).append(conn)
     return conn
 
 
+@app.teardown_appcontext
+def release_db_connections(exception=None):
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
+
+@app.errorhandler(PoolTimeout)
+@app.errorhandler(HashingQueueFull)
+@app.errorhandler(GenerationQueueFull)
+def handle_overload(e):
+    return jsonify({'error': 'Сервер перегружен, попробуйте позже'}), 503
+
+
+# Изменения схемы и индексы, применяются командой `flask init-db`
+SCHEMA_STATEMENTS = [
+    # Keyset-пагинация по (created_at, id)
+    'CREATE INDEX IF NOT EXISTS idx_articles_created_at_id ON articles (created_at DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_author_created_at_id ON articles (author_id, created_at DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_likes_user_article ON likes (user_id, article_id)',
+    # Один лайк на пользователя: дубликаты от прежних гонок удаляются (счетчики после этого
+    # выравнивает `flask reconcile-counters`), индекс заменяет idx_likes_article
+    '''DELETE FROM likes l USING likes d
+        WHERE l.article_id = d.article_id AND l.user_id = d.user_id AND l.id > d.id''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_likes_article_user ON likes (article_id, user_id)',
+    'DROP INDEX IF EXISTS idx_likes_article',
+    'CREATE INDEX IF NOT EXISTS idx_comments_article ON comments (article_id)',
+    # Статистика автора по периодам
+    'CREATE INDEX IF NOT EXISTS idx_likes_article_created_at ON likes (article_id, created_at)',
+    # Ленты комментариев и лайков: keyset по (created_at, id) и выборка новее курсора (?since=)
+    'CREATE INDEX IF NOT EXISTS idx_comments_article_created_at_id ON comments (article_id, created_at, id)',
+    'DROP INDEX IF EXISTS idx_comments_article_created_at',
+    'CREATE INDEX IF NOT EXISTS idx_comments_user_created_at_id ON comments (user_id, created_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_likes_user_created_at_id ON likes (user_id, created_at, id)',
+    # Фильтрация по категории и сортировки списка статей
+    'UPDATE articles SET views = 0 WHERE views IS NULL',
+    'ALTER TABLE articles ALTER COLUMN views SET DEFAULT 0',
+    'ALTER TABLE articles ALTER COLUMN views SET NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_articles_category_created_at_id ON articles (category, created_at DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_views_id ON articles (views DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_category_views_id ON articles (category, views DESC, id DESC)',
+    # Статистика пользователя, обновляется вместе с записью статей, лайков и комментариев
+    '''CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+        articles_count INTEGER NOT NULL DEFAULT 0,
+        likes_count INTEGER NOT NULL DEFAULT 0,
+        comments_count INTEGER NOT NULL DEFAULT 0
+    )''',
+    # Агрегаты автора для аналитики: по категориям и по неделям
+    '''CREATE TABLE IF NOT EXISTS author_category_stats (
+        author_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        category VARCHAR(50) NOT NULL,
+        articles_count INTEGER NOT NULL DEFAULT 0,
+        views BIGINT NOT NULL DEFAULT 0,
+        likes INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (author_id, category)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS author_weekly_stats (
+        author_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        week DATE NOT NULL,
+        views BIGINT NOT NULL DEFAULT 0,
+        likes INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (author_id, week)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_articles_author_views_id ON articles (author_id, views DESC, id DESC)',
+    # Отозванные JWT (выход из аккаунта)
+    '''CREATE TABLE IF NOT EXISTS revoked_tokens (
+        token_hash CHAR(64) PRIMARY KEY,
+        expires_at TIMESTAMPTZ NOT NULL
+    )''',
+    # Версия статьи для ETag: меняется при правке, лайке и комментарии (но не при просмотре)
+    'CREATE SEQUENCE IF NOT EXISTS article_version_seq',
+    'ALTER TABLE articles ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0',
+    "ALTER TABLE articles ALTER COLUMN version SET DEFAULT nextval('article_version_seq')",
+    # Поиск статей рядом: earthdistance + GiST по координатам
+    'CREATE EXTENSION IF NOT EXISTS cube',
+    'CREATE EXTENSION IF NOT EXISTS earthdistance',
+    '''CREATE INDEX IF NOT EXISTS idx_articles_location ON articles
+        USING GIST (ll_to_earth(location_lat::float8, location_lng::float8))
+        WHERE location_lat IS NOT NULL AND location_lng IS NOT NULL''',
+    # Полнотекстовый поиск (русская и английская морфология)
+    '''CREATE TABLE IF NOT EXISTS article_search (
+        article_id INTEGER PRIMARY KEY REFERENCES articles(id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_article_search_document ON article_search USING GIN (document)',
+    # Денормализованные счетчики лайков и комментариев
+    'ALTER TABLE articles ADD COLUMN IF NOT EXISTS likes_count INTEGER NOT NULL DEFAULT 0',
+    'ALTER TABLE articles ADD COLUMN IF NOT EXISTS comments_count INTEGER NOT NULL DEFAULT 0',
+    'CREATE INDEX IF NOT EXISTS idx_articles_likes_count_id ON articles (likes_count DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_category_likes_count_id ON articles (category, likes_count DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_comments_count_id ON articles (comments_count DESC, id DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_articles_category_comments_count_id '
+    'ON articles (category, comments_count DESC, id DESC)',
+    # Дельта-синхронизация ленты: транзакция последнего изменения статьи и надгробия удаленных
+    'ALTER TABLE articles ADD COLUMN IF NOT EXISTS changed_xid BIGINT NOT NULL DEFAULT txid_current()',
+    'CREATE INDEX IF NOT EXISTS idx_articles_changed_xid_id ON articles (changed_xid, id)',
+    '''CREATE TABLE IF NOT EXISTS article_tombstones (
+        article_id INTEGER PRIMARY KEY,
+        slug TEXT NOT NULL,
+        deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        changed_xid BIGINT NOT NULL DEFAULT txid_current()
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_article_tombstones_changed_xid_id ON article_tombstones (changed_xid, article_id)',
+    # Задачи генерации статей ИИ. Готовая задача служит и кэшем результата: на ключ
+    # (бэкенд, тема, стиль, длина) бывает не больше одной незавершенной или готовой задачи
+    '''CREATE TABLE IF NOT EXISTS ai_jobs (
+        id TEXT PRIMARY KEY,
+        cache_key CHAR(64) NOT NULL,
+        topic TEXT NOT NULL,
+        style TEXT NOT NULL,
+        length TEXT NOT NULL,
+        status VARCHAR(16) NOT NULL DEFAULT 'queued',
+        result JSONB,
+        error TEXT,
+        created_by INTEGER REFERENCES users(id) ON DELETE SET NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )''',
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_jobs_cache_key ON ai_jobs (cache_key) WHERE status <> 'failed'",
+    'CREATE INDEX IF NOT EXISTS idx_ai_jobs_status_last_used_at ON ai_jobs (status, last_used_at)',
+    # Индекс рекомендаций: ближайшие по совместным лайкам и комментариям статьи
+    # (`flask refresh-recommendations`)
+    '''CREATE TABLE IF NOT EXISTS article_neighbors (
+        article_id INTEGER NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+        neighbor_id INTEGER NOT NULL REFERENCES articles(id) ON DELETE CASCADE,
+        score REAL NOT NULL,
+        PRIMARY KEY (article_id, neighbor_id)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_article_neighbors_neighbor ON article_neighbors (neighbor_id)',
+    # Анонс и время чтения для списков (заполняются при записи, старые - `flask backfill-excerpts`)
+    'ALTER TABLE articles ADD COLUMN IF NOT EXISTS excerpt TEXT',
+    'ALTER TABLE articles ADD COLUMN IF NOT EXISTS reading_time INTEGER',
+]
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for statement in SCHEMA_STATEMENTS:
+            cur.execute(statement)
+        conn.commit()
+        print(f'Схема обновлена ({len(SCHEMA_STATEMENTS)} операций)')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Пересчет счетчиков статей: `flask reconcile-counters [--dry-run]`
+@app.cli.command('reconcile-counters')
+@click.option('--dry-run', is_flag=True, help='Только показать расхождения')
+def reconcile_counters_command(dry_run):
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute('''
+            SELECT a.id, a.slug,
+                   a.likes_count, COALESCE(l.cnt, 0) as actual_likes,
+                   a.comments_count, COALESCE(c.cnt, 0) as actual_comments
+            FROM articles a
+            LEFT JOIN (SELECT article_id, COUNT(*) as cnt FROM likes GROUP BY article_id) l
+                ON l.article_id = a.id
+            LEFT JOIN (SELECT article_id, COUNT(*) as cnt FROM comments GROUP BY article_id) c
+                ON c.article_id = a.id
+            WHERE a.likes_count <> COALESCE(l.cnt, 0)
+               OR a.comments_count <> COALESCE(c.cnt, 0)
+        ''')
+        drifted = cur.fetchall()
+
+        for row in drifted:
+            print(f"{row['slug']}: likes {row['likes_count']} -> {row['actual_likes']}, "
+                  f"comments {row['comments_count']} -> {row['actual_comments']}")
+
+        if not dry_run and drifted:
+            # Считаем заново под блокировкой строки, чтобы не затереть параллельный лайк
+            cur.execute('''
+                UPDATE articles a
+                SET likes_count = (SELECT COUNT(*) FROM likes WHERE article_id = a.id),
+                    comments_count = (SELECT COUNT(*) FROM comments WHERE article_id = a.id)
+                WHERE a.id = ANY(%s)
+            ''', ([row['id'] for row in drifted],))
+        conn.commit()
+        print(f'Расхождений: {len(drifted)}' + (' (не исправлены)' if dry_run else ''))
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Статистика пула соединений
+@app.route('/api/db/pool', methods=['GET'])
+@require_admin
+def get_db_pool_stats():
+    return jsonify(get_db_pool().stats())
+
+
+NEIGHBORS_STAGING_SQL = '''
+    CREATE TEMP TABLE IF NOT EXISTS article_neighbors_import (
+        article_id INTEGER, neighbor_id INTEGER, score REAL
+    ) ON COMMIT DELETE ROWS
+'''
+
+
+def write_article_neighbors(cur, neighbors, replace_all=False):
+    # neighbors - (article_id, соседи, оценки) из ItemSimilarityIndex.neighbors_for.
+    # Через промежуточную таблицу: статьи, удаленные после загрузки матрицы, отсеиваются JOIN
+    cur.execute(NEIGHBORS_STAGING_SQL)
+    buffer = io.StringIO()
+    article_ids = []
+    for article_id, neighbor_ids, scores in neighbors:
+        article_ids.append(article_id)
+        buffer.writelines(f'{article_id}\t{neighbor_id}\t{score:.6f}\n'
+                          for neighbor_id, score in zip(neighbor_ids.tolist(), scores.tolist()))
+    buffer.seek(0)
+    cur.copy_expert('COPY article_neighbors_import (article_id, neighbor_id, score) FROM STDIN', buffer)
+
+    if replace_all:
+        cur.execute('DELETE FROM article_neighbors')
+    else:
+        cur.execute('DELETE FROM article_neighbors WHERE article_id = ANY(%s)', (article_ids,))
+    cur.execute('''
+        INSERT INTO article_neighbors (article_id, neighbor_id, score)
+        SELECT i.article_id, i.neighbor_id, i.score
+        FROM article_neighbors_import i
+        JOIN articles a ON a.id = i.article_id
+        JOIN articles n ON n.id = i.neighbor_id
+    ''')
+    return cur.rowcount
+
+
+def load_interactions(conn, min_like_id=0, min_comment_id=0):
+    # Лайки и комментарии как два массива (user_id, article_id) плюс максимальные id для
+    # следующей догрузки. Именованный курсор читает таблицы порциями, не целиком в память
+    import numpy as np
+
+    users, articles = [], []
+    last_ids = {}
+    for table, min_id in (('likes', min_like_id), ('comments', min_comment_id)):
+        cur = conn.cursor(name=f'load_{table}')
+        cur.itersize = 100000
+        cur.execute(f'SELECT id, user_id, article_id FROM {table} WHERE id > %s', (min_id,))
+        last_id = min_id
+        for row_id, user_id, article_id in cur:
+            users.append(user_id)
+            articles.append(article_id)
+            last_id = max(last_id, row_id)
+        cur.close()
+        last_ids[table] = last_id
+    return np.asarray(users, dtype=np.int64), np.asarray(articles, dtype=np.int64), last_ids
+
+
+# Индекс рекомендаций: полная сборка при старте, затем догрузка новых лайков и комментариев
+# каждые RECOMMENDATION_REFRESH_INTERVAL секунд с пересчетом затронутых статей и их соседей.
+# Догрузка только добавляет взаимодействия: снятые лайки, удаленные комментарии и пользователи
+# учитываются полной пересборкой раз в RECOMMENDATION_REBUILD_INTERVAL секунд
+REFRESH_ID_OVERLAP = 10000
+
+
+@app.cli.command('refresh-recommendations')
+@click.option('--once', is_flag=True, help='Только полная сборка, без догрузки')
+@click.option('--interval', default=None, type=float, help='Период догрузки, с')
+@click.option('--rebuild-interval', default=None, type=float, help='Период полной пересборки, с')
+def refresh_recommendations_command(once, interval, rebuild_interval):
+    from recommendations import ItemSimilarityIndex
+
+    interval = interval or app.config['RECOMMENDATION_REFRESH_INTERVAL']
+    rebuild_interval = rebuild_interval or app.config['RECOMMENDATION_REBUILD_INTERVAL']
+    index = ItemSimilarityIndex(neighbors=app.config['RECOMMENDATION_NEIGHBORS'])
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    def rebuild():
+        started = time.perf_counter()
+        users, articles, last_ids = load_interactions(conn)
+        positions = index.build(users, articles)
+        written = write_article_neighbors(cur, index.neighbors_for(positions), replace_all=True)
+        conn.commit()
+        print(f'Полная сборка: матрица {index.shape[0]}x{index.shape[1]}, {index.interactions} взаимодействий, '
+              f'{written} соседей за {time.perf_counter() - started:.1f} с')
+        return last_ids
+
+    try:
+        last_ids = rebuild()
+        rebuilt_at = time.monotonic()
+
+        while not once:
+            time.sleep(interval)
+            if time.monotonic() - rebuilt_at >= rebuild_interval:
+                last_ids = rebuild()
+                rebuilt_at = time.monotonic()
+                continue
+            started = time.perf_counter()
+            # id выдаются до коммита, поэтому читаем с перекрытием: повторы индекс отбрасывает
+            users, articles, new_ids = load_interactions(
+                conn, max(0, last_ids['likes'] - REFRESH_ID_OVERLAP), max(0, last_ids['comments'] - REFRESH_ID_OVERLAP))
+            last_ids = {table: max(last_ids[table], new_ids[table]) for table in last_ids}
+            dirty = index.add_interactions(users, articles)
+            if len(dirty):
+                written = write_article_neighbors(cur, index.neighbors_for(dirty))
+            conn.commit()
+            if len(dirty):
+                print(f'Пересчитано статей: {len(dirty)}, соседей {written}, '
+                      f'{(time.perf_counter() - started) * 1000:.0f} мс')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Перестроение поискового индекса: `flask reindex-search`
+@app.cli.command('reindex-search')
+def reindex_search_command():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('INSERT INTO article_search (article_id, document)' + SEARCH_DOCUMENT_SQL + '''
+            ON CONFLICT (article_id) DO UPDATE SET document = EXCLUDED.document
+        ''')
+        conn.commit()
+        print(f'Проиндексировано статей: {cur.rowcount}')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Заполнение анонсов для статей, созданных до их появления: `flask backfill-excerpts`
+@app.cli.command('backfill-excerpts')
+@click.option('--batch-size', default=500, help='Строк за транзакцию')
+@click.option('--all', 'recompute_all', is_flag=True, help='Пересчитать и уже заполненные')
+def backfill_excerpts_command(batch_size, recompute_all):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        updated = 0
+        last_id = 0
+        while True:
+            cur.execute('''
+                SELECT id, content FROM articles
+                WHERE id > %s AND (%s OR excerpt IS NULL OR reading_time IS NULL)
+                ORDER BY id LIMIT %s
+            ''', (last_id, recompute_all, batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            execute_values(cur, '''
+                UPDATE articles a SET excerpt = v.excerpt, reading_time = v.reading_time
+                FROM (VALUES %s) AS v(id, excerpt, reading_time)
+                WHERE a.id = v.id
+            ''', [(article_id, *article_summary(content)) for article_id, content in rows])
+            conn.commit()
+            updated += len(rows)
+        print(f'Обновлено статей: {updated}')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Очистка старых надгробий: `flask prune-tombstones --days 30`.
+# Клиент, не синхронизировавшийся дольше, может не узнать об удалении и должен перезагрузить список
+@app.cli.command('prune-tombstones')
+@click.option('--days', default=30, help='Хранить надгробия, дней')
+def prune_tombstones_command(days):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            DELETE FROM article_tombstones
+            WHERE deleted_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 day'
+        ''', (days,))
+        conn.commit()
+        print(f'Удалено надгробий: {cur.rowcount}')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Пересчет user_stats с нуля: `flask rebuild-user-stats`
+@app.cli.command('rebuild-user-stats')
+def rebuild_user_stats_command():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            INSERT INTO user_stats (user_id, articles_count, likes_count, comments_count)
+            SELECT u.id, COALESCE(a.cnt, 0), COALESCE(l.cnt, 0), COALESCE(c.cnt, 0)
+            FROM users u
+            LEFT JOIN (SELECT author_id, COUNT(*) as cnt FROM articles GROUP BY author_id) a
+                ON a.author_id = u.id
+            LEFT JOIN (SELECT user_id, COUNT(*) as cnt FROM likes GROUP BY user_id) l
+                ON l.user_id = u.id
+            LEFT JOIN (SELECT user_id, COUNT(*) as cnt FROM comments GROUP BY user_id) c
+                ON c.user_id = u.id
+            ON CONFLICT (user_id) DO UPDATE SET
+                articles_count = EXCLUDED.articles_count,
+                likes_count = EXCLUDED.likes_count,
+                comments_count = EXCLUDED.comments_count
+        ''')
+        conn.commit()
+        print(f'Пересчитана статистика пользователей: {cur.rowcount}')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Пересчет агрегатов аналитики авторов: `flask rebuild-author-stats`.
+# Просмотры по неделям восстановить нельзя: история просмотров не хранится
+@app.cli.command('rebuild-author-stats')
+def rebuild_author_stats_command():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('DELETE FROM author_category_stats')
+        cur.execute('''
+            INSERT INTO author_category_stats (author_id, category, articles_count, views, likes, comments)
+            SELECT author_id, COALESCE(category, 'general'), COUNT(*),
+                   SUM(views), SUM(likes_count), SUM(comments_count)
+            FROM articles
+            GROUP BY 1, 2
+        ''')
+        print(f'Категорий авторов: {cur.rowcount}')
+
+        cur.execute('''
+            INSERT INTO author_weekly_stats (author_id, week, likes, comments)
+            SELECT author_id, week, SUM(likes), SUM(comments)
+            FROM (
+                SELECT a.author_id, date_trunc('week', l.created_at)::date AS week, 1 AS likes, 0 AS comments
+                FROM likes l JOIN articles a ON a.id = l.article_id
+                UNION ALL
+                SELECT a.author_id, date_trunc('week', c.created_at)::date, 0, 1
+                FROM comments c JOIN articles a ON a.id = c.article_id
+            ) events
+            GROUP BY 1, 2
+            ON CONFLICT (author_id, week) DO UPDATE SET
+                likes = EXCLUDED.likes,
+                comments = EXCLUDED.comments
+        ''')
+        print(f'Недель авторов: {cur.rowcount}')
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Перенос встроенных в строки фотографий в хранилище: `flask migrate-photos`
+@app.cli.command('migrate-photos')
+@click.option('--batch-size', default=100, help='Строк за транзакцию')
+def migrate_photos_command(batch_size):
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        for table in ('articles', 'users'):
+            moved = failed = 0
+            last_id = 0
+            while True:
+                cur.execute(f'''
+                    SELECT id, photo FROM {table}
+                    WHERE id > %s AND photo LIKE 'data:image/%%'
+                    ORDER BY id LIMIT %s
+                ''', (last_id, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    last_id = row['id']
+                    try:
+                        reference = store_inline_photo(row['photo'])
+                    except InvalidImage as e:
+                        print(f'{table} #{row["id"]}: {e}')
+                        failed += 1
+                        continue
+                    # Статье меняем и версию, чтобы клиенты не держали старый ETag
+                    version_sql = (", version = nextval('article_version_seq'), changed_xid = txid_current()"
+                                   if table == 'articles' else '')
+                    cur.execute(f'UPDATE {table} SET photo = %s{version_sql} WHERE id = %s', (reference, row['id']))
+                    moved += 1
+                conn.commit()
+            print(f'{table}: перенесено {moved}, ошибок {failed}')
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Состояние буфера просмотров
+@app.route('/api/db/views', methods=['GET'])
+@require_admin
+def get_view_buffer_stats():
+    view_buffer = get_view_buffer()
+    if view_buffer is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(view_buffer.stats(), enabled=True))
+
+
+# Состояние буфера лайков
+@app.route('/api/db/likes', methods=['GET'])
+@require_admin
+def get_like_buffer_stats():
+    like_buffer = get_like_buffer()
+    if like_buffer is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(like_buffer.stats(), enabled=True))
+
+
+# Пакетные запросы: несколько вызовов API за один сетевой обход
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+BATCH_EXCLUDED_PREFIXES = ('/api/batch', '/api/media', '/api/articles/import')
+
+_batch_executor = None
+_batch_executor_pid = None
+_batch_executor_lock = threading.Lock()
+
+
+def batch_parallelism():
+    # Каждый параллельный GET держит свое соединение: больше размера пула не запускаем
+    return max(1, min(app.config['BATCH_PARALLELISM'], app.config['DB_POOL_MAX']))
+
+
+def get_batch_executor():
+    global _batch_executor, _batch_executor_pid
+    if _batch_executor is None or _batch_executor_pid != os.getpid():
+        with _batch_executor_lock:
+            if _batch_executor is None or _batch_executor_pid != os.getpid():
+                _batch_executor = ThreadPoolExecutor(max_workers=batch_parallelism(),
+                                                     thread_name_prefix='batch')
+                _batch_executor_pid = os.getpid()
+    return _batch_executor
+
+
+def parse_batch_item(item, allow_writes):
+    if not isinstance(item, dict):
+        raise ValueError('Подзапрос должен быть объектом')
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if method not in BATCH_METHODS:
+        raise ValueError(f'Метод {method} не поддерживается')
+    if not isinstance(path, str) or not path.startswith('/api/') or path.startswith(BATCH_EXCLUDED_PREFIXES):
+        raise ValueError(f'Недопустимый путь: {path}')
+    if method != 'GET' and not allow_writes:
+        raise ValueError(f'{method} {path}: изменяющие подзапросы требуют allow_writes')
+    return item.get('id'), method, path, item.get('body'), item.get('if_none_match')
+
+
+def dispatch_subrequest(method, path, body, if_none_match, authorization):
+    headers = {'Authorization': authorization} if authorization else {}
+    if if_none_match:
+        headers['If-None-Match'] = if_none_match
+
+    # Вложенный контекст запроса делит с пакетом контекст приложения, а значит g и соединение.
+    # Хуки after_request (CORS, сжатие) не вызываются: ответ нужен как JSON
+    with app.test_request_context(path, method=method, headers=headers, json=body):
+        try:
+            response = app.make_response(app.dispatch_request())
+        except HTTPException as e:
+            return e.code, {'error': e.description}, None
+        except Exception as e:
+            try:
+                response = app.make_response(app.handle_user_exception(e))
+            except Exception as unhandled:
+                return 500, {'error': str(unhandled)}, None
+        return response.status_code, response.get_json(silent=True), response.headers.get('ETag')
+
+
+def dispatch_in_own_context(*args):
+    # Параллельный GET: свой контекст приложения и свое соединение из пула
+    with app.app_context():
+        return dispatch_subrequest(*args)
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    allow_writes = data.get('allow_writes') is True
+
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Нужен непустой список requests'}), 400
+    if len(items) > app.config['BATCH_MAX_REQUESTS']:
+        return jsonify({'error': f"Не больше {app.config['BATCH_MAX_REQUESTS']} подзапросов"}), 400
+    try:
+        parsed = [parse_batch_item(item, allow_writes) for item in items]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    authorization = request.headers.get('Authorization')
+
+    # Подряд идущие GET независимы и выполняются параллельно;
+    # изменяющий подзапрос - барьер, он выполняется один и по порядку
+    results = []
+    shared = None
+    position = 0
+    while position < len(parsed):
+        end = position
+        while end < len(parsed) and parsed[end][1] == 'GET':
+            end += 1
+        group = parsed[position:end] if end > position else parsed[position:position + 1]
+
+        if len(group) > 1 and batch_parallelism() > 1:
+            if shared is not None:
+                # Параллельные GET берут соединения из пула сами - общее на это время отдаем
+                g.pop('shared_db_connection').close()
+                shared.close()
+                shared = None
+            futures = [get_batch_executor().submit(dispatch_in_own_context, *item[1:], authorization)
+                       for item in group]
+            outcomes = [future.result() for future in futures]
+        else:
+            if shared is None:
+                # Последовательные подзапросы работают на одном соединении, берем его по требованию
+                shared = get_db_connection()
+                g.shared_db_connection = SharedConnection(shared)
+            outcomes = [dispatch_subrequest(*item[1:], authorization) for item in group]
+
+        for (item_id, *_), (status, body, etag) in zip(group, outcomes):
+            result = {'id': item_id, 'status': status, 'body': body}
+            if etag:
+                result['etag'] = etag
+            results.append(result)
+        position += len(group)
+
+    return jsonify({'responses': results})
+
+
 # Регистрация пользователя
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -106,7 +1258,7 @@ def register():
     if not username or not email or not password:
         return jsonify({'error': 'Все поля обязательны'}), 400
 
-    hashed_password = generate_password_hash(password)
+    hashed_password = get_password_hasher().hash(password)
 
     try:
         conn = get_db_connection()
@@ -125,7 +1277,7 @@ def register():
 
         return jsonify({
             'message': 'Регистрация успешна',
-            'user': dict(user),
+            'user': user,
             'token': token
         }), 201
 
@@ -151,7 +1303,16 @@ def login():
     cur.execute('SELECT * FROM users WHERE email = %s', (email,))
     user = cur.fetchone()
 
-    if user and check_password_hash(user['password'], password):
+    # Соединение не держим, пока считается хеш
+    cur.close()
+    conn.close()
+
+    hasher = get_password_hasher()
+    if user and hasher.check(user['password'], password):
+        # Хеш со старыми параметрами пересчитываем, пока пароль известен
+        if hasher.needs_rehash(user['password']):
+            rehash_password(user['id'], user['password'], hasher.hash(password))
+
         # Генерируем JWT токен
         token = generate_token(user['id'])
 
@@ -170,52 +1331,85 @@ def login():
         return jsonify({'error': 'Неверный email или пароль'}), 401
 
 
+def rehash_password(user_id, old_hash, new_hash):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Не затираем пароль, если его успели сменить параллельно
+        cur.execute('UPDATE users SET password = %s WHERE id = %s AND password = %s',
+                    (new_hash, user_id, old_hash))
+        conn.commit()
+    except psycopg2.Error as e:
+        print("Error rehashing password:", e)
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Выход: токен попадает в список отозванных
+@app.route('/api/logout', methods=['POST'])
+@require_auth
+def logout():
+    revoke_token(get_bearer_token())
+    return jsonify({'message': 'Выход выполнен'}), 200
+
+
+# Загрузка изображения: multipart-поле file или JSON {"data": "data:image/...;base64,..."}
+@app.route('/api/media', methods=['POST'])
+@require_auth
+def upload_media():
+    if 'file' in request.files:
+        name = media_store.save(request.files['file'].read())
+        photo = MEDIA_URL_PREFIX + name
+    else:
+        data = (request.get_json(silent=True) or {}).get('data')
+        if not data:
+            return jsonify({'error': 'Нет файла'}), 400
+        photo = store_inline_photo(data if data.startswith('data:') else 'data:image/*;base64,' + data)
+
+    return jsonify({
+        'photo': photo,
+        'thumbnails': {size: f'{photo}?size={size}' for size in media_store.thumbnail_sizes}
+    }), 201
+
+
+# Отдача изображения или его миниатюры (?size=480) с поддержкой Range
+@app.route('/api/media/<name>', methods=['GET'])
+def get_media(name):
+    size = request.args.get('size', type=int)
+    path = media_store.path_for(name, size)
+    if path is None:
+        abort(404)
+
+    response = send_file(path, conditional=True, max_age=MEDIA_CACHE_MAX_AGE)
+    # Имя файла - хеш содержимого, поэтому ответ не меняется никогда
+    response.headers['Cache-Control'] = f'public, max-age={MEDIA_CACHE_MAX_AGE}, immutable'
+    return response
+
+
 # Получение текущего пользователя
 @app.route('/api/users/profile', methods=['GET'])
+@require_auth
 def get_current_user_profile():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
         cur.execute('''
-            SELECT id, username, email, role, photo, created_at 
-            FROM users WHERE id = %s
+            SELECT u.id, u.username, u.email, u.role, u.photo, u.created_at,
+                   COALESCE(s.articles_count, 0) as articles_count,
+                   COALESCE(s.likes_count, 0) as likes_count,
+                   COALESCE(s.comments_count, 0) as comments_count
+            FROM users u
+            LEFT JOIN user_stats s ON s.user_id = u.id
+            WHERE u.id = %s
         ''', (user_id,))
         user = cur.fetchone()
 
         if user:
-            # Получаем реальную статистику пользователя
-            cur.execute('''
-                SELECT COUNT(*) as articles_count 
-                FROM articles 
-                WHERE author_id = %s
-            ''', (user_id,))
-            articles_count = cur.fetchone()['articles_count']
-
-            cur.execute('''
-                SELECT COUNT(*) as likes_count 
-                FROM likes 
-                WHERE user_id = %s
-            ''', (user_id,))
-            likes_count = cur.fetchone()['likes_count']
-
-            cur.execute('''
-                SELECT COUNT(*) as comments_count 
-                FROM comments 
-                WHERE user_id = %s
-            ''', (user_id,))
-            comments_count = cur.fetchone()['comments_count']
-
-            user_data = dict(user)
-            user_data['articles_count'] = articles_count
-            user_data['likes_count'] = likes_count
-            user_data['comments_count'] = comments_count
-
-            return jsonify(user_data)
+            return jsonify(user)
         else:
             return jsonify({'error': 'Пользователь не найден'}), 404
 
@@ -229,40 +1423,518 @@ def get_current_user_profile():
 
 # Обновление профиля
 @app.route('/api/users/profile', methods=['PUT'])
+@require_auth
 def update_profile():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
     data = request.get_json()
     username = data.get('username')
     email = data.get('email')
-    photo = data.get('photo')
 
     if not username or not email:
         return jsonify({'error': 'Имя пользователя и email обязательны'}), 400
 
+    # Файл сохраняем только после проверок, иначе при 400 он останется без ссылок
+    photo = store_inline_photo(data.get('photo'))
+
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
         cur.execute('''
-            UPDATE users 
+            UPDATE users u
             SET username = %s, email = %s, photo = %s 
-            WHERE id = %s
-            RETURNING id, username, email, photo, role, created_at
+            FROM users old
+            WHERE u.id = %s AND old.id = u.id
+            RETURNING u.id, u.username, u.email, u.photo, u.role, u.created_at, old.username AS old_username
         ''', (username, email, photo, user_id))
 
         user = cur.fetchone()
+        if user and user.pop('old_username') != username:
+            # Имя автора входит в карточки статей и их поисковый документ:
+            # статьи автора должны прийти в дельта-синхронизации и сменить ETag
+            cur.execute('''
+                UPDATE articles
+                SET version = nextval('article_version_seq'), changed_xid = txid_current()
+                WHERE author_id = %s
+                RETURNING id
+            ''', (user_id,))
+            update_search_documents(cur, [row['id'] for row in cur.fetchall()])
         conn.commit()
 
         return jsonify({
             'message': 'Профиль обновлен',
-            'user': dict(user)
+            'user': user
         }), 200
 
-    except psycopg2.IntegrityError:
-        return jsonify({'error': 'Пользователь с таким email или username уже существует'}), 400
+    except psycopg2.IntegrityError:
+        return jsonify({'error': 'Пользователь с таким email или username уже существует'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Получение всех статей
+@app.route('/api/articles', methods=['GET'])
+def get_articles():
+    sort = request.args.get('sort', 'newest')
+    if sort not in ARTICLE_SORT_MODES:
+        return jsonify({'error': 'Некорректный параметр sort'}), 400
+    try:
+        page = get_page_args(sort=sort)
+        fields = get_fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    category = request.args.get('category')
+    if category == 'all':
+        category = None
+
+    limit, after = page if page else (None, None)
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    # Дешевая проверка версии: тот же индексный проход, но только (id, version)
+    sql, args = article_list_query(sort, category, after, limit, columns='a.id, a.version')
+    cur.execute(sql, args)
+    etag = make_etag(sort, category, request.args.get('cursor'), limit, ','.join(fields),
+                     *(f"{row['id']}:{row['version']}" for row in cur.fetchall()))
+    if is_not_modified(etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
+
+    column = ARTICLE_SORT_MODES[sort][0]
+    sql, args = article_list_query(sort, category, after, limit, columns=summary_columns(fields, 'id', column))
+    cur.execute(sql, args)
+    articles = cur.fetchall()
+
+    cur.close()
+    conn.close()
+
+    if page is None:
+        return cacheable(jsonify(project_fields(articles, fields)), etag)
+
+    items, next_cursor = make_page(articles, limit, key=lambda row: (sort, row[column], row['id']))
+    return cacheable(jsonify({'articles': project_fields(items, fields), 'next_cursor': next_cursor}), etag)
+
+
+def article_list_query(sort, category, after, limit, columns=None):
+    columns = columns or summary_columns(ARTICLE_SUMMARY_FIELDS)
+    column, descending = ARTICLE_SORT_MODES[sort]
+    direction = 'DESC' if descending else 'ASC'
+    keyset_sql, keyset_args = keyset_condition(after, column=column, descending=descending)
+    category_sql = 'a.category = %s' if category else 'TRUE'
+    category_args = (category,) if category else ()
+
+    # Фильтр и порядок совпадают с индексом, поэтому страница читается без сортировки.
+    # Счетчики лайков и комментариев хранятся в самой статье
+    sql = f'''
+        SELECT {columns}
+        FROM articles a
+        LEFT JOIN users u ON a.author_id = u.id
+        WHERE {category_sql} AND {keyset_sql}
+        ORDER BY a.{column} {direction}, a.id {direction}
+        LIMIT %s
+    '''
+    return sql, category_args + keyset_args + (limit + 1 if limit else None,)
+
+
+# Создание статьи
+@app.route('/api/articles', methods=['POST'])
+@require_auth
+def create_article():
+    user_id = g.user_id
+
+    data = request.get_json()
+    title = data.get('title')
+    content = data.get('content')
+    category = data.get('category', 'general')
+    location_lat = data.get('location_lat')
+    location_lng = data.get('location_lng')
+
+    if not title or not content:
+        return jsonify({'error': 'Заголовок и содержание обязательны'}), 400
+
+    slug = f"{create_slug(title)}-{int(time.time())}"
+    excerpt, reading_time = article_summary(content)
+    # Файл сохраняем только после проверок, иначе при 400 он останется без ссылок
+    photo = store_inline_photo(data.get('photo'))
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cur.execute('''
+            INSERT INTO articles (title, slug, content, excerpt, reading_time, author_id, category,
+                                  location_lat, location_lng, photo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING *
+        ''', (title, slug, content, excerpt, reading_time, user_id, category, location_lat, location_lng, photo))
+
+        article = cur.fetchone()
+        update_search_document(cur, article['id'])
+        bump_user_stats(cur, user_id, articles=1)
+        bump_author_category_stats(cur, user_id, category, articles=1)
+        publish_event(cur, {'type': 'article', 'slug': slug, 'article_id': article['id']})
+        conn.commit()
+
+        return jsonify({
+            'message': 'Статья создана',
+            'article': article
+        }), 201
+
+    except psycopg2.IntegrityError:
+        # Транзакция после ошибки прервана: без отката повторная вставка тоже упадет
+        conn.rollback()
+        slug = f"{slug}-{secrets.token_hex(4)}"
+        cur.execute('''
+            INSERT INTO articles (title, slug, content, excerpt, reading_time, author_id, category,
+                                  location_lat, location_lng, photo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING *
+        ''', (title, slug, content, excerpt, reading_time, user_id, category, location_lat, location_lng, photo))
+
+        article = cur.fetchone()
+        update_search_document(cur, article['id'])
+        bump_user_stats(cur, user_id, articles=1)
+        bump_author_category_stats(cur, user_id, category, articles=1)
+        publish_event(cur, {'type': 'article', 'slug': slug, 'article_id': article['id']})
+        conn.commit()
+
+        return jsonify({
+            'message': 'Статья создана',
+            'article': article
+        }), 201
+
+    except Exception as e:
+        print("Error creating article:", e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Массовый импорт статей: NDJSON или CSV потоком, пачками по IMPORT_CHUNK_SIZE строк.
+# Пачка попадает во временную таблицу через COPY и переносится в articles одним INSERT ... SELECT
+IMPORT_FORMATS = ('ndjson', 'csv')
+IMPORT_COLUMNS = ('line', 'title', 'slug', 'content', 'excerpt', 'reading_time', 'author_id', 'category',
+                  'location_lat', 'location_lng', 'photo', 'created_at')
+IMPORT_CATEGORY_MAX_LENGTH = 50
+IMPORT_MAX_FIELD_SIZE = 10 * 1024 * 1024
+IMPORT_SLUG_ATTEMPTS = 3
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+IMPORT_STAGING_SQL = '''
+    CREATE TEMP TABLE IF NOT EXISTS article_import (
+        line INTEGER, title TEXT, slug TEXT, content TEXT, excerpt TEXT, reading_time INTEGER,
+        author_id INTEGER, category TEXT, location_lat DOUBLE PRECISION, location_lng DOUBLE PRECISION,
+        photo TEXT, created_at TIMESTAMP
+    ) ON COMMIT DELETE ROWS
+'''
+IMPORT_INSERT_SQL = '''
+    INSERT INTO articles (title, slug, content, excerpt, reading_time, author_id, category,
+                          location_lat, location_lng, photo, created_at)
+    SELECT title, slug, content, excerpt, reading_time, author_id, category,
+           location_lat, location_lng, photo, COALESCE(created_at, CURRENT_TIMESTAMP)
+    FROM article_import
+    WHERE line = ANY(%s)
+    ORDER BY line
+    ON CONFLICT (slug) DO NOTHING
+    RETURNING id, slug
+'''
+
+
+def read_import_records(stream, fmt):
+    # Байтовый поток -> (номер строки, запись или None, ошибка или None), без чтения целиком в память
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream)
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'csv':
+        csv.field_size_limit(max(csv.field_size_limit(), IMPORT_MAX_FIELD_SIZE))
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line, raw in enumerate(text, 1):
+        if not raw.strip():
+            continue
+        try:
+            record = json.loads(raw)
+        except ValueError as e:
+            yield line, None, f'Некорректный JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line, None, 'Ожидался JSON-объект'
+            continue
+        yield line, record, None
+
+
+def parse_import_float(record, key):
+    value = record.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} должно быть числом')
+
+
+def parse_import_record(record, author_id):
+    title = (record.get('title') or '').strip()
+    content = record.get('content') or ''
+    if not title or not content.strip():
+        raise ValueError('Заголовок и содержание обязательны')
+
+    category = record.get('category') or 'general'
+    if len(category) > IMPORT_CATEGORY_MAX_LENGTH:
+        raise ValueError(f'Категория длиннее {IMPORT_CATEGORY_MAX_LENGTH} символов')
+
+    created_at = record.get('created_at') or None
+    if created_at is not None:
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except (TypeError, ValueError):
+            raise ValueError('created_at должно быть датой в формате ISO 8601')
+
+    excerpt, reading_time = article_summary(content)
+    return {
+        'title': title,
+        'content': content,
+        'excerpt': excerpt,
+        'reading_time': reading_time,
+        'author_id': author_id,
+        'category': category,
+        'location_lat': parse_import_float(record, 'location_lat'),
+        'location_lng': parse_import_float(record, 'location_lng'),
+        'photo': store_inline_photo(record.get('photo') or None),
+        'created_at': created_at,
+    }
+
+
+def assign_import_slugs(cur, rows):
+    # Базовые slug считаются в памяти, занятые в БД находятся одним запросом на пачку.
+    # Повторы внутри пачки и занятые получают случайный суффикс, как и в create_article
+    for row in rows:
+        row['slug'] = create_slug(row['title'])
+    cur.execute('SELECT slug FROM articles WHERE slug = ANY(%s)', (list({row['slug'] for row in rows}),))
+    taken = {existing['slug'] for existing in cur.fetchall()}
+    for row in rows:
+        if row['slug'] in taken:
+            row['slug'] = f"{row['slug']}-{secrets.token_hex(4)}"
+        taken.add(row['slug'])
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(COPY_ESCAPES)
+
+
+def import_article_chunk(cur, rows, index_search=True):
+    # Возвращает список строк, для которых не нашлось свободного slug
+    assign_import_slugs(cur, rows)
+    cur.execute(IMPORT_STAGING_SQL)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(row[column]) for column in IMPORT_COLUMNS) + '\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY article_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN", buffer)
+
+    by_line = {row['line']: row for row in rows}
+    pending = list(by_line)
+    inserted = []
+    for _ in range(IMPORT_SLUG_ATTEMPTS):
+        cur.execute(IMPORT_INSERT_SQL, (pending,))
+        ids = {article['slug']: article['id'] for article in cur.fetchall()}
+        inserted.extend(ids.values())
+        pending = [line for line in pending if by_line[line]['slug'] not in ids]
+        if not pending:
+            break
+        # slug успели занять параллельно: пробуем с другим суффиксом
+        for line in pending:
+            by_line[line]['slug'] = f"{create_slug(by_line[line]['title'])}-{secrets.token_hex(4)}"
+        execute_values(cur, '''
+            UPDATE article_import i SET slug = v.slug
+            FROM (VALUES %s) v(line, slug)
+            WHERE i.line = v.line
+        ''', [(line, by_line[line]['slug']) for line in pending])
+
+    if inserted and index_search:
+        update_search_documents(cur, inserted)
+
+    imported = [row for row in rows if row['line'] not in pending]
+    for author_id in {row['author_id'] for row in imported}:
+        by_author = [row for row in imported if row['author_id'] == author_id]
+        bump_user_stats(cur, author_id, articles=len(by_author))
+        for category in sorted({row['category'] for row in by_author}):
+            bump_author_category_stats(cur, author_id, category,
+                                       articles=sum(row['category'] == category for row in by_author))
+    if inserted:
+        # Одно событие на пачку: клиенты ленты догрузят новые статьи синхронизацией
+        publish_event(cur, {'type': 'article', 'imported': len(inserted)})
+    return pending
+
+
+def import_articles(records, author_id, chunk_size, index_search=True):
+    # Генератор событий: {'type': 'error', 'line', 'error'} на каждую отклоненную строку,
+    # {'type': 'progress', ...} после каждой пачки и {'type': 'done', ...} в конце
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    started = time.perf_counter()
+    totals = {'imported': 0, 'failed': 0}
+
+    def progress(event_type):
+        elapsed = time.perf_counter() - started
+        return dict(totals, type=event_type, elapsed=round(elapsed, 3),
+                    rate=round(totals['imported'] / elapsed) if elapsed else 0)
+
+    def load(chunk):
+        try:
+            unplaced = import_article_chunk(cur, chunk, index_search)
+            conn.commit()
+        except (psycopg2.DataError, psycopg2.IntegrityError):
+            # Пачку уронила одна из строк: загружаем ее построчно, чтобы назвать виновные
+            conn.rollback()
+            if len(chunk) > 1:
+                for row in chunk:
+                    yield from load([row])
+                return
+            totals['failed'] += 1
+            yield {'type': 'error', 'line': chunk[0]['line'], 'error': 'Строка отклонена базой данных'}
+            return
+        totals['imported'] += len(chunk) - len(unplaced)
+        totals['failed'] += len(unplaced)
+        for line in unplaced:
+            yield {'type': 'error', 'line': line, 'error': 'Не удалось подобрать свободный slug'}
+
+    try:
+        chunk = []
+        for line, record, error in records:
+            if error is None:
+                try:
+                    chunk.append(dict(parse_import_record(record, author_id), line=line))
+                except (ValueError, InvalidImage) as e:
+                    error = str(e)
+            if error is not None:
+                totals['failed'] += 1
+                yield {'type': 'error', 'line': line, 'error': error}
+            if len(chunk) >= chunk_size:
+                yield from load(chunk)
+                chunk = []
+                yield progress('progress')
+        if chunk:
+            yield from load(chunk)
+        yield progress('done')
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+class AppRequest(app.request_class):
+    @property
+    def max_content_length(self):
+        # Импорт читает тело потоком и ограничен размером поля, а не MAX_CONTENT_LENGTH
+        if self.path == '/api/articles/import':
+            return None
+        return super().max_content_length
+
+
+app.request_class = AppRequest
+
+
+# Массовый импорт от имени текущего пользователя. Тело - NDJSON (по умолчанию) или CSV
+# (?format=csv или Content-Type: text/csv) с полями title, content, category, location_lat,
+# location_lng, photo, created_at. Ответ - NDJSON-поток событий import_articles
+@app.route('/api/articles/import', methods=['POST'])
+@require_auth
+def import_articles_route():
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'error': 'format должен быть ndjson или csv'}), 400
+
+    events = import_articles(read_import_records(request.stream, fmt), g.user_id, app.config['IMPORT_CHUNK_SIZE'])
+    return app.response_class(stream_with_context(app.json.dumps(event) + '\n' for event in events),
+                              mimetype='application/x-ndjson')
+
+
+# Массовый импорт из файла: `flask import-articles articles.ndjson --author-id 1`.
+# С --no-search поисковый индекс не строится при загрузке, его потом перестраивает reindex-search
+@app.cli.command('import-articles')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--author-id', type=int, required=True, help='Автор импортируемых статей')
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Формат файла (по умолчанию по расширению)')
+@click.option('--chunk-size', default=None, type=int, help='Строк в одной транзакции')
+@click.option('--no-search', is_flag=True, help='Не индексировать для поиска при загрузке')
+def import_articles_command(path, author_id, fmt, chunk_size, no_search):
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK_SIZE']
+    with open(path, 'rb') as f:
+        for event in import_articles(read_import_records(f, fmt), author_id, chunk_size, not no_search):
+            if event['type'] == 'error':
+                print(f"строка {event['line']}: {event['error']}")
+            else:
+                print(f"{'Готово' if event['type'] == 'done' else 'Загружено'}: {event['imported']}, "
+                      f"ошибок {event['failed']}, {event['elapsed']:.1f} с, {event['rate']} статей/с")
+
+
+# Полнотекстовый поиск статей
+@app.route('/api/articles/search', methods=['GET'])
+def search_articles():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Параметр q обязателен'}), 400
+
+    try:
+        limit, after = get_page_args(column='rank') or (DEFAULT_PAGE_LIMIT, None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        # Совпадения берутся из GIN-индекса, ts_headline считается только для строк страницы
+        cur.execute('''
+            WITH q AS (
+                SELECT websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s) AS query
+            ),
+            ranked AS (
+                SELECT s.article_id, ts_rank(s.document, q.query) AS rank
+                FROM article_search s, q
+                WHERE s.document @@ q.query
+            ),
+            page AS (
+                SELECT * FROM ranked
+                WHERE %s IS NULL OR (rank, article_id) < (%s::real, %s::integer)
+                ORDER BY rank DESC, article_id DESC
+                LIMIT %s
+            )
+            SELECT a.id, a.slug, a.title, a.category, a.author_id, a.views,
+                   a.likes_count, a.comments_count, a.created_at,
+                   a.excerpt, a.reading_time, a.photo,
+                   u.username as author_name, page.rank,
+                   ts_headline('russian', a.content, q.query,
+                               'StartSel=<b>, StopSel=</b>, MaxFragments=2, MaxWords=25, MinWords=8') as snippet
+            FROM page
+            JOIN articles a ON a.id = page.article_id
+            LEFT JOIN users u ON a.author_id = u.id
+            CROSS JOIN q
+            ORDER BY page.rank DESC, page.article_id DESC
+        ''', (query, query) + ((after[0], after[0], after[1]) if after else (None, None, None)) + (limit + 1,))
+        items, next_cursor = make_page(cur.fetchall(), limit, key=lambda row: (row['rank'], row['id']))
+
+        return jsonify({'articles': items, 'next_cursor': next_cursor})
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
@@ -270,118 +1942,275 @@ def update_profile():
         conn.close()
 
 
-# Получение всех статей
-@app.route('/api/articles', methods=['GET'])
-def get_articles():
-    conn = get_db_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-
-    cur.execute('''
-        SELECT 
-            a.*, 
-            u.username as author_name,
-            COUNT(DISTINCT l.id) as likes_count,
-            COUNT(DISTINCT c.id) as comments_count,
-            COALESCE(a.views, 0) as views
-        FROM articles a
-        LEFT JOIN users u ON a.author_id = u.id
-        LEFT JOIN likes l ON a.id = l.article_id
-        LEFT JOIN comments c ON a.id = c.article_id
-        GROUP BY a.id, u.username, a.views
-        ORDER BY a.created_at DESC
-    ''')
-    articles = cur.fetchall()
-
-    cur.close()
-    conn.close()
-
-    return jsonify([dict(article) for article in articles])
-
+# Дельта-синхронизация ленты.
+# Токен - xmin снимка: все транзакции с меньшим номером уже завершены, поэтому изменение,
+# закоммиченное позже чтения, не потеряется (номер из последовательности version этого не дает).
+# Уже отправленные строки могут прийти повторно - клиент просто заменит их.
+# Просмотры в синхронизацию не входят: их сброс из буфера не меняет changed_xid, иначе
+# каждая синхронизация пересылала бы почти всю ленту. Свежие views отдает GET /api/articles/<slug>
+SYNC_DEFAULT_LIMIT = 100
+SYNC_MAX_LIMIT = 500
 
-# Создание статьи
-@app.route('/api/articles', methods=['POST'])
-def create_article():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
 
-    data = request.get_json()
-    title = data.get('title')
-    content = data.get('content')
-    category = data.get('category', 'general')
-    location_lat = data.get('location_lat')
-    location_lng = data.get('location_lng')
-    photo = data.get('photo')
+def decode_sync_token(token):
+    # [floor] - следующая синхронизация, [floor, xid, id] - продолжение текущей
+    values = decode_cursor(token)
+    if len(values) not in (1, 3) or not all(isinstance(value, int) for value in values):
+        raise ValueError('Некорректный токен синхронизации')
+    return values
 
-    if not title or not content:
-        return jsonify({'error': 'Заголовок и содержание обязательны'}), 400
 
-    slug = create_slug(title)
-    import time
-    slug = f"{slug}-{int(time.time())}"
+@app.route('/api/articles/changes', methods=['GET'])
+def get_article_changes():
+    try:
+        token = decode_sync_token(request.args['since']) if request.args.get('since') else None
+        limit = max(1, min(int(request.args.get('limit', SYNC_DEFAULT_LIMIT)), SYNC_MAX_LIMIT))
+        fields = get_fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        cur.execute('''
-            INSERT INTO articles (title, slug, content, author_id, category, location_lat, location_lng, photo)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING *
-        ''', (title, slug, content, user_id, category, location_lat, location_lng, photo))
+        if token is None or len(token) == 1:
+            cur.execute('SELECT txid_snapshot_xmin(txid_current_snapshot()) AS xmin')
+            floor = cur.fetchone()['xmin']
+        else:
+            floor = token[0]
 
-        article = cur.fetchone()
-        conn.commit()
+        if token is None:
+            # Первый вызов выдает только токен: его берут до полной загрузки списка
+            return jsonify({'articles': [], 'deleted': [], 'sync_token': encode_cursor(floor), 'has_more': False})
+
+        if len(token) == 1:
+            change_sql, change_args = '{xid} >= %s', (token[0],)
+        else:
+            change_sql, change_args = '({xid}, {id}) > (%s, %s)', (token[1], token[2])
+        cur.execute(f'''
+            SELECT {summary_columns(fields, 'id')}, a.changed_xid
+            FROM articles a
+            LEFT JOIN users u ON a.author_id = u.id
+            WHERE {change_sql.format(xid='a.changed_xid', id='a.id')}
+            ORDER BY a.changed_xid, a.id
+            LIMIT %s
+        ''', change_args + (limit + 1,))
+        rows = cur.fetchall()
+        # Удаления листаются тем же ключом, что и статьи
+        cur.execute(f'''
+            SELECT article_id AS id, changed_xid FROM article_tombstones
+            WHERE {change_sql.format(xid='changed_xid', id='article_id')}
+            ORDER BY changed_xid, article_id
+            LIMIT %s
+        ''', change_args + (limit + 1,))
+        tombstones = cur.fetchall()
+
+        # Страница - первые limit изменений обоих видов в порядке (changed_xid, id)
+        keys = sorted((row['changed_xid'], row['id']) for row in rows + tombstones)
+        has_more = len(keys) > limit
+        if has_more:
+            last = keys[limit - 1]
+            rows = [row for row in rows if (row['changed_xid'], row['id']) <= last]
+            tombstones = [row for row in tombstones if (row['changed_xid'], row['id']) <= last]
+        next_token = encode_cursor(floor, *last) if has_more else encode_cursor(floor)
 
         return jsonify({
-            'message': 'Статья создана',
-            'article': dict(article)
-        }), 201
+            'articles': project_fields(rows, fields),
+            'deleted': [row['id'] for row in tombstones],
+            'sync_token': next_token,
+            'has_more': has_more
+        })
 
-    except psycopg2.IntegrityError:
-        slug = f"{slug}-{secrets.token_hex(4)}"
-        cur.execute('''
-            INSERT INTO articles (title, slug, content, author_id, category, location_lat, location_lng, photo)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING *
-        ''', (title, slug, content, user_id, category, location_lat, location_lng, photo))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
 
-        article = cur.fetchone()
-        conn.commit()
 
-        return jsonify({
-            'message': 'Статья создана',
-            'article': dict(article)
-        }), 201
+# Статьи рядом с точкой
+NEARBY_DEFAULT_RADIUS = 5000
+NEARBY_MAX_RADIUS = 100000
+
+
+def parse_nearby_args():
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        radius = float(request.args.get('radius', NEARBY_DEFAULT_RADIUS))
+    except (KeyError, ValueError):
+        raise ValueError('Параметры lat и lng обязательны и должны быть числами')
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ValueError('Координаты вне допустимого диапазона')
+    if not 0 < radius <= NEARBY_MAX_RADIUS:
+        raise ValueError(f'radius должен быть от 0 до {NEARBY_MAX_RADIUS} метров')
+    return lat, lng, radius
+
+
+# earth_box отбирает кандидатов по GiST-индексу, earth_distance отсекает углы квадрата
+NEARBY_SQL = '''
+    WITH origin AS (SELECT ll_to_earth(%(lat)s, %(lng)s) AS point),
+    nearby AS (
+        SELECT a.id, earth_distance(origin.point,
+                                    ll_to_earth(a.location_lat::float8, a.location_lng::float8)) AS distance
+        FROM articles a, origin
+        WHERE a.location_lat IS NOT NULL AND a.location_lng IS NOT NULL
+          AND earth_box(origin.point, %(radius)s) @> ll_to_earth(a.location_lat::float8, a.location_lng::float8)
+    )
+    SELECT {columns}, nearby.distance
+    FROM nearby
+    JOIN articles a ON a.id = nearby.id
+    LEFT JOIN users u ON a.author_id = u.id
+    WHERE nearby.distance <= %(radius)s
+      AND (%(after_distance)s::float8 IS NULL OR (nearby.distance, a.id) > (%(after_distance)s, %(after_id)s))
+    ORDER BY nearby.distance, a.id
+    LIMIT %(limit)s
+'''
+
+
+@app.route('/api/articles/nearby', methods=['GET'])
+def get_nearby_articles():
+    try:
+        lat, lng, radius = parse_nearby_args()
+        limit, after = get_page_args(column='distance') or (DEFAULT_PAGE_LIMIT, None)
+        fields = get_fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cur.execute(NEARBY_SQL.format(columns=summary_columns(fields, 'id')), {
+            'lat': lat,
+            'lng': lng,
+            'radius': radius,
+            'after_distance': after[0] if after else None,
+            'after_id': after[1] if after else None,
+            'limit': limit + 1,
+        })
+        items, next_cursor = make_page(cur.fetchall(), limit, key=lambda row: (row['distance'], row['id']))
+
+        return jsonify({'articles': project_fields(items, fields + ['distance']), 'next_cursor': next_cursor})
 
     except Exception as e:
-        print("Error creating article:", e)
         return jsonify({'error': str(e)}), 500
     finally:
         cur.close()
         conn.close()
 
 
+# Запросы чтения статьи и комментариев общие для Flask и асинхронного режима (asgi.py)
+ARTICLE_VERSION_SQL = 'SELECT id, version FROM articles WHERE slug = %s'
+ARTICLE_SQL = '''
+    SELECT a.*, u.username as author_name
+    FROM articles a
+    LEFT JOIN users u ON a.author_id = u.id
+    WHERE a.slug = %s
+'''
+COMMENTS_SQL = '''
+    SELECT c.*, u.username 
+    FROM comments c
+    JOIN users u ON c.user_id = u.id
+    WHERE c.article_id = %s AND {keyset}
+    ORDER BY c.created_at {direction}, c.id {direction}
+    LIMIT %s
+'''
+USER_LIKES_SQL = '''
+    SELECT l.*, a.title, a.slug
+    FROM likes l
+    JOIN articles a ON l.article_id = a.id
+    WHERE l.user_id = %s AND {keyset}
+    ORDER BY l.created_at {direction}, l.id {direction}
+    LIMIT %s
+'''
+USER_COMMENTS_SQL = '''
+    SELECT c.*, a.title, a.slug
+    FROM comments c
+    JOIN articles a ON c.article_id = a.id
+    WHERE c.user_id = %s AND {keyset}
+    ORDER BY c.created_at {direction}, c.id {direction}
+    LIMIT %s
+'''
+
+
+# Ленты (комментарии, лайки): ?limit=&cursor= - страницы от новых к старым,
+# ?since= - только записи новее курсора. Без параметров - весь список, как раньше
+def get_timeline_args(args=None):
+    args = request.args if args is None else args
+    page = get_page_args(args)
+    since = args.get('since')
+    if page is None and since is None:
+        return None
+
+    limit, after = page or (DEFAULT_PAGE_LIMIT, None)
+    if since is not None:
+        if after is not None:
+            raise ValueError('cursor и since нельзя передавать вместе')
+        since = parse_keyset(decode_cursor(since))
+    return limit, after, since
+
+
+def timeline_query(sql, alias, owner_id, after=None, since=None, limit=None):
+    if since is not None:
+        # Новые записи читаем по возрастанию от курсора, чтобы не пропустить ни одной
+        keyset_sql, keyset_args = keyset_condition(since, alias=alias, descending=False)
+        direction = 'ASC'
+    else:
+        keyset_sql, keyset_args = keyset_condition(after, alias=alias)
+        direction = 'DESC'
+    return (sql.format(keyset=keyset_sql, direction=direction),
+            (owner_id,) + keyset_args + (limit + 1 if limit else None,))
+
+
+def timeline_page(rows, key, limit, since):
+    # Записи всегда от новых к старым; since_cursor - самая новая запись ответа,
+    # его клиент передает в следующий ?since=
+    if since is not None:
+        items = rows[:limit][::-1]
+        page = {key: items, 'next_cursor': None, 'has_more': len(rows) > limit}
+    else:
+        items, next_cursor = make_page(rows, limit)
+        page = {key: items, 'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+
+    if items:
+        page['since_cursor'] = encode_cursor(items[0]['created_at'], items[0]['id'])
+    else:
+        page['since_cursor'] = encode_cursor(*since) if since is not None else None
+    return page
+
+
+def record_article_view(cur, slug):
+    cur.execute('UPDATE articles SET views = COALESCE(views, 0) + 1 WHERE slug = %s RETURNING id', (slug,))
+    viewed = cur.fetchone()
+    if viewed:
+        bump_article_engagement(cur, viewed['id'], views=1)
+
+
 # Получение одной статьи
 @app.route('/api/articles/<slug>', methods=['GET'])
 def get_article(slug):
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute('UPDATE articles SET views = COALESCE(views, 0) + 1 WHERE slug = %s', (slug,))
-    conn.commit()
+    view_buffer = get_view_buffer()
+    if view_buffer is None:
+        record_article_view(cur, slug)
+        conn.commit()
 
-    cur.execute('''
-        SELECT a.*, u.username as author_name,
-               COUNT(DISTINCT l.id) as likes_count,
-               COUNT(DISTINCT c.id) as comments_count
-        FROM articles a
-        LEFT JOIN users u ON a.author_id = u.id
-        LEFT JOIN likes l ON a.id = l.article_id
-        LEFT JOIN comments c ON a.id = c.article_id
-        WHERE a.slug = %s
-        GROUP BY a.id, u.username
-    ''', (slug,))
+    # Просмотры не входят в версию, поэтому 304 может вернуть чуть устаревший счетчик просмотров
+    cur.execute(ARTICLE_VERSION_SQL, (slug,))
+    marker = cur.fetchone()
+    if marker:
+        etag = make_etag('article', marker['id'], marker['version'])
+        if is_not_modified(etag):
+            cur.close()
+            conn.close()
+            if view_buffer is not None:
+                view_buffer.add(slug)
+            return not_modified(etag)
+
+    cur.execute(ARTICLE_SQL, (slug,))
 
     article = cur.fetchone()
 
@@ -389,17 +2218,20 @@ def get_article(slug):
     conn.close()
 
     if article:
-        return jsonify(dict(article))
+        if view_buffer is not None:
+            # Просмотр запишется в БД при следующем сбросе буфера
+            view_buffer.add(slug)
+            article['views'] = (article['views'] or 0) + view_buffer.pending_for(slug)
+        return cacheable(jsonify(article), make_etag('article', article['id'], article['version']))
     else:
         return jsonify({'error': 'Статья не найдена'}), 404
 
 
 # Добавление комментария
 @app.route('/api/articles/<slug>/comments', methods=['POST'])
+@require_auth
 def add_comment(slug):
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
     data = request.get_json()
     text = data.get('text')
@@ -414,64 +2246,121 @@ def add_comment(slug):
     article = cur.fetchone()
 
     if not article:
+        cur.close()
+        conn.close()
         return jsonify({'error': 'Статья не найдена'}), 404
 
     cur.execute('''
         INSERT INTO comments (article_id, user_id, text)
         VALUES (%s, %s, %s)
-        RETURNING *
-    ''', (article['id'], user_id, text))
+        RETURNING *, (SELECT username FROM users WHERE id = %s) AS username
+    ''', (article['id'], user_id, text, user_id))
 
     comment = cur.fetchone()
+    cur.execute('''
+        UPDATE articles
+        SET comments_count = comments_count + 1, version = nextval('article_version_seq'),
+            changed_xid = txid_current()
+        WHERE id = %s
+        RETURNING comments_count
+    ''', (article['id'],))
+    comments_count = cur.fetchone()['comments_count']
+    bump_user_stats(cur, user_id, comments=1)
+    bump_article_engagement(cur, article['id'], comments=1)
+    publish_event(cur, {'type': 'comment', 'slug': slug, 'article_id': article['id'],
+                        'comments_count': comments_count, 'comment': comment})
     conn.commit()
 
     cur.close()
     conn.close()
 
-    return jsonify({'message': 'Комментарий добавлен', 'comment': dict(comment)})
+    return jsonify({'message': 'Комментарий добавлен', 'comment': comment})
+
+
+# Переключение лайка одним запросом. Уникальный индекс (article_id, user_id) не дает двум
+# параллельным нажатиям создать два лайка: проигравший INSERT ничего не вставляет (delta IS NULL),
+# и нажатие повторяется с новым снимком, где лайк победителя уже виден и будет снят.
+# Со склейкой (update_counter = false) счетчик статьи здесь не трогается
+LIKE_TOGGLE_SQL = '''
+    WITH article AS (
+        SELECT id, likes_count FROM articles WHERE slug = %(slug)s
+    ),
+    removed AS (
+        DELETE FROM likes l USING article
+        WHERE l.article_id = article.id AND l.user_id = %(user_id)s
+        RETURNING l.article_id
+    ),
+    added AS (
+        INSERT INTO likes (article_id, user_id)
+        SELECT id, %(user_id)s FROM article
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (article_id, user_id) DO NOTHING
+        RETURNING article_id
+    ),
+    delta AS (
+        SELECT article_id, -1 AS delta FROM removed
+        UNION ALL
+        SELECT article_id, 1 FROM added
+    ),
+    updated AS (
+        UPDATE articles a
+        SET likes_count = a.likes_count + delta.delta, version = nextval('article_version_seq'),
+            changed_xid = txid_current()
+        FROM delta
+        WHERE a.id = delta.article_id AND %(update_counter)s
+        RETURNING a.likes_count
+    )
+    SELECT article.id, delta.delta, COALESCE((SELECT likes_count FROM updated), article.likes_count) AS likes_count
+    FROM article
+    LEFT JOIN delta ON true
+'''
+LIKE_TOGGLE_ATTEMPTS = 3
 
 
 # Лайк статьи
 @app.route('/api/articles/<slug>/like', methods=['POST'])
+@require_auth
 def toggle_like(slug):
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
+    like_buffer = get_like_buffer()
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute('SELECT id FROM articles WHERE slug = %s', (slug,))
-    article = cur.fetchone()
+    params = {'slug': slug, 'user_id': user_id, 'update_counter': like_buffer is None}
+    for _ in range(LIKE_TOGGLE_ATTEMPTS):
+        cur.execute(LIKE_TOGGLE_SQL, params)
+        toggled = cur.fetchone()
+        if toggled is None or toggled['delta'] is not None:
+            break
 
-    if not article:
+    if not toggled:
+        cur.close()
+        conn.close()
         return jsonify({'error': 'Статья не найдена'}), 404
 
-    cur.execute('''
-        SELECT id FROM likes 
-        WHERE article_id = %s AND user_id = %s
-    ''', (article['id'], user_id))
+    if toggled['delta'] is None:
+        conn.rollback()
+        cur.close()
+        conn.close()
+        return jsonify({'error': 'Лайк уже изменяется, попробуйте еще раз'}), 409
 
-    existing_like = cur.fetchone()
+    article_id = toggled['id']
+    delta = toggled['delta']
+    message = 'Лайк добавлен' if delta > 0 else 'Лайк удален'
 
-    if existing_like:
-        cur.execute('DELETE FROM likes WHERE id = %s', (existing_like['id'],))
-        message = 'Лайк удален'
+    if like_buffer is None:
+        likes_count = toggled['likes_count']
+        bump_user_stats(cur, user_id, likes=delta)
+        bump_article_engagement(cur, article_id, likes=delta)
+        publish_event(cur, {'type': 'like', 'slug': slug, 'article_id': article_id, 'likes_count': likes_count})
+        conn.commit()
     else:
-        cur.execute('''
-            INSERT INTO likes (article_id, user_id)
-            VALUES (%s, %s)
-        ''', (article['id'], user_id))
-        message = 'Лайк добавлен'
-
-    cur.execute('''
-        SELECT COUNT(*) as likes_count FROM likes 
-        WHERE article_id = %s
-    ''', (article['id'],))
-
-    likes_count = cur.fetchone()['likes_count']
+        conn.commit()
+        # Счетчик статьи, агрегаты и событие запишет фоновый сброс; в ответе учитываем несброшенные лайки
+        likes_count = toggled['likes_count'] + like_buffer.pending_for_article(article_id) + delta
+        like_buffer.add((article_id, user_id), delta)
 
-    conn.commit()
     cur.close()
     conn.close()
 
@@ -481,52 +2370,218 @@ def toggle_like(slug):
 # Получение комментариев статьи
 @app.route('/api/articles/<slug>/comments', methods=['GET'])
 def get_comments(slug):
+    try:
+        timeline = get_timeline_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
-    cur.execute('''
-        SELECT c.*, u.username 
-        FROM comments c
-        JOIN users u ON c.user_id = u.id
-        JOIN articles a ON c.article_id = a.id
-        WHERE a.slug = %s
-        ORDER BY c.created_at DESC
-    ''', (slug,))
+    # Новый комментарий меняет версию статьи
+    cur.execute(ARTICLE_VERSION_SQL, (slug,))
+    marker = cur.fetchone()
+    page_args = (request.args.get('limit'), request.args.get('cursor'), request.args.get('since'))
+    etag = (make_etag('comments', marker['id'], marker['version'], *page_args) if marker
+            else make_etag('comments', slug, *page_args))
+    if is_not_modified(etag):
+        cur.close()
+        conn.close()
+        return not_modified(etag)
 
-    comments = cur.fetchall()
+    limit, after, since = timeline or (None, None, None)
+    comments = []
+    if marker:
+        cur.execute(*timeline_query(COMMENTS_SQL, 'c', marker['id'], after, since, limit))
+        comments = cur.fetchall()
 
     cur.close()
     conn.close()
 
-    return jsonify([dict(comment) for comment in comments])
+    if timeline is None:
+        return cacheable(jsonify(comments), etag)
+    return cacheable(jsonify(timeline_page(comments, 'comments', limit, since)), etag)
+
+
+# Статистика автора по периодам
+STATISTICS_BUCKETS = ('day', 'week', 'month')
+STATISTICS_DEFAULT_PERIODS = 8
+STATISTICS_MAX_PERIODS = 366
+
+_statistics_cache = TTLCache(app.config['STATS_CACHE_SIZE'], app.config['STATS_CACHE_TTL'])
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def shift_bucket(day, bucket, periods):
+    if bucket == 'week':
+        return day + timedelta(weeks=periods)
+    if bucket == 'month':
+        month = day.year * 12 + day.month - 1 + periods
+        return day.replace(year=month // 12, month=month % 12 + 1, day=1)
+    return day + timedelta(days=periods)
+
+
+@app.route('/api/users/<int:user_id>/statistics', methods=['GET'])
+@require_auth
+def get_user_statistics(user_id):
+    if user_id != g.user_id:
+        return jsonify({'error': 'Недостаточно прав'}), 403
+
+    bucket = request.args.get('bucket', 'week')
+    if bucket not in STATISTICS_BUCKETS:
+        return jsonify({'error': 'Некорректный параметр bucket'}), 400
+
+    try:
+        date_to = datetime.strptime(request.args['to'], '%Y-%m-%d').date() \
+            if 'to' in request.args else datetime.utcnow().date()
+        date_from = datetime.strptime(request.args['from'], '%Y-%m-%d').date() \
+            if 'from' in request.args else shift_bucket(bucket_start(date_to, bucket), bucket,
+                                                        1 - STATISTICS_DEFAULT_PERIODS)
+    except ValueError:
+        return jsonify({'error': 'Даты должны быть в формате YYYY-MM-DD'}), 400
+
+    first, last = bucket_start(date_from, bucket), bucket_start(date_to, bucket)
+    if first > last:
+        return jsonify({'error': 'Параметр from позже to'}), 400
+    if shift_bucket(first, bucket, STATISTICS_MAX_PERIODS) <= last:
+        return jsonify({'error': f'Не больше {STATISTICS_MAX_PERIODS} периодов за запрос'}), 400
+
+    # Статьи, лайки и комментарии закончившегося периода почти не меняются - их можно кэшировать.
+    # Просмотры не имеют времени события и относятся к периоду публикации статьи, поэтому растут
+    # и после его окончания: их читаем всегда
+    closed = last < bucket_start(datetime.utcnow().date(), bucket)
+    cache_key = (user_id, bucket, date_from, date_to)
+    cached = _statistics_cache.get(cache_key) if closed else None
+    params = {
+        'bucket': bucket,
+        'user_id': user_id,
+        'first': first,
+        'last': last,
+        'from': date_from,
+        'until': date_to + timedelta(days=1),
+    }
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        if cached is None:
+            cached = query_user_statistics(cur, params)
+            if closed:
+                _statistics_cache.set(cache_key, cached)
+        statistics = {'bucket': bucket, 'from': date_from.isoformat(), 'to': date_to.isoformat(), **cached}
+
+        cur.execute('''
+            SELECT to_char(date_trunc(%(bucket)s, created_at), 'YYYY-MM-DD') AS period, SUM(views) AS views
+            FROM articles
+            WHERE author_id = %(user_id)s AND created_at >= %(from)s AND created_at < %(until)s
+            GROUP BY 1
+        ''', params)
+        views = {row['period']: int(row['views'] or 0) for row in cur.fetchall()}
+        statistics['views'] = [views.get(period, 0) for period in statistics['periods']]
+        return jsonify(statistics)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
+
+
+def query_user_statistics(cur, params):
+    cur.execute('''
+        WITH periods AS (
+            SELECT generate_series(%(first)s::timestamp, %(last)s::timestamp, ('1 ' || %(bucket)s)::interval) AS period
+        ),
+        published AS (
+            SELECT date_trunc(%(bucket)s, created_at) AS period, COUNT(*) AS articles
+            FROM articles
+            WHERE author_id = %(user_id)s AND created_at >= %(from)s AND created_at < %(until)s
+            GROUP BY 1
+        ),
+        liked AS (
+            SELECT date_trunc(%(bucket)s, l.created_at) AS period, COUNT(*) AS likes
+            FROM likes l
+            JOIN articles a ON a.id = l.article_id
+            WHERE a.author_id = %(user_id)s AND l.created_at >= %(from)s AND l.created_at < %(until)s
+            GROUP BY 1
+        ),
+        commented AS (
+            SELECT date_trunc(%(bucket)s, c.created_at) AS period, COUNT(*) AS comments
+            FROM comments c
+            JOIN articles a ON a.id = c.article_id
+            WHERE a.author_id = %(user_id)s AND c.created_at >= %(from)s AND c.created_at < %(until)s
+            GROUP BY 1
+        )
+        SELECT to_char(p.period, 'YYYY-MM-DD') AS period,
+               COALESCE(pub.articles, 0) AS articles,
+               COALESCE(lk.likes, 0) AS likes,
+               COALESCE(cm.comments, 0) AS comments
+        FROM periods p
+        LEFT JOIN published pub ON pub.period = p.period
+        LEFT JOIN liked lk ON lk.period = p.period
+        LEFT JOIN commented cm ON cm.period = p.period
+        ORDER BY p.period
+    ''', params)
+    rows = cur.fetchall()
+
+    # Колонки вместо списка объектов: ответ остается компактным
+    statistics = {'periods': [row['period'] for row in rows]}
+    for key in ('articles', 'likes', 'comments'):
+        statistics[key] = [int(row[key]) for row in rows]
+    return statistics
+
+
+# Статьи пользователя и его избранное: новые сверху, keyset по (created_at, id)
+USER_ARTICLES_FILTER = 'a.author_id = %s'
+USER_FAVORITES_FILTER = 'EXISTS (SELECT 1 FROM likes fl WHERE fl.article_id = a.id AND fl.user_id = %s)'
+
+
+def user_article_list_query(owner_filter, user_id, fields, after, limit):
+    keyset_sql, keyset_args = keyset_condition(after)
+    sql = f'''
+        SELECT {summary_columns(fields, 'id', 'created_at')}
+        FROM articles a
+        LEFT JOIN users u ON a.author_id = u.id
+        WHERE {owner_filter} AND {keyset_sql}
+        ORDER BY a.created_at DESC, a.id DESC
+        LIMIT %s
+    '''
+    return sql, (user_id,) + keyset_args + (limit + 1 if limit else None,)
 
 
 # Получение статей пользователя
 @app.route('/api/users/articles', methods=['GET'])
+@require_auth
 def get_user_articles():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
+
+    try:
+        page = get_page_args()
+        fields = get_fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        cur.execute('''
-            SELECT a.*, u.username as author_name,
-                   COUNT(DISTINCT l.id) as likes_count,
-                   COUNT(DISTINCT c.id) as comments_count
-            FROM articles a
-            LEFT JOIN users u ON a.author_id = u.id
-            LEFT JOIN likes l ON a.id = l.article_id
-            LEFT JOIN comments c ON a.id = c.article_id
-            WHERE a.author_id = %s
-            GROUP BY a.id, u.username
-            ORDER BY a.created_at DESC
-        ''', (user_id,))
+        limit, after = page if page else (None, None)
+        cur.execute(*user_article_list_query(USER_ARTICLES_FILTER, user_id, fields, after, limit))
         articles = cur.fetchall()
 
-        return jsonify([dict(article) for article in articles])
+        if page is None:
+            return jsonify(project_fields(articles, fields))
+
+        items, next_cursor = make_page(articles, limit)
+        return jsonify({'articles': project_fields(items, fields), 'next_cursor': next_cursor})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -537,25 +2592,26 @@ def get_user_articles():
 
 # Получение лайков пользователя
 @app.route('/api/users/likes', methods=['GET'])
+@require_auth
 def get_user_likes():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
+
+    try:
+        timeline = get_timeline_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        cur.execute('''
-            SELECT l.*, a.title, a.slug
-            FROM likes l
-            JOIN articles a ON l.article_id = a.id
-            WHERE l.user_id = %s
-            ORDER BY l.created_at DESC
-        ''', (user_id,))
+        limit, after, since = timeline or (None, None, None)
+        cur.execute(*timeline_query(USER_LIKES_SQL, 'l', user_id, after, since, limit))
         likes = cur.fetchall()
 
-        return jsonify([dict(like) for like in likes])
+        if timeline is None:
+            return jsonify(likes)
+        return jsonify(timeline_page(likes, 'likes', limit, since))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -566,25 +2622,26 @@ def get_user_likes():
 
 # Получение комментариев пользователя
 @app.route('/api/users/comments', methods=['GET'])
+@require_auth
 def get_user_comments():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
+
+    try:
+        timeline = get_timeline_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        cur.execute('''
-            SELECT c.*, a.title, a.slug
-            FROM comments c
-            JOIN articles a ON c.article_id = a.id
-            WHERE c.user_id = %s
-            ORDER BY c.created_at DESC
-        ''', (user_id,))
+        limit, after, since = timeline or (None, None, None)
+        cur.execute(*timeline_query(USER_COMMENTS_SQL, 'c', user_id, after, since, limit))
         comments = cur.fetchall()
 
-        return jsonify([dict(comment) for comment in comments])
+        if timeline is None:
+            return jsonify(comments)
+        return jsonify(timeline_page(comments, 'comments', limit, since))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -595,32 +2652,29 @@ def get_user_comments():
 
 # Получение избранных статей
 @app.route('/api/users/favorites', methods=['GET'])
+@require_auth
 def get_user_favorites():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
+
+    try:
+        page = get_page_args()
+        fields = get_fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
-        cur.execute('''
-            SELECT a.*, u.username as author_name,
-                   COUNT(DISTINCT l.id) as likes_count,
-                   COUNT(DISTINCT c.id) as comments_count
-            FROM articles a
-            LEFT JOIN users u ON a.author_id = u.id
-            LEFT JOIN likes l ON a.id = l.article_id
-            LEFT JOIN comments c ON a.id = c.article_id
-            WHERE a.id IN (
-                SELECT article_id FROM likes WHERE user_id = %s
-            )
-            GROUP BY a.id, u.username
-            ORDER BY a.created_at DESC
-        ''', (user_id,))
+        limit, after = page if page else (None, None)
+        cur.execute(*user_article_list_query(USER_FAVORITES_FILTER, user_id, fields, after, limit))
         articles = cur.fetchall()
 
-        return jsonify([dict(article) for article in articles])
+        if page is None:
+            return jsonify(project_fields(articles, fields))
+
+        items, next_cursor = make_page(articles, limit)
+        return jsonify({'articles': project_fields(items, fields), 'next_cursor': next_cursor})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -631,10 +2685,9 @@ def get_user_favorites():
 
 # Обновление статьи
 @app.route('/api/articles/<slug>', methods=['PUT'])
+@require_auth
 def update_article(slug):
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
     data = request.get_json()
     title = data.get('title')
@@ -646,12 +2699,17 @@ def update_article(slug):
     if not title or not content:
         return jsonify({'error': 'Заголовок и содержание обязательны'}), 400
 
+    excerpt, reading_time = article_summary(content)
+    # Фото меняется, только если клиент его прислал. Файл сохраняем после проверок
+    photo_changed = 'photo' in data
+    photo = store_inline_photo(data.get('photo'))
+
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
         # Проверяем, что пользователь является автором статьи
-        cur.execute('SELECT author_id FROM articles WHERE slug = %s', (slug,))
+        cur.execute('SELECT author_id, category FROM articles WHERE slug = %s FOR UPDATE', (slug,))
         article = cur.fetchone()
 
         if not article:
@@ -662,18 +2720,28 @@ def update_article(slug):
 
         cur.execute('''
             UPDATE articles 
-            SET title = %s, content = %s, category = %s, 
-                location_lat = %s, location_lng = %s, updated_at = CURRENT_TIMESTAMP
+            SET title = %s, content = %s, excerpt = %s, reading_time = %s, category = %s, 
+                location_lat = %s, location_lng = %s, photo = CASE WHEN %s THEN %s ELSE photo END,
+                updated_at = CURRENT_TIMESTAMP,
+                version = nextval('article_version_seq'), changed_xid = txid_current()
             WHERE slug = %s
             RETURNING *
-        ''', (title, content, category, location_lat, location_lng, slug))
+        ''', (title, content, excerpt, reading_time, category, location_lat, location_lng,
+              photo_changed, photo, slug))
 
         updated_article = cur.fetchone()
+        update_search_document(cur, updated_article['id'])
+
+        # При смене категории переносим показатели статьи в агрегатах автора
+        if (article['category'] or 'general') != (category or 'general'):
+            moved = (updated_article['views'] or 0, updated_article['likes_count'], updated_article['comments_count'])
+            bump_author_category_stats(cur, user_id, article['category'], -1, *(-value for value in moved))
+            bump_author_category_stats(cur, user_id, category, 1, *moved)
         conn.commit()
 
         return jsonify({
             'message': 'Статья обновлена',
-            'article': dict(updated_article)
+            'article': updated_article
         }), 200
 
     except Exception as e:
@@ -685,17 +2753,19 @@ def update_article(slug):
 
 # Удаление статьи
 @app.route('/api/articles/<slug>', methods=['DELETE'])
+@require_auth
 def delete_article(slug):
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
     conn = get_db_connection()
     cur = conn.cursor(cursor_factory=RealDictCursor)
 
     try:
         # Проверяем, что пользователь является автором статьи
-        cur.execute('SELECT author_id FROM articles WHERE slug = %s', (slug,))
+        cur.execute('''
+            SELECT id, author_id, category, views, likes_count, comments_count
+            FROM articles WHERE slug = %s FOR UPDATE
+        ''', (slug,))
         article = cur.fetchone()
 
         if not article:
@@ -704,12 +2774,28 @@ def delete_article(slug):
         if article['author_id'] != user_id:
             return jsonify({'error': 'Недостаточно прав'}), 403
 
-        # Удаляем связанные комментарии и лайки
-        cur.execute('DELETE FROM comments WHERE article_id IN (SELECT id FROM articles WHERE slug = %s)', (slug,))
-        cur.execute('DELETE FROM likes WHERE article_id IN (SELECT id FROM articles WHERE slug = %s)', (slug,))
-
-        # Удаляем статью
-        cur.execute('DELETE FROM articles WHERE slug = %s', (slug,))
+        # Удаляем связанные комментарии и лайки, уменьшая статистику их авторов
+        for table, column in (('comments', 'comments_count'), ('likes', 'likes_count')):
+            cur.execute(f'''
+                WITH deleted AS (
+                    DELETE FROM {table} WHERE article_id = %s RETURNING user_id
+                ),
+                per_user AS (
+                    SELECT user_id, COUNT(*) as cnt FROM deleted GROUP BY user_id
+                )
+                UPDATE user_stats s SET {column} = s.{column} - per_user.cnt
+                FROM per_user
+                WHERE s.user_id = per_user.user_id
+            ''', (article['id'],))
+
+        # Удаляем статью, оставляя надгробие для дельта-синхронизации клиентов
+        cur.execute('DELETE FROM articles WHERE id = %s', (article['id'],))
+        cur.execute('INSERT INTO article_tombstones (article_id, slug) VALUES (%s, %s)', (article['id'], slug))
+        bump_user_stats(cur, user_id, articles=-1)
+        bump_author_category_stats(cur, user_id, article['category'], articles=-1,
+                                   views=-(article['views'] or 0),
+                                   likes=-article['likes_count'],
+                                   comments=-article['comments_count'])
 
         conn.commit()
 
@@ -722,70 +2808,287 @@ def delete_article(slug):
         conn.close()
 
 
-# AI endpoints в app.py
+# Генерация статей ИИ: запрос ставит задачу и сразу возвращает ее id, модель работает
+# в пуле потоков воркера, а результат забирается через GET /api/ai/jobs/<id> (или поток
+# событий /api/ai/jobs/<id>/events в asgi). Одинаковые запросы делят одну задачу
+AI_TOPIC_MAX_LENGTH = 500
+AI_JOB_PRUNE_INTERVAL = 60
+AI_JOB_FINISHED = ('done', 'failed')
+AI_JOB_SQL = 'SELECT id, status, style, length, result, error FROM ai_jobs WHERE id = %s'
+
+_ai_workers = None
+_ai_workers_lock = threading.Lock()
+_ai_jobs_pruned_at = 0
+
+
+def get_ai_workers():
+    global _ai_workers
+    if _ai_workers is None or not _ai_workers.owned_by_current_process():
+        with _ai_workers_lock:
+            if _ai_workers is None or not _ai_workers.owned_by_current_process():
+                generator = import_string(app.config['AI_GENERATOR'])(**app.config['AI_GENERATOR_OPTIONS'])
+                _ai_workers = GenerationWorkerPool(
+                    generator,
+                    max_workers=app.config['AI_WORKERS'],
+                    queue_limit=app.config['AI_QUEUE_LIMIT']
+                )
+    return _ai_workers
+
+
+def ai_cache_key(topic, style, length):
+    return hashlib.sha256(json.dumps([app.config['AI_GENERATOR'], topic, style, length]).encode()).hexdigest()
+
+
+def ai_job_response(job):
+    body = {'job_id': job['id'], 'status': job['status'], 'style': job['style'], 'length': job['length']}
+    if job['status'] == 'done':
+        body.update(job['result'])
+    elif job['status'] == 'failed':
+        body['error'] = job['error']
+    return body
+
+
+def publish_ai_job_event(cur, job_id, status):
+    publish_event(cur, {'type': 'ai_job', 'topic': f'ai_job:{job_id}', 'job_id': job_id, 'status': status})
+
+
+def prune_ai_jobs(cur):
+    # Вытеснение кэша: давно не запрошенные результаты и все сверх AI_CACHE_MAX_ENTRIES
+    cur.execute('''
+        DELETE FROM ai_jobs
+        WHERE status IN ('done', 'failed') AND last_used_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+    ''', (app.config['AI_CACHE_TTL'],))
+    cur.execute('''
+        DELETE FROM ai_jobs WHERE id IN (
+            SELECT id FROM ai_jobs WHERE status = 'done'
+            ORDER BY last_used_at DESC
+            OFFSET %s
+        )
+    ''', (app.config['AI_CACHE_MAX_ENTRIES'],))
+
+
+def run_ai_generation_job(job_id, topic, style, length):
+    global _ai_jobs_pruned_at
+    with app.app_context():
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            # Задачу могли признать зависшей и перезапустить: тогда эта копия не нужна
+            cur.execute('''
+                UPDATE ai_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'queued'
+            ''', (job_id,))
+            if cur.rowcount == 0:
+                conn.rollback()
+                return
+            publish_ai_job_event(cur, job_id, 'running')
+            conn.commit()
+        finally:
+            cur.close()
+            # Пока модель отвечает, соединение должно быть в пуле, а не ждать вместе с потоком
+            conn.close()
+
+        try:
+            result = get_ai_workers().generator.generate(topic, style, length)
+            status, error = 'done', None
+        except Exception as e:
+            print('Error generating article:', e)
+            result, status, error = None, 'failed', str(e)
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                UPDATE ai_jobs
+                SET status = %s, result = %s, error = %s,
+                    updated_at = CURRENT_TIMESTAMP, last_used_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'running'
+            ''', (status, Json(result) if result is not None else None, error, job_id))
+            if cur.rowcount:
+                publish_ai_job_event(cur, job_id, status)
+            conn.commit()
+
+            if time.monotonic() - _ai_jobs_pruned_at > AI_JOB_PRUNE_INTERVAL:
+                _ai_jobs_pruned_at = time.monotonic()
+                prune_ai_jobs(cur)
+                conn.commit()
+        finally:
+            cur.close()
+            conn.close()
+
+
 @app.route('/api/ai/generate-article', methods=['POST'])
+@require_auth
 def generate_ai_article():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
-    data = request.get_json()
-    topic = data.get('topic')
-    style = data.get('style', 'news')
-    length = data.get('length', 'medium')
+    data = request.get_json() or {}
+    topic = ' '.join(str(data.get('topic') or '').split())
+    style = str(data.get('style', 'news'))
+    length = str(data.get('length', 'medium'))
+    if not topic:
+        return jsonify({'error': 'Тема обязательна'}), 400
+    if len(topic) > AI_TOPIC_MAX_LENGTH:
+        return jsonify({'error': f'Тема длиннее {AI_TOPIC_MAX_LENGTH} символов'}), 400
 
-    # Здесь будет интеграция с реальным AI API (OpenAI, etc.)
-    # Пока возвращаем демо-данные
+    workers = get_ai_workers()
+    cache_key = ai_cache_key(topic, style, length)
+    reserved = submitted = False
 
-    word_counts = {
-        'short': '100-200',
-        'medium': '300-500',
-        'long': '500+'
-    }
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        # Готовый результат и уже идущая задача места в очереди не требуют:
+        # их отдаем и тогда, когда очередь заполнена
+        cur.execute('''
+            UPDATE ai_jobs SET last_used_at = CURRENT_TIMESTAMP
+            WHERE cache_key = %s
+              AND (status = 'done' OR status IN ('queued', 'running')
+                   AND updated_at >= CURRENT_TIMESTAMP - make_interval(secs => %s))
+            RETURNING id, status, style, length, result, error
+        ''', (cache_key, app.config['AI_JOB_TIMEOUT']))
+        job = cur.fetchone()
+        conn.commit()
+        if job:
+            return jsonify(ai_job_response(job)), 200 if job['status'] == 'done' else 202
 
-    demo_content = f"""# {topic}
+        workers.reserve()
+        reserved = True
+        # Задача, которая не завершилась за AI_JOB_TIMEOUT (например, воркер перезапустили),
+        # считается упавшей и не мешает поставить новую
+        cur.execute('''
+            UPDATE ai_jobs SET status = 'failed', error = 'Превышено время ожидания', updated_at = CURRENT_TIMESTAMP
+            WHERE cache_key = %s AND status IN ('queued', 'running')
+              AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+        ''', (cache_key, app.config['AI_JOB_TIMEOUT']))
+        # Уникальный индекс по ключу: параллельные одинаковые запросы получают одну и ту же задачу
+        cur.execute('''
+            INSERT INTO ai_jobs (id, cache_key, topic, style, length, created_by)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (cache_key) WHERE status <> 'failed'
+            DO UPDATE SET last_used_at = CURRENT_TIMESTAMP
+            RETURNING id, status, style, length, result, error, (xmax = 0) AS created
+        ''', (secrets.token_urlsafe(16), cache_key, topic, style, length, user_id))
+        job = cur.fetchone()
+        conn.commit()
 
-Это демонстрационная статья, сгенерированная искусственным интеллектом. В реальном приложении здесь был бы уникальный контент, созданный нейросетью.
+        if job['created']:
+            workers.submit(run_ai_generation_job, job['id'], topic, style, length)
+            submitted = True
 
-## Основные аспекты темы
+        return jsonify(ai_job_response(job)), 200 if job['status'] == 'done' else 202
+    finally:
+        if reserved and not submitted:
+            workers.release()
+        cur.close()
+        conn.close()
 
-Статья написана в {style} стиле и содержит примерно {word_counts.get(length, '300-500')} слов. ИИ анализирует тему и создает релевантный контент с учетом выбранного стиля написания.
 
-## Ключевые преимущества AI-генерации
+@app.route('/api/ai/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_ai_job(job_id):
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        cur.execute(AI_JOB_SQL, (job_id,))
+        job = cur.fetchone()
+        if not job:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        return jsonify(ai_job_response(job))
+    finally:
+        cur.close()
+        conn.close()
 
-• Уникальный контент
-• Быстрое создание
-• Различные стили написания
-• Адаптация под целевую аудиторию
 
-## Заключение
+# Состояние пула генерации
+@app.route('/api/ai/workers', methods=['GET'])
+@require_admin
+def get_ai_workers_stats():
+    return jsonify(get_ai_workers().stats())
 
-Искусственный интеллект открывает новые возможности для создания качественного контента."""
 
-    return jsonify({
-        'content': demo_content,
-        'title': f'AI Статья: {topic}',
-        'style': style,
-        'length': length
-    })
+ANALYTICS_TREND_WEEKS = 4
 
 
-@app.route('/api/ai/analytics', methods=['POST'])
+@app.route('/api/ai/analytics', methods=['GET', 'POST'])
+@require_auth
 def generate_ai_analytics():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
+    user_id = g.user_id
 
-    data = request.get_json()
-    articles = data.get('articles', [])
+    # Все берется из агрегатов автора: время ответа не зависит от числа его статей
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+
+    try:
+        cur.execute('''
+            SELECT category, articles_count, views, likes, comments
+            FROM author_category_stats
+            WHERE author_id = %s AND articles_count > 0
+            ORDER BY views DESC
+        ''', (user_id,))
+        categories = cur.fetchall()
+
+        this_week = datetime.utcnow().date() - timedelta(days=datetime.utcnow().weekday())
+        first_week = this_week - timedelta(weeks=2 * ANALYTICS_TREND_WEEKS - 1)
+        cur.execute('''
+            SELECT to_char(week, 'YYYY-MM-DD') AS week, views, likes, comments
+            FROM author_weekly_stats
+            WHERE author_id = %s AND week >= %s
+            ORDER BY week
+        ''', (user_id, first_week))
+        weeks = cur.fetchall()
+
+        cur.execute('''
+            (SELECT 'top' AS kind, id, slug, title, category, views, likes_count, comments_count
+             FROM articles WHERE author_id = %s
+             ORDER BY views DESC, id DESC LIMIT 3)
+            UNION ALL
+            (SELECT 'bottom', id, slug, title, category, views, likes_count, comments_count
+             FROM articles WHERE author_id = %s
+             ORDER BY views ASC, id ASC LIMIT 3)
+        ''', (user_id, user_id))
+        ranked = cur.fetchall()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cur.close()
+        conn.close()
 
-    # AI анализ статей пользователя
-    total_articles = len(articles)
-    total_views = sum(article.get('views', 0) for article in articles)
+    total_articles = sum(row['articles_count'] for row in categories)
+    total_views = sum(row['views'] for row in categories)
+    total_engagement = sum(row['likes'] + row['comments'] for row in categories)
     avg_views = total_views / max(total_articles, 1)
 
+    for row in categories:
+        row['avg_views'] = round(row['views'] / max(row['articles_count'], 1), 1)
+        row['engagement_rate'] = round((row['likes'] + row['comments']) / max(row['views'], 1), 4)
+
+    boundary = (this_week - timedelta(weeks=ANALYTICS_TREND_WEEKS - 1)).isoformat()
+    recent = [week for week in weeks if week['week'] >= boundary]
+    previous = [week for week in weeks if week['week'] < boundary]
+
+    def trend(key):
+        current = sum(week[key] for week in recent)
+        before = sum(week[key] for week in previous)
+        change = round((current - before) / before * 100, 1) if before else None
+        return {'current': current, 'previous': before, 'change_percent': change}
+
+    trends = {key: trend(key) for key in ('views', 'likes', 'comments')}
+
+    top_articles = [row for row in ranked if row['kind'] == 'top']
+    bottom_articles = [row for row in ranked if row['kind'] == 'bottom']
+    for row in ranked:
+        del row['kind']
+
     insights = f"Вы опубликовали {total_articles} статей с общим количеством просмотров {total_views}. "
     insights += f"Средняя популярность статей: {avg_views:.1f} просмотров."
+    if categories:
+        best = max(categories, key=lambda row: row['avg_views'])
+        insights += f" Лучше всего читают категорию «{best['category']}»: {best['avg_views']} просмотров на статью."
+    if trends['likes']['change_percent'] is not None:
+        insights += (f" За последние {ANALYTICS_TREND_WEEKS} недели лайков "
+                     f"{'больше' if trends['likes']['change_percent'] >= 0 else 'меньше'} "
+                     f"на {abs(trends['likes']['change_percent'])}%, чем за предыдущие.")
 
     recommendations = "Рекомендуем публиковать больше контента в популярных категориях и использовать мультимедиа для увеличения вовлеченности."
 
@@ -795,37 +3098,105 @@ def generate_ai_analytics():
         'stats': {
             'total_articles': total_articles,
             'total_views': total_views,
-            'avg_views': avg_views
-        }
+            'avg_views': avg_views,
+            'engagement_rate': round(total_engagement / max(total_views, 1), 4)
+        },
+        'categories': categories,
+        'trends': trends,
+        'weeks': weeks,
+        'top_articles': top_articles,
+        'bottom_articles': bottom_articles
     })
 
 
+# Рекомендации по item-item близости: последние статьи, которые пользователь лайкнул или
+# прокомментировал, дают голоса своим соседям из article_neighbors. Запрос идет только по
+# индексам (user_id, created_at) и первичному ключу соседей, без пересчета на лету
+RECOMMENDATION_DEFAULT_LIMIT = 10
+RECOMMENDATION_MAX_LIMIT = 50
+RECOMMEND_SQL = '''
+    WITH history AS (
+        SELECT article_id FROM (
+            (SELECT article_id, created_at FROM likes WHERE user_id = %(user_id)s
+             ORDER BY created_at DESC LIMIT %(history)s)
+            UNION ALL
+            (SELECT article_id, created_at FROM comments WHERE user_id = %(user_id)s
+             ORDER BY created_at DESC LIMIT %(history)s)
+        ) recent
+        GROUP BY article_id
+        ORDER BY MAX(created_at) DESC
+        LIMIT %(history)s
+    )
+    SELECT n.neighbor_id AS id, SUM(n.score) AS score
+    FROM history
+    JOIN article_neighbors n ON n.article_id = history.article_id
+    WHERE n.neighbor_id NOT IN (SELECT article_id FROM history)
+      AND NOT EXISTS (SELECT 1 FROM likes l WHERE l.article_id = n.neighbor_id AND l.user_id = %(user_id)s)
+    GROUP BY n.neighbor_id
+    ORDER BY score DESC, n.neighbor_id
+    LIMIT %(limit)s
+'''
+RECOMMENDATION_REASONS = {
+    'similar': 'Похожа на статьи, которые вам понравились',
+    'popular': 'Популярно у читателей',
+}
+
+
+def recommend_article_ids(cur, user_id, limit):
+    cur.execute(RECOMMEND_SQL, {'user_id': user_id, 'history': app.config['RECOMMENDATION_HISTORY'],
+                                'limit': limit})
+    return [(row['id'], row['score']) for row in cur.fetchall()]
+
+
 @app.route('/api/ai/recommendations', methods=['GET'])
+@require_auth
 def get_ai_recommendations():
-    user_id = get_current_user()
-    if not user_id:
-        return jsonify({'error': 'Не авторизован'}), 401
-
-    # AI рекомендации на основе поведения пользователя
-    # Пока возвращаем демо-рекомендации
-
-    return jsonify([
-        {
-            'title': 'Последние тенденции в искусственном интеллекте',
-            'category': 'tech',
-            'reason': 'На основе вашего интереса к технологиям'
-        },
-        {
-            'title': 'Как писать эффективные статьи',
-            'category': 'news',
-            'reason': 'Для улучшения ваших писательских навыков'
-        },
-        {
-            'title': 'Будущее мобильных приложений',
-            'category': 'tech',
-            'reason': 'С учетом вашей активности в технических темах'
-        }
-    ])
+    user_id = g.user_id
+    try:
+        fields = get_fields_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = request.args.get('limit', RECOMMENDATION_DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= RECOMMENDATION_MAX_LIMIT:
+        return jsonify({'error': f'limit должен быть от 1 до {RECOMMENDATION_MAX_LIMIT}'}), 400
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        # Берем с запасом: свои статьи отсеиваются уже при чтении карточек
+        scores = dict(recommend_article_ids(cur, user_id, limit * 2))
+        columns = summary_columns(fields, 'id')
+        cur.execute(f'''
+            SELECT {columns}
+            FROM articles a
+            LEFT JOIN users u ON a.author_id = u.id
+            WHERE a.id = ANY(%s) AND a.author_id IS DISTINCT FROM %s
+        ''', (list(scores), user_id))
+        similar = sorted(cur.fetchall(), key=lambda row: (-scores[row['id']], row['id']))[:limit]
+        reasons = {row['id']: 'similar' for row in similar}
+
+        # Новым пользователям и при нехватке соседей добираем популярными статьями
+        if len(similar) < limit:
+            cur.execute(f'''
+                SELECT {columns}
+                FROM articles a
+                LEFT JOIN users u ON a.author_id = u.id
+                WHERE a.author_id IS DISTINCT FROM %(user_id)s AND a.id <> ALL(%(exclude)s)
+                  AND NOT EXISTS (SELECT 1 FROM likes l WHERE l.article_id = a.id AND l.user_id = %(user_id)s)
+                ORDER BY a.likes_count DESC, a.id DESC
+                LIMIT %(limit)s
+            ''', {'user_id': user_id, 'exclude': list(reasons), 'limit': limit - len(similar)})
+            popular = cur.fetchall()
+            reasons.update((row['id'], 'popular') for row in popular)
+            similar.extend(popular)
+
+        articles = project_fields(similar, fields)
+        for article, row in zip(articles, similar):
+            article['reason'] = RECOMMENDATION_REASONS[reasons[row['id']]]
+        return jsonify(articles)
+    finally:
+        cur.close()
+        conn.close()
 
 
 if __name__ == '__main__':
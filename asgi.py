@@ -0,0 +1,398 @@
+# Асинхронный режим: чтения статей, комментариев и списков пользователя идут через
+# asyncpg без занятого на время запроса потока, остальные маршруты обслуживает
+# то же Flask-приложение. Запуск: `uvicorn asgi:app --workers 4`
+import asyncio
+import contextlib
+import json
+import re
+
+import asyncpg
+from a2wsgi import WSGIMiddleware
+from psycopg2.extras import RealDictCursor
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app import (
+    app as flask_app, verify_token, get_db_pool, get_view_buffer, record_article_view,
+    get_page_args, get_fields_arg, summary_columns, project_fields, make_page, make_etag,
+    get_timeline_args, timeline_query, timeline_page,
+    article_list_query, user_article_list_query, ARTICLE_SORT_MODES,
+    USER_ARTICLES_FILTER, USER_FAVORITES_FILTER, ARTICLE_VERSION_SQL, ARTICLE_SQL,
+    COMMENTS_SQL, USER_LIKES_SQL, USER_COMMENTS_SQL, EVENTS_CHANNEL,
+    AI_JOB_SQL, AI_JOB_FINISHED, ai_job_response,
+)
+from compression import ResponseCompressor
+from db_pool import PoolTimeout
+from event_hub import EventHub
+from json_provider import OrjsonProvider, dumps_bytes
+
+
+config = flask_app.config
+compressor = ResponseCompressor(
+    min_size=config['COMPRESS_MIN_SIZE'],
+    gzip_level=config['COMPRESS_GZIP_LEVEL'],
+    brotli_quality=config['COMPRESS_BROTLI_QUALITY']
+) if config['COMPRESS_ENABLED'] else None
+
+_pool = None
+_hub = None
+
+PLACEHOLDER_RE = re.compile(r'%s|%%')
+
+
+def to_asyncpg(sql, args=()):
+    # Запросы общие с psycopg2: %s -> $1, $2, ...
+    numbers = iter(range(1, len(args) + 1))
+    return (PLACEHOLDER_RE.sub(lambda m: '%' if m.group() == '%%' else f'${next(numbers)}', sql), *args)
+
+
+async def fetch(conn, sql, args=()):
+    return [dict(row) for row in await conn.fetch(*to_asyncpg(sql, args))]
+
+
+async def fetchrow(conn, sql, args=()):
+    row = await conn.fetchrow(*to_asyncpg(sql, args))
+    return dict(row) if row is not None else None
+
+
+def acquire():
+    return _pool.acquire(timeout=config['DB_POOL_TIMEOUT'])
+
+
+# Ответы совпадают с Flask-версией: тот же JSON, ETag, CORS и сжатие
+def cors_headers(request):
+    origin = request.headers.get('origin')
+    if not origin:
+        return {}
+    return {
+        'Access-Control-Allow-Origin': origin,
+        'Access-Control-Allow-Credentials': 'true',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Vary': 'Origin',
+    }
+
+
+def json_response(request, data=None, status=200, etag=None):
+    headers = {'Vary': 'Accept-Encoding', **cors_headers(request)}
+    if 'Access-Control-Allow-Origin' in headers:
+        headers['Vary'] = 'Origin, Accept-Encoding'
+    if etag is not None:
+        headers['ETag'] = f'"{etag}"'
+        headers['Cache-Control'] = 'no-cache'
+    if status == 304:
+        return Response(status_code=304, headers=headers)
+
+    if isinstance(flask_app.json, OrjsonProvider):
+        body = dumps_bytes(data)
+    else:
+        body = flask_app.json.dumps(data).encode()
+    if compressor is not None:
+        body, encoding = compressor.encode(body, parse_accept_header(request.headers.get('accept-encoding')))
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+            if etag is not None:
+                headers['ETag'] = f'W/"{etag}"'
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+
+def is_not_modified(request, etag):
+    return parse_etags(request.headers.get('if-none-match')).contains_weak(etag)
+
+
+def require_auth(view):
+    async def wrapped(request):
+        auth_header = request.headers.get('authorization', '')
+        token = auth_header.split(' ')[1] if auth_header.startswith('Bearer ') else None
+        # Проверка токена почти всегда попадает в кэш, но может обновить список отзыва из БД
+        user_id = await run_in_threadpool(verify_token, token) if token else None
+        if not user_id:
+            return json_response(request, {'error': 'Не авторизован'}, 401)
+        request.state.user_id = user_id
+        return await view(request)
+    return wrapped
+
+
+def record_view_sync(slug):
+    conn = get_db_pool().getconn()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        record_article_view(cur, slug)
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+
+
+async def get_articles(request):
+    args = request.query_params
+    sort = args.get('sort', 'newest')
+    if sort not in ARTICLE_SORT_MODES:
+        return json_response(request, {'error': 'Некорректный параметр sort'}, 400)
+    try:
+        page = get_page_args(args, sort=sort)
+        fields = get_fields_arg(args)
+    except ValueError as e:
+        return json_response(request, {'error': str(e)}, 400)
+
+    category = args.get('category')
+    if category == 'all':
+        category = None
+
+    limit, after = page if page else (None, None)
+    column = ARTICLE_SORT_MODES[sort][0]
+
+    async with acquire() as conn:
+        versions = await fetch(conn, *article_list_query(sort, category, after, limit, columns='a.id, a.version'))
+        etag = make_etag(sort, category, args.get('cursor'), limit, ','.join(fields),
+                         *(f"{row['id']}:{row['version']}" for row in versions))
+        if is_not_modified(request, etag):
+            return json_response(request, status=304, etag=etag)
+
+        articles = await fetch(conn, *article_list_query(sort, category, after, limit,
+                                                         columns=summary_columns(fields, 'id', column)))
+
+    if page is None:
+        return json_response(request, project_fields(articles, fields), etag=etag)
+
+    items, next_cursor = make_page(articles, limit, key=lambda row: (sort, row[column], row['id']))
+    return json_response(request, {'articles': project_fields(items, fields), 'next_cursor': next_cursor}, etag=etag)
+
+
+async def get_article(request):
+    slug = request.path_params['slug']
+
+    view_buffer = get_view_buffer()
+    if view_buffer is None:
+        await run_in_threadpool(record_view_sync, slug)
+
+    async with acquire() as conn:
+        marker = await fetchrow(conn, ARTICLE_VERSION_SQL, (slug,))
+        if marker:
+            etag = make_etag('article', marker['id'], marker['version'])
+            if is_not_modified(request, etag):
+                if view_buffer is not None:
+                    view_buffer.add(slug)
+                return json_response(request, status=304, etag=etag)
+
+        article = await fetchrow(conn, ARTICLE_SQL, (slug,))
+
+    if article is None:
+        return json_response(request, {'error': 'Статья не найдена'}, 404)
+
+    if view_buffer is not None:
+        view_buffer.add(slug)
+        article['views'] = (article['views'] or 0) + view_buffer.pending_for(slug)
+    return json_response(request, article, etag=make_etag('article', article['id'], article['version']))
+
+
+async def get_comments(request):
+    slug = request.path_params['slug']
+    args = request.query_params
+    try:
+        timeline = get_timeline_args(args)
+    except ValueError as e:
+        return json_response(request, {'error': str(e)}, 400)
+
+    async with acquire() as conn:
+        marker = await fetchrow(conn, ARTICLE_VERSION_SQL, (slug,))
+        page_args = (args.get('limit'), args.get('cursor'), args.get('since'))
+        etag = (make_etag('comments', marker['id'], marker['version'], *page_args) if marker
+                else make_etag('comments', slug, *page_args))
+        if is_not_modified(request, etag):
+            return json_response(request, status=304, etag=etag)
+
+        limit, after, since = timeline or (None, None, None)
+        comments = []
+        if marker:
+            comments = await fetch(conn, *timeline_query(COMMENTS_SQL, 'c', marker['id'], after, since, limit))
+
+    if timeline is None:
+        return json_response(request, comments, etag=etag)
+    return json_response(request, timeline_page(comments, 'comments', limit, since), etag=etag)
+
+
+def user_article_list(owner_filter):
+    @require_auth
+    async def view(request):
+        try:
+            page = get_page_args(request.query_params)
+            fields = get_fields_arg(request.query_params)
+        except ValueError as e:
+            return json_response(request, {'error': str(e)}, 400)
+
+        limit, after = page if page else (None, None)
+        async with acquire() as conn:
+            articles = await fetch(conn, *user_article_list_query(owner_filter, request.state.user_id,
+                                                                  fields, after, limit))
+
+        if page is None:
+            return json_response(request, project_fields(articles, fields))
+
+        items, next_cursor = make_page(articles, limit)
+        return json_response(request, {'articles': project_fields(items, fields), 'next_cursor': next_cursor})
+    return view
+
+
+def user_activity_list(sql, alias, key):
+    @require_auth
+    async def view(request):
+        try:
+            timeline = get_timeline_args(request.query_params)
+        except ValueError as e:
+            return json_response(request, {'error': str(e)}, 400)
+
+        limit, after, since = timeline or (None, None, None)
+        async with acquire() as conn:
+            rows = await fetch(conn, *timeline_query(sql, alias, request.state.user_id, after, since, limit))
+
+        if timeline is None:
+            return json_response(request, rows)
+        return json_response(request, timeline_page(rows, key, limit, since))
+    return view
+
+
+async def handle_overload(request, exc):
+    return json_response(request, {'error': 'Сервер перегружен, попробуйте позже'}, 503)
+
+
+async def handle_error(request, exc):
+    return json_response(request, {'error': str(exc)}, 500)
+
+
+# Поток событий (Server-Sent Events): новые комментарии и лайки статьи (?article=slug)
+# или всей ленты. Соединение держит только очередь в EventHub, а не поток или соединение с БД
+async def event_stream(request):
+    slug = request.query_params.get('article')
+    topic = f'article:{slug}' if slug else 'feed'
+    queue = _hub.subscribe(topic)
+    heartbeat = config['EVENTS_HEARTBEAT']
+
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Пустой комментарий не дает прокси закрыть простаивающее соединение
+                    yield ': ping\n\n'
+                    continue
+                yield f'data: {payload}\n\n'
+        finally:
+            _hub.unsubscribe(topic, queue)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **cors_headers(request)}
+    return StreamingResponse(events(), media_type='text/event-stream', headers=headers)
+
+
+async def fetch_ai_job(job_id):
+    async with acquire() as conn:
+        job = await fetchrow(conn, AI_JOB_SQL, (job_id,))
+    if job is not None and job['result'] is not None:
+        # asyncpg без кодека отдает JSONB строкой
+        job['result'] = json.loads(job['result'])
+    return job
+
+
+def sse_data(data):
+    return f'data: {flask_app.json.dumps(data)}\n\n'
+
+
+# Статус задачи генерации ИИ потоком: текущее состояние сразу, затем каждое изменение
+# до готового результата или ошибки. Задачу будит событие из EventHub, без опроса БД
+@require_auth
+async def ai_job_events(request):
+    job_id = request.path_params['job_id']
+    topic = f'ai_job:{job_id}'
+    # Подписка до чтения статуса: завершение между ними не потеряется
+    queue = _hub.subscribe(topic)
+    try:
+        job = await fetch_ai_job(job_id)
+    except BaseException:
+        _hub.unsubscribe(topic, queue)
+        raise
+    if job is None:
+        _hub.unsubscribe(topic, queue)
+        return json_response(request, {'error': 'Задача не найдена'}, 404)
+    heartbeat = config['EVENTS_HEARTBEAT']
+
+    async def events():
+        current = job
+        try:
+            yield 'retry: 5000\n\n'
+            yield sse_data(ai_job_response(current))
+            while current['status'] not in AI_JOB_FINISHED:
+                try:
+                    await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    # Заодно перечитываем статус: событие могло потеряться при переподключении
+                    yield ': ping\n\n'
+                latest = await fetch_ai_job(job_id)
+                if latest is None:
+                    return
+                if latest['status'] != current['status']:
+                    current = latest
+                    yield sse_data(ai_job_response(current))
+        finally:
+            _hub.unsubscribe(topic, queue)
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **cors_headers(request)}
+    return StreamingResponse(events(), media_type='text/event-stream', headers=headers)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _pool, _hub
+    connect_kwargs = dict(
+        host=config['DB_HOST'],
+        port=int(config['DB_PORT']),
+        database=config['DB_NAME'],
+        user=config['DB_USER'],
+        password=config['DB_PASSWORD']
+    )
+    _pool = await asyncpg.create_pool(
+        min_size=config['ASYNC_DB_POOL_MIN'],
+        max_size=config['ASYNC_DB_POOL_MAX'],
+        **connect_kwargs
+    )
+    _hub = EventHub(EVENTS_CHANNEL, queue_size=config['EVENTS_QUEUE_SIZE'], **connect_kwargs)
+    await _hub.start()
+    try:
+        yield
+    finally:
+        await _hub.close()
+        await _pool.close()
+
+
+flask_wsgi = WSGIMiddleware(flask_app)
+
+app = Starlette(
+    routes=[
+        Route('/api/articles', get_articles, methods=['GET']),
+        Route('/api/events', event_stream, methods=['GET']),
+        Route('/api/ai/jobs/{job_id}/events', ai_job_events, methods=['GET']),
+        # Статические пути Flask должны идти раньше /api/articles/{slug}
+        Route('/api/articles/search', flask_wsgi),
+        Route('/api/articles/nearby', flask_wsgi),
+        Route('/api/articles/changes', flask_wsgi),
+        Route('/api/articles/import', flask_wsgi),
+        Route('/api/articles/{slug}', get_article, methods=['GET']),
+        Route('/api/articles/{slug}/comments', get_comments, methods=['GET']),
+        Route('/api/users/articles', user_article_list(USER_ARTICLES_FILTER), methods=['GET']),
+        Route('/api/users/favorites', user_article_list(USER_FAVORITES_FILTER), methods=['GET']),
+        Route('/api/users/likes', user_activity_list(USER_LIKES_SQL, 'l', 'likes'), methods=['GET']),
+        Route('/api/users/comments', user_activity_list(USER_COMMENTS_SQL, 'c', 'comments'), methods=['GET']),
+        # Запись, авторизация, медиа и остальное - без изменений во Flask
+        Mount('', app=flask_wsgi),
+    ],
+    exception_handlers={
+        asyncio.TimeoutError: handle_overload,
+        asyncpg.TooManyConnectionsError: handle_overload,
+        PoolTimeout: handle_overload,
+        Exception: handle_error,
+    },
+    lifespan=lifespan
+)
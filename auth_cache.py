@@ -0,0 +1,94 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    # Ограниченный LRU-кэш, у каждой записи свой срок жизни
+    def __init__(self, maxsize=10000, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at=None):
+        expires_at = min(expires_at or float('inf'), time.time() + self.ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevocationList:
+    # Отозванные токены: digest -> exp. Проверка - поиск в словаре, O(1).
+    # Список периодически подтягивается из БД, чтобы отзыв дошел до всех воркеров
+    def __init__(self, load, refresh_interval=30.0):
+        self._load = load
+        self.refresh_interval = refresh_interval
+        self._revoked = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _maybe_refresh(self):
+        now = time.time()
+        if now - self._loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if now - self._loaded_at < self.refresh_interval:
+                return
+            self._loaded_at = now
+            try:
+                revoked = dict(self._load())
+            except Exception as e:
+                print('Error loading revoked tokens:', e)
+                return
+            # Истекшие токены и так не пройдут проверку exp
+            self._revoked = {digest: exp for digest, exp in revoked.items() if exp > now}
+
+    def add(self, digest, exp):
+        with self._lock:
+            self._revoked[digest] = exp
+
+    def __contains__(self, digest):
+        self._maybe_refresh()
+        return digest in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
@@ -0,0 +1,61 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+
+def negotiate_encoding(accept_encodings):
+    # Brotli сжимает JSON лучше gzip, поэтому при равном q выбираем его
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+
+class ResponseCompressor:
+    # Сжимает ответы больше порога по Accept-Encoding (after_request)
+    def __init__(self, app=None, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.levels = {'gzip': gzip_level, 'br': brotli_quality}
+        if app is not None:
+            app.after_request(self.after_request)
+
+    def encode(self, data, accept_encodings):
+        # (данные, кодировка); кодировка None - ответ остается как есть
+        if len(data) < self.min_size:
+            return data, None
+        encoding = negotiate_encoding(accept_encodings)
+        if encoding is None:
+            return data, None
+        return compress(data, encoding, self.levels[encoding]), encoding
+
+    def after_request(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data, encoding = self.encode(response.get_data(), request.accept_encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        # Сжатое представление отличается побайтно, поэтому ETag становится слабым
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
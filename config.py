@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -12,6 +13,92 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
     DB_PORT = os.getenv('DB_PORT', '5432')
 
+    # Пул соединений с PostgreSQL
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+    DB_POOL_CHECK_ON_CHECKOUT = os.getenv('DB_POOL_CHECK_ON_CHECKOUT', 'true').lower() == 'true'
+
+    # Отложенная запись просмотров статей. При падении процесса теряются
+    # несброшенные просмотры: не больше VIEW_FLUSH_THRESHOLD и не дольше
+    # VIEW_FLUSH_INTERVAL секунд на каждый воркер
+    VIEW_BUFFER_ENABLED = os.getenv('VIEW_BUFFER_ENABLED', 'true').lower() == 'true'
+    VIEW_FLUSH_INTERVAL = float(os.getenv('VIEW_FLUSH_INTERVAL', '5'))
+    VIEW_FLUSH_THRESHOLD = int(os.getenv('VIEW_FLUSH_THRESHOLD', '1000'))
+
+    # Склейка счетчиков лайков для статей под шквалом лайков: строка лайка пишется сразу,
+    # а likes_count статьи и агрегаты - пачкой раз в LIKE_FLUSH_INTERVAL секунд
+    LIKE_BUFFER_ENABLED = os.getenv('LIKE_BUFFER_ENABLED', 'false').lower() == 'true'
+    LIKE_FLUSH_INTERVAL = float(os.getenv('LIKE_FLUSH_INTERVAL', '1'))
+    LIKE_FLUSH_THRESHOLD = int(os.getenv('LIKE_FLUSH_THRESHOLD', '1000'))
+
+    # Кэш проверенных JWT и ролей пользователей
+    AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '10000'))
+    AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '300'))
+    AUTH_ROLE_CACHE_TTL = float(os.getenv('AUTH_ROLE_CACHE_TTL', '60'))
+    AUTH_REVOCATION_REFRESH = float(os.getenv('AUTH_REVOCATION_REFRESH', '30'))
+
+    # Хеширование паролей в отдельном пуле процессов
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv('PASSWORD_HASH_QUEUE_LIMIT', '16'))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+    # Кэш статистики автора за закрытые периоды
+    STATS_CACHE_SIZE = int(os.getenv('STATS_CACHE_SIZE', '1000'))
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '3600'))
+
+    # Пул asyncpg для асинхронного режима (uvicorn asgi:app), на каждый воркер
+    ASYNC_DB_POOL_MIN = int(os.getenv('ASYNC_DB_POOL_MIN', '2'))
+    ASYNC_DB_POOL_MAX = int(os.getenv('ASYNC_DB_POOL_MAX', '20'))
+
+    # GET /api/events (только asgi): очередь событий на клиента и период пустых пингов, с
+    EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', '100'))
+    EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '25'))
+
+    # Генерация статей ИИ: бэкенд ('модуль:Класс' и его параметры в JSON), потоков и
+    # мест в очереди на воркер, сколько ждать зависшую задачу (с) и кэш готовых результатов
+    AI_GENERATOR = os.getenv('AI_GENERATOR', 'ai_jobs:FakeArticleGenerator')
+    AI_GENERATOR_OPTIONS = json.loads(os.getenv('AI_GENERATOR_OPTIONS', '{}'))
+    AI_WORKERS = int(os.getenv('AI_WORKERS', '4'))
+    AI_QUEUE_LIMIT = int(os.getenv('AI_QUEUE_LIMIT', '100'))
+    AI_JOB_TIMEOUT = int(os.getenv('AI_JOB_TIMEOUT', '300'))
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', str(7 * 24 * 3600)))
+    AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '10000'))
+
+    # Рекомендации: соседей на статью в индексе, сколько последних взаимодействий
+    # пользователя учитывать, как часто `flask refresh-recommendations` дописывает изменения
+    # и как часто пересобирает индекс целиком, с
+    RECOMMENDATION_NEIGHBORS = int(os.getenv('RECOMMENDATION_NEIGHBORS', '20'))
+    RECOMMENDATION_HISTORY = int(os.getenv('RECOMMENDATION_HISTORY', '50'))
+    RECOMMENDATION_REFRESH_INTERVAL = float(os.getenv('RECOMMENDATION_REFRESH_INTERVAL', '30'))
+    RECOMMENDATION_REBUILD_INTERVAL = float(os.getenv('RECOMMENDATION_REBUILD_INTERVAL', '3600'))
+
+    # Массовый импорт статей: строк в одной транзакции
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '5000'))
+
+    # POST /api/batch: максимум подзапросов и сколько GET выполнять параллельно
+    # (не больше DB_POOL_MAX: у каждого параллельного GET свое соединение)
+    BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '20'))
+    BATCH_PARALLELISM = int(os.getenv('BATCH_PARALLELISM', '4'))
+
+    # Сериализация JSON: orjson или стандартный провайдер Flask (default)
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+
+    # Сжатие ответов gzip/brotli по Accept-Encoding
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+
+    # Хранилище фотографий статей и аватаров
+    MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'))
+    MEDIA_THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv('MEDIA_THUMBNAIL_SIZES', '160,480,1080').split(','))
+    MEDIA_MAX_BYTES = int(os.getenv('MEDIA_MAX_BYTES', str(10 * 1024 * 1024)))
+    # Более крупное тело запроса отклоняется с 413 до чтения. Фото в base64 на треть больше
+    # самого файла, сверху запас на остальные поля
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(MEDIA_MAX_BYTES * 4 // 3 + 64 * 1024)))
+
     @property
     def DATABASE_URL(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
\ No newline at end of file
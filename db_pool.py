@@ -0,0 +1,199 @@
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    # Обертка над соединением: close() возвращает его в пул, а не закрывает
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def released(self):
+        return self._conn is None
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+
+class SharedConnection:
+    # Одно соединение на несколько обработчиков (POST /api/batch): close() только
+    # завершает транзакцию, а в пул соединение вернет тот, кто его взял
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        self._conn.rollback()
+
+
+class ConnectionPool:
+    def __init__(self, minconn, maxconn, timeout=5.0, check_on_checkout=True, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError('Некорректные размеры пула')
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_on_checkout = check_on_checkout
+        self._connect_kwargs = connect_kwargs
+        self._pid = os.getpid()
+
+        self._lock = threading.Condition()
+        self._idle = []
+        self._in_use = 0
+        self._opening = 0
+
+        # Счетчики для подбора размера пула
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._broken = 0
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if not self.check_on_checkout:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            with self._lock:
+                while not self._idle and self._in_use + self._opening >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f'Нет свободных соединений за {self.timeout} c (max={self.maxconn})'
+                        )
+                    waited = True
+                    self._lock.wait(remaining)
+
+                if self._idle:
+                    conn = self._idle.pop()
+                    self._in_use += 1
+                else:
+                    conn = None
+                    self._opening += 1
+
+            # Сеть трогаем вне блокировки, чтобы не задерживать остальные потоки
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opening -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._opening -= 1
+                    self._in_use += 1
+            elif not self._is_healthy(conn):
+                self._discard(conn)
+                with self._lock:
+                    self._in_use -= 1
+                    self._broken += 1
+                    self._lock.notify()
+                continue
+
+            wait_time = time.monotonic() - started
+            with self._lock:
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                self._wait_time_total += wait_time
+                self._wait_time_max = max(self._wait_time_max, wait_time)
+            return PooledConnection(self, conn)
+
+    def putconn(self, conn):
+        keep = not conn.closed
+        if keep:
+            try:
+                # Незавершенная транзакция не должна достаться следующему запросу
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                keep = False
+
+        with self._lock:
+            self._in_use -= 1
+            if keep and len(self._idle) + self._in_use < self.maxconn:
+                self._idle.append(conn)
+                conn = None
+            self._lock.notify()
+
+        if conn is not None:
+            self._discard(conn)
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def owned_by_current_process(self):
+        return self._pid == os.getpid()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'size': self._in_use + len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'broken_discarded': self._broken,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / max(self._checkouts, 1), 3),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+            }
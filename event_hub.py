@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import asyncpg
+
+
+RESYNC_EVENT = json.dumps({'type': 'resync'})
+
+
+class EventHub:
+    # Один LISTEN на процесс: события из PostgreSQL раздаются подписчикам через их очереди.
+    # Подписчик - это только очередь, поэтому тысячи простаивающих клиентов почти ничего не стоят
+    def __init__(self, channel, queue_size=100, reconnect_delay=1.0, **connect_kwargs):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.reconnect_delay = reconnect_delay
+        self._connect_kwargs = connect_kwargs
+        self._conn = None
+        self._subscribers = {}
+        self._closed = False
+        self._reconnect_task = None
+
+        self.delivered = 0
+        self.dropped = 0
+
+    async def start(self):
+        self._conn = await asyncpg.connect(**self._connect_kwargs)
+        self._conn.add_termination_listener(self._on_terminate)
+        await self._conn.add_listener(self.channel, self._on_notify)
+
+    async def close(self):
+        self._closed = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+    def subscribe(self, topic):
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic, queue):
+        queues = self._subscribers.get(topic)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[topic]
+
+    def subscriber_count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        # Адресные события (например, готовность задачи генерации) идут только в свою тему
+        if event.get('topic'):
+            self.publish(payload, (event['topic'],))
+            return
+        slug = event.get('slug')
+        self.publish(payload, ('feed', f'article:{slug}') if slug else ('feed',))
+
+    def publish(self, payload, topics):
+        for topic in topics:
+            for queue in self._subscribers.get(topic, ()):
+                try:
+                    queue.put_nowait(payload)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    # Медленный клиент не тормозит остальных: событие теряется,
+                    # а клиент получит resync и перечитает данные сам
+                    self.dropped += 1
+                    self._push_resync(queue)
+
+    def _push_resync(self, queue):
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC_EVENT)
+
+    def _on_terminate(self, conn):
+        if not self._closed and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    async def _reconnect(self):
+        delay = self.reconnect_delay
+        while not self._closed:
+            await asyncio.sleep(delay)
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError) as e:
+                print('Event hub reconnect failed:', e)
+                delay = min(delay * 2, 30)
+                continue
+            # Пока соединения не было, события могли пропасть
+            for queues in list(self._subscribers.values()):
+                for queue in queues:
+                    self._push_resync(queue)
+            return
+
@@ -0,0 +1,35 @@
+import decimal
+import uuid
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+
+
+def _default(o):
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj):
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    # orjson сериализует строки RealDictCursor (подкласс dict) и datetime напрямую,
+    # без промежуточных копий dict(row) и без json-энкодера стандартной библиотеки
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Отдаем байты как есть, без decode/encode
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,82 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+
+from PIL import Image, UnidentifiedImageError
+
+
+class InvalidImage(Exception):
+    pass
+
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+MEDIA_NAME_RE = re.compile(r'^[0-9a-f]{64}\.(jpg|png|webp|gif)$')
+
+
+class MediaStore:
+    # Файлы адресуются sha256 содержимого: одинаковые картинки хранятся один раз,
+    # а содержимое по имени никогда не меняется (можно кэшировать навсегда)
+    def __init__(self, root, thumbnail_sizes=(160, 480, 1080), max_bytes=10 * 1024 * 1024):
+        self.root = root
+        self.thumbnail_sizes = tuple(sorted(thumbnail_sizes))
+        self.max_bytes = max_bytes
+
+    def _path(self, name):
+        return os.path.join(self.root, name[:2], name[2:4], name)
+
+    def _write(self, path, data):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и переименовываем: читатель не увидит половину файла
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def save(self, data):
+        if len(data) > self.max_bytes:
+            raise InvalidImage(f'Файл больше {self.max_bytes // (1024 * 1024)} МБ')
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except (UnidentifiedImageError, OSError):
+            raise InvalidImage('Файл не является изображением')
+
+        extension = FORMAT_EXTENSIONS.get(image.format)
+        if extension is None:
+            raise InvalidImage(f'Формат {image.format} не поддерживается')
+
+        name = f'{hashlib.sha256(data).hexdigest()}.{extension}'
+        self._write(self._path(name), data)
+        for size in self.thumbnail_sizes:
+            self._write(self._path(self.thumbnail_name(name, size)), self._thumbnail(image, size))
+        return name
+
+    def _thumbnail(self, image, size):
+        thumbnail = image.convert('RGB')
+        thumbnail.thumbnail((size, size))
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, 'JPEG', quality=82, optimize=True, progressive=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def thumbnail_name(name, size):
+        return f'{name.split(".")[0]}_{size}.jpg'
+
+    def path_for(self, name, size=None):
+        if not MEDIA_NAME_RE.match(name):
+            return None
+        if size is not None and self.thumbnail_sizes:
+            # Берем ближайшую миниатюру не меньше запрошенного размера
+            size = next((s for s in self.thumbnail_sizes if s >= size), self.thumbnail_sizes[-1])
+            name = self.thumbnail_name(name, size)
+        path = self._path(name)
+        return path if os.path.exists(path) else None
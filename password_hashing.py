@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashingQueueFull(Exception):
+    pass
+
+
+class PasswordHasher:
+    # Медленные KDF считаются в отдельных процессах: пачка логинов занимает
+    # не больше max_workers ядер и не больше queue_limit потоков веб-сервера
+    def __init__(self, method, max_workers=2, queue_limit=16, timeout=10.0):
+        self.method = method
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._pid = os.getpid()
+        # Пул создается лениво, когда у процесса уже есть потоки и захваченные ими блокировки:
+        # fork унаследовал бы их занятыми, поэтому рабочие процессы запускаются через spawn
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self.rejected = 0
+
+    def owned_by_current_process(self):
+        return self._pid == os.getpid()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingQueueFull('Очередь хеширования паролей переполнена')
+        try:
+            future = self._executor.submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                # Процессы не успевают за очередью: отвечаем 503, а не 500.
+                # Еще не начатую задачу снимаем, чтобы она не занимала процесс зря
+                future.cancel()
+                raise HashingQueueFull('Хеширование пароля не уложилось в таймаут')
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        # Формат werkzeug: "<метод с параметрами>$<соль>$<хеш>"
+        return pwhash.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
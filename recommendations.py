@@ -0,0 +1,89 @@
+import numpy as np
+from scipy import sparse
+
+
+class ItemSimilarityIndex:
+    # Item-item косинусная близость по бинарной матрице взаимодействий пользователь x статья
+    # (лайк или комментарий). Матрица держится в памяти, поэтому при новых взаимодействиях
+    # пересчитываются только затронутые статьи и статьи, которые с ними встречаются, а не весь индекс
+    def __init__(self, neighbors=20, block_size=512):
+        self.neighbors = neighbors
+        self.block_size = block_size
+        self._users = {}
+        self._articles = {}
+        self._article_ids = np.empty(0, dtype=np.int64)
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.float32)
+
+    @property
+    def shape(self):
+        return self._matrix.shape
+
+    @property
+    def interactions(self):
+        return self._matrix.nnz
+
+    @staticmethod
+    def _binary(rows, cols, shape):
+        # Лайк и комментарий к одной статье суммируются при сборке - оставляем только факт
+        matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=shape)
+        matrix.data[:] = 1
+        return matrix
+
+    @staticmethod
+    def _positions(ids, mapping):
+        # Новые id получают следующие свободные номера строк или столбцов
+        return np.fromiter((mapping.setdefault(value, len(mapping)) for value in ids), dtype=np.int64, count=len(ids))
+
+    def build(self, user_ids, article_ids):
+        users, rows = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)
+        articles, cols = np.unique(np.asarray(article_ids, dtype=np.int64), return_inverse=True)
+        self._users = dict(zip(users.tolist(), range(len(users))))
+        self._articles = dict(zip(articles.tolist(), range(len(articles))))
+        self._article_ids = articles
+        self._matrix = self._binary(rows, cols, (len(users), len(articles)))
+        return np.arange(len(articles))
+
+    def add_interactions(self, user_ids, article_ids):
+        # Возвращает номера статей, чьих соседей нужно пересчитать
+        rows = self._positions(user_ids, self._users)
+        cols = self._positions(article_ids, self._articles)
+        if len(self._articles) > len(self._article_ids):
+            added = list(self._articles)[len(self._article_ids):]
+            self._article_ids = np.concatenate([self._article_ids, np.asarray(added, dtype=np.int64)])
+
+        shape = (len(self._users), len(self._articles))
+        self._matrix.resize(shape)
+        # Повторно прочитанные взаимодействия (выборка идет с перекрытием) ничего не меняют
+        known = np.asarray(self._matrix[rows, cols]).ravel() > 0 if len(rows) else np.empty(0, dtype=bool)
+        rows, cols = rows[~known], cols[~known]
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+
+        self._matrix = self._matrix + self._binary(rows, cols, shape)
+        self._matrix.data[:] = 1
+        # У статьи с новым взаимодействием меняется норма, а с ней и близость ко всем статьям,
+        # с которыми она встречается хотя бы у одного пользователя: их списки соседей тоже
+        # пересчитываются. Сюда входят и новые пары со всем, что эти пользователи уже читали
+        users = np.unique(self._matrix.tocsc()[:, np.unique(cols)].indices)
+        return np.union1d(cols, self._matrix[users].indices)
+
+    def neighbors_for(self, positions):
+        # Генератор (article_id, соседи, оценки) для каждой позиции, блоками по block_size статей
+        norms = np.sqrt(np.asarray(self._matrix.sum(axis=0), dtype=np.float32).ravel())
+        norms[norms == 0] = 1
+        normalized = (self._matrix @ sparse.diags(1 / norms)).tocsr().astype(np.float32)
+        transposed = normalized.T.tocsr()
+
+        positions = np.asarray(positions, dtype=np.int64)
+        for start in range(0, len(positions), self.block_size):
+            block = positions[start:start + self.block_size]
+            similarity = (transposed[block] @ normalized).tocsr()
+            for n, position in enumerate(block):
+                cols = similarity.indices[similarity.indptr[n]:similarity.indptr[n + 1]]
+                scores = similarity.data[similarity.indptr[n]:similarity.indptr[n + 1]]
+                keep = cols != position
+                cols, scores = cols[keep], scores[keep]
+                if len(scores) > self.neighbors:
+                    top = np.argpartition(scores, -self.neighbors)[-self.neighbors:]
+                    cols, scores = cols[top], scores[top]
+                yield int(self._article_ids[position]), self._article_ids[cols], scores
@@ -0,0 +1,349 @@
+# Бенчмарки и диагностика запросов. В рабочий модуль не входят и запускаются отдельно:
+# `python -m scripts.bench --help`. Команды работают в контексте приложения с настройками из .env
+import io
+import time
+from datetime import datetime, timedelta
+
+import click
+import jwt
+from psycopg2.extras import RealDictCursor
+
+from app import (app, get_db_connection, article_list_query, generate_token, verify_token, recommend_article_ids,
+                 ARTICLE_SORT_MODES, DEFAULT_PAGE_LIMIT, NEARBY_DEFAULT_RADIUS, MEDIA_URL_PREFIX,
+                 RECOMMENDATION_DEFAULT_LIMIT)
+from compression import brotli, compress
+from json_provider import OrjsonProvider
+
+
+@click.group()
+@click.pass_context
+def cli(ctx):
+    ctx.with_resource(app.app_context())
+
+
+# Планы запросов списка статей для всех режимов сортировки: `python -m scripts.bench explain-articles`
+@cli.command('explain-articles')
+@click.option('--category', default='general', help='Категория для проверки фильтра')
+@click.option('--limit', default=DEFAULT_PAGE_LIMIT, help='Размер страницы')
+def explain_articles_command(category, limit):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        for sort in ARTICLE_SORT_MODES:
+            for current_category in (None, category):
+                sql, args = article_list_query(sort, current_category, None, limit)
+                cur.execute('EXPLAIN (ANALYZE, BUFFERS) ' + sql, args)
+                plan = '\n'.join(row[0] for row in cur.fetchall())
+                uses_index = 'Index Scan' in plan and 'Sort' not in plan and 'Seq Scan on articles' not in plan
+                print(f"== sort={sort} category={current_category or '*'} "
+                      f"{'OK' if uses_index else 'НЕТ ИНДЕКСА'}")
+                print(plan)
+    finally:
+        cur.close()
+        conn.close()
+
+
+# Микробенчмарк проверки токена: `python -m scripts.bench bench-auth`
+@cli.command('bench-auth')
+@click.option('--iterations', default=100000, help='Количество проверок')
+def bench_auth_command(iterations):
+    token = generate_token(1)
+    # Первая проверка подтягивает список отзыва из БД и кладет токен в кэш; список остается
+    # свежим AUTH_REVOCATION_REFRESH секунд, так что в замер попадает только сама проверка
+    verify_token(token)
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    decode_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        verify_token(token)
+    cached_time = time.perf_counter() - started
+
+    print(f'jwt.decode:          {decode_time / iterations * 1e6:.2f} мкс/запрос')
+    print(f'verify_token (кэш):  {cached_time / iterations * 1e6:.2f} мкс/запрос')
+    print(f'Ускорение: x{decode_time / cached_time:.1f}')
+
+
+# Нагрузочный тест: задержка чтения статей во время шквала логинов.
+# `python -m scripts.bench load-test-login --email user@example.com --password secret`
+@cli.command('load-test-login')
+@click.option('--email', required=True)
+@click.option('--password', required=True)
+@click.option('--logins', default=200, help='Всего логинов в шквале')
+@click.option('--concurrency', default=32, help='Параллельных логинов')
+@click.option('--reads', default=200, help='Чтений списка статей на замер')
+def load_test_login_command(email, password, logins, concurrency, reads):
+    from concurrent.futures import ThreadPoolExecutor
+
+    client = app.test_client()
+
+    def read_latencies():
+        latencies = []
+        for _ in range(reads):
+            started = time.perf_counter()
+            client.get('/api/articles?limit=20')
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        return latencies
+
+    def report(title, latencies):
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f'{title}: p50={p50:.1f} мс, p99={p99:.1f} мс')
+
+    def do_login(_):
+        return client.post('/api/login', json={'email': email, 'password': password}).status_code
+
+    report('Чтение без нагрузки', read_latencies())
+
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as executor:
+        storm = [executor.submit(do_login, i) for i in range(logins)]
+        report('Чтение во время шквала логинов', read_latencies())
+        statuses = [future.result() for future in storm]
+
+    print('Ответы на логины:', {status: statuses.count(status) for status in set(statuses)})
+
+
+# Бенчмарк поиска рядом: GiST-индекс против полного перебора с haversine.
+# Работает на временной таблице, реальные статьи не трогает: `python -m scripts.bench bench-nearby`
+@cli.command('bench-nearby')
+@click.option('--rows', default=1000000, help='Количество точек')
+@click.option('--radius', default=float(NEARBY_DEFAULT_RADIUS), help='Радиус, м')
+@click.option('--queries', default=20, help='Количество запросов на замер')
+def bench_nearby_command(rows, radius, queries):
+    import random
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        print(f'Генерация {rows} точек...')
+        cur.execute('''
+            CREATE TEMP TABLE bench_points AS
+            SELECT g AS id, 41 + random() * 15 AS location_lat, 30 + random() * 40 AS location_lng
+            FROM generate_series(1, %s) g
+        ''', (rows,))
+        cur.execute('CREATE INDEX ON bench_points USING GIST (ll_to_earth(location_lat, location_lng))')
+        cur.execute('ANALYZE bench_points')
+
+        points = [(41 + random.random() * 15, 30 + random.random() * 40) for _ in range(queries)]
+        variants = {
+            'GiST earth_box': '''
+                SELECT id FROM bench_points
+                WHERE earth_box(ll_to_earth(%(lat)s, %(lng)s), %(radius)s) @> ll_to_earth(location_lat, location_lng)
+                  AND earth_distance(ll_to_earth(%(lat)s, %(lng)s), ll_to_earth(location_lat, location_lng)) <= %(radius)s
+                ORDER BY earth_distance(ll_to_earth(%(lat)s, %(lng)s), ll_to_earth(location_lat, location_lng))
+                LIMIT 20
+            ''',
+            'Перебор haversine': '''
+                SELECT id FROM (
+                    SELECT id, 2 * 6371000 * asin(sqrt(
+                        power(sin(radians(location_lat - %(lat)s) / 2), 2) +
+                        cos(radians(%(lat)s)) * cos(radians(location_lat)) *
+                        power(sin(radians(location_lng - %(lng)s) / 2), 2)
+                    )) AS distance
+                    FROM bench_points
+                ) d
+                WHERE distance <= %(radius)s
+                ORDER BY distance
+                LIMIT 20
+            ''',
+        }
+        for name, sql in variants.items():
+            started = time.perf_counter()
+            for lat, lng in points:
+                cur.execute(sql, {'lat': lat, 'lng': lng, 'radius': radius})
+                cur.fetchall()
+            elapsed = (time.perf_counter() - started) / queries * 1000
+            print(f'{name}: {elapsed:.2f} мс/запрос')
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+# Бенчмарк сериализации и сжатия списка статей: `python -m scripts.bench bench-json --rows 10000`
+@cli.command('bench-json')
+@click.option('--rows', default=10000, help='Статей в списке')
+@click.option('--repeat', default=5, help='Повторов на замер')
+@click.option('--full', is_flag=True, help='Статьи целиком с content, а не краткое представление')
+def bench_json_command(rows, repeat, full):
+    from decimal import Decimal
+    from flask.json.provider import DefaultJSONProvider
+
+    now = datetime.utcnow()
+    articles = [{
+        'id': i,
+        'slug': f'article-{i}',
+        'title': f'Статья номер {i}',
+        'category': 'news',
+        'author_id': i % 100,
+        'author_name': f'user{i % 100}',
+        'excerpt': 'Текст анонса статьи ' * 10,
+        'reading_time': 3,
+        'photo': f'{MEDIA_URL_PREFIX}{i:064x}.jpg',
+        'location_lat': Decimal('55.755826'),
+        'location_lng': Decimal('37.617300'),
+        'views': i * 7,
+        'likes_count': i % 50,
+        'comments_count': i % 20,
+        'created_at': now - timedelta(minutes=i),
+        'updated_at': now - timedelta(minutes=i),
+        'version': i,
+        **({'content': 'Полный текст статьи. ' * 150} if full else {}),
+    } for i in range(rows)]
+
+    def measure(name, func):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print(f'{name:<32} {elapsed:8.1f} мс')
+        return result
+
+    # Было: копия dict(row) на каждую строку и json из стандартной библиотеки
+    default_provider = DefaultJSONProvider(app)
+    body = measure('dict(row) + DefaultJSONProvider', lambda: default_provider.response(
+        [dict(article) for article in articles]).get_data())
+    orjson_provider = OrjsonProvider(app)
+    body = measure('OrjsonProvider', lambda: orjson_provider.response(articles).get_data())
+
+    print(f'\nРазмер ответа: {len(body) / 1024:.0f} КБ')
+    levels = [('gzip', app.config['COMPRESS_GZIP_LEVEL'])]
+    if brotli is not None:
+        levels.append(('br', app.config['COMPRESS_BROTLI_QUALITY']))
+    for encoding, level in levels:
+        compressed = measure(f'{encoding} (уровень {level})', lambda: compress(body, encoding, level))
+        print(f'{"":<32} {len(compressed) / 1024:8.0f} КБ, x{len(body) / len(compressed):.1f}')
+
+
+# Пропускная способность синхронного и асинхронного режимов под высокой конкуренцией.
+# Оба сервера запускаются отдельно, например `python app.py` и `uvicorn asgi:app --port 8000`:
+# `python -m scripts.bench bench-serving --url http://127.0.0.1:5000 --url http://127.0.0.1:8000`
+@cli.command('bench-serving')
+@click.option('--url', 'urls', multiple=True, required=True, help='Адрес сервера, можно указать несколько')
+@click.option('--path', default='/api/articles?limit=20', help='Запрашиваемый путь')
+@click.option('--concurrency', default=256, help='Одновременных запросов')
+@click.option('--requests', 'total', default=10000, help='Всего запросов на сервер')
+def bench_serving_command(urls, path, concurrency, total):
+    import asyncio
+    from urllib.parse import urlsplit
+
+    async def get(host, port):
+        # Соединение на запрос: одинаковые условия для обоих серверов
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+            status_line = await reader.readline()
+            await reader.read()
+            return int(status_line.split()[1])
+        finally:
+            writer.close()
+
+    async def run(url):
+        parts = urlsplit(url)
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, statuses = [], {}
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    status = await get(parts.hostname, parts.port or 80)
+                except OSError:
+                    status = 'error'
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f'{url}: {total / elapsed:.0f} запр/с, p50={p50:.1f} мс, p99={p99:.1f} мс, ответы {statuses}')
+
+    for url in urls:
+        asyncio.run(run(url))
+
+
+# Бенчмарк рекомендаций на синтетических данных (по умолчанию 100k пользователей x 100k статей):
+# сборка индекса, догрузка новых лайков и выдача одному пользователю. Выдача замеряется тем же
+# RECOMMEND_SQL на временных таблицах likes, comments и article_neighbors: они перекрывают
+# настоящие только в этой сессии, которая в конце откатывается. `python -m scripts.bench bench-recommendations`
+@cli.command('bench-recommendations')
+@click.option('--users', default=100000, help='Пользователей')
+@click.option('--articles', default=100000, help='Статей')
+@click.option('--interactions', default=30, help='Взаимодействий на пользователя в среднем')
+@click.option('--queries', default=1000, help='Запросов выдачи на замер')
+def bench_recommendations_command(users, articles, interactions, queries):
+    import numpy as np
+    from recommendations import ItemSimilarityIndex
+
+    rng = np.random.default_rng(0)
+    total = users * interactions
+    # Популярность статей по закону Ципфа, как у настоящей ленты
+    user_ids = rng.integers(1, users + 1, total)
+    article_ids = rng.zipf(1.2, total) % articles + 1
+
+    index = ItemSimilarityIndex(neighbors=app.config['RECOMMENDATION_NEIGHBORS'])
+    started = time.perf_counter()
+    positions = index.build(user_ids, article_ids)
+    neighbors = list(index.neighbors_for(positions))
+    print(f'Полная сборка: {index.interactions} взаимодействий, {index.shape[1]} статей, '
+          f'{time.perf_counter() - started:.1f} с')
+
+    started = time.perf_counter()
+    dirty = index.add_interactions(rng.integers(1, users + 1, 1000), rng.zipf(1.2, 1000) % articles + 1)
+    sum(1 for _ in index.neighbors_for(dirty))
+    print(f'Догрузка 1000 лайков: пересчитано {len(dirty)} статей за {(time.perf_counter() - started) * 1000:.0f} мс')
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    try:
+        for table in ('likes', 'comments'):
+            cur.execute(f'''
+                CREATE TEMP TABLE {table} (
+                    id SERIAL PRIMARY KEY, user_id INTEGER, article_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        cur.execute('CREATE TEMP TABLE article_neighbors (article_id INTEGER, neighbor_id INTEGER, score REAL, '
+                    'PRIMARY KEY (article_id, neighbor_id))')
+
+        pairs = np.unique(np.stack([user_ids, article_ids], axis=1), axis=0)
+        buffer = io.StringIO()
+        buffer.writelines(f'{user_id}\t{article_id}\n' for user_id, article_id in pairs.tolist())
+        buffer.seek(0)
+        cur.copy_expert('COPY likes (user_id, article_id) FROM STDIN', buffer)
+        buffer = io.StringIO()
+        for article_id, neighbor_ids, scores in neighbors:
+            buffer.writelines(f'{article_id}\t{neighbor_id}\t{score:.6f}\n'
+                              for neighbor_id, score in zip(neighbor_ids.tolist(), scores.tolist()))
+        buffer.seek(0)
+        cur.copy_expert('COPY article_neighbors (article_id, neighbor_id, score) FROM STDIN', buffer)
+        cur.execute('CREATE UNIQUE INDEX ON likes (article_id, user_id)')
+        cur.execute('CREATE INDEX ON likes (user_id, created_at, id)')
+        cur.execute('CREATE INDEX ON comments (user_id, created_at, id)')
+        cur.execute('ANALYZE likes')
+        cur.execute('ANALYZE article_neighbors')
+
+        latencies = []
+        for user_id in rng.integers(1, users + 1, queries).tolist():
+            started = time.perf_counter()
+            recommend_article_ids(cur, user_id, RECOMMENDATION_DEFAULT_LIMIT)
+            latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        print(f'Выдача: p50={latencies[len(latencies) // 2]:.2f} мс, '
+              f'p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.2f} мс')
+    finally:
+        conn.rollback()
+        cur.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,73 @@
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import get_ai_workers, AI_JOB_FINISHED
+
+REQUESTS = 30
+DELAY = 0.5
+
+
+@pytest.fixture
+def ai(client, make_user, monkeypatch):
+    # FakeArticleGenerator (по умолчанию в Config) с задержкой, как у настоящей модели
+    monkeypatch.setattr(get_ai_workers().generator, 'delay', DELAY)
+    _, headers = make_user()
+
+    def generate(topic):
+        response = client.post('/api/ai/generate-article', headers=headers, json={'topic': topic})
+        return response.status_code, response.get_json()
+
+    def wait(job_id):
+        deadline = time.monotonic() + DELAY * 10 + 10
+        while time.monotonic() < deadline:
+            job = client.get(f'/api/ai/jobs/{job_id}', headers=headers).get_json()
+            if job['status'] in AI_JOB_FINISHED:
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f'задача {job_id} не завершилась')
+
+    return generate, wait
+
+
+def test_identical_requests_share_one_job_and_cache(ai):
+    generate, wait = ai
+    topic = f'ai-test-{secrets.token_hex(4)}'
+
+    with ThreadPoolExecutor(max_workers=REQUESTS) as executor:
+        responses = list(executor.map(generate, [topic] * REQUESTS))
+    assert {status for status, _ in responses} == {202}
+    job_ids = {body['job_id'] for _, body in responses}
+    assert len(job_ids) == 1
+
+    job = wait(job_ids.pop())
+    assert job['status'] == 'done' and topic in job['content']
+    status, cached = generate(topic)
+    assert status == 200 and cached['content'] == job['content']
+
+    status, other = generate(f'{topic} другая тема')
+    assert status == 202 and other['job_id'] != job['job_id']
+    assert wait(other['job_id'])['status'] == 'done'
+
+
+def test_cached_result_is_served_when_queue_is_full(ai):
+    generate, wait = ai
+    topic = f'ai-test-{secrets.token_hex(4)}'
+    _, body = generate(topic)
+    job = wait(body['job_id'])
+
+    workers = get_ai_workers()
+    reserved = 0
+    try:
+        while workers.stats()['pending'] < workers.queue_limit:
+            workers.reserve()
+            reserved += 1
+        status, cached = generate(topic)
+        assert status == 200 and cached['content'] == job['content']
+        status, _ = generate(f'{topic} другая тема')
+        assert status == 503
+    finally:
+        for _ in range(reserved):
+            workers.release()
@@ -0,0 +1,25 @@
+from app import article_summary
+
+
+def summary(content):
+    return article_summary(content)[0]
+
+
+def test_emphasis_is_removed_only_in_pairs():
+    assert summary('**Жирный**, *курсив*, __подчеркнутый__ и ~~зачеркнутый~~') == \
+        'Жирный, курсив, подчеркнутый и зачеркнутый'
+    assert summary('***Оба*** и **вложенный *курсив* внутри**') == 'Оба и вложенный курсив внутри'
+
+
+def test_intraword_underscores_and_asterisks_are_kept():
+    assert summary('snake_case_name and 2*3*4') == 'snake_case_name and 2*3*4'
+    assert summary('a * b * c') == 'a * b * c'
+
+
+def test_inline_code_keeps_its_text():
+    assert summary('Вызовите `article_summary()` или ``a ` b``') == 'Вызовите article_summary() или a ` b'
+
+
+def test_fenced_code_block_is_dropped():
+    content = 'Начало\n\n```python\nsecret_value = compute(1, 2)\n```\n\n~~~\nи это тоже\n~~~\nКонец'
+    assert summary(content) == 'Начало Конец'
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from app import app, get_db_connection, publish_event, EVENTS_CHANNEL
+from event_hub import EventHub
+
+SUBSCRIBERS = 1000
+EVENTS = 50
+
+
+def notify(payloads, commit=True):
+    # Вызывается из потока executor, где нет контекста приложения
+    with app.app_context():
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            for payload in payloads:
+                publish_event(cur, payload)
+            conn.commit() if commit else conn.rollback()
+        finally:
+            cur.close()
+
+
+def run_with_hub(check):
+    async def run():
+        hub = EventHub(EVENTS_CHANNEL, host=app.config['DB_HOST'], port=int(app.config['DB_PORT']),
+                       database=app.config['DB_NAME'], user=app.config['DB_USER'],
+                       password=app.config['DB_PASSWORD'])
+        await hub.start()
+        try:
+            await check(hub, asyncio.get_running_loop())
+        finally:
+            await hub.close()
+
+    asyncio.run(run())
+
+
+def test_committed_events_reach_feed_and_article_subscribers(database):
+    async def check(hub, loop):
+        feed = [hub.subscribe('feed') for _ in range(SUBSCRIBERS)]
+        article = hub.subscribe('article:test-events')
+        other = hub.subscribe('article:other')
+
+        await loop.run_in_executor(None, notify, [
+            {'type': 'like', 'slug': 'test-events', 'likes_count': i} for i in range(EVENTS)
+        ])
+        received = [await asyncio.wait_for(article.get(), 5) for _ in range(EVENTS)]
+
+        assert [json.loads(payload)['likes_count'] for payload in received] == list(range(EVENTS))
+        assert all(queue.qsize() == EVENTS for queue in feed)
+        assert other.empty()
+
+    run_with_hub(check)
+
+
+def test_rolled_back_events_are_not_delivered(database):
+    async def check(hub, loop):
+        feed = hub.subscribe('feed')
+        await loop.run_in_executor(None, notify, [{'type': 'like', 'slug': 'rolled-back'}], False)
+        # Следующее закоммиченное событие приходит первым: откаченное не было отправлено вовсе
+        await loop.run_in_executor(None, notify, [{'type': 'like', 'slug': 'committed'}])
+
+        assert json.loads(await asyncio.wait_for(feed.get(), 5))['slug'] == 'committed'
+        assert feed.empty()
+
+    run_with_hub(check)
@@ -0,0 +1,58 @@
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import app, get_like_buffer
+
+USERS = 30
+MAX_TAPS = 7
+CONCURRENCY = 16
+
+
+# Пользователи жмут лайк случайное число раз параллельно, в том числе одновременно с самими собой:
+# лайк должен остаться ровно у тех, чьих принятых нажатий нечетное число, и счетчики должны с этим сойтись
+@pytest.mark.parametrize('buffered', [False, True], ids=['direct', 'buffered'])
+def test_concurrent_taps_are_applied_exactly_once(client, db, make_user, monkeypatch, buffered):
+    monkeypatch.setitem(app.config, 'LIKE_BUFFER_ENABLED', buffered)
+    users = dict(make_user() for _ in range(USERS))
+    user_ids = list(users)
+
+    response = client.post('/api/articles', headers=users[user_ids[0]],
+                           json={'title': 'Проверка лайков', 'content': 'Проверка лайков'})
+    assert response.status_code == 201, response.get_json()
+    slug = response.get_json()['article']['slug']
+
+    taps = {user_id: random.randint(1, MAX_TAPS) for user_id in user_ids}
+    queue = [user_id for user_id, count in taps.items() for _ in range(count)]
+    random.shuffle(queue)
+
+    def tap(user_id):
+        return client.post(f'/api/articles/{slug}/like', headers=users[user_id]).status_code
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        statuses = list(executor.map(tap, queue))
+    # Нажатие, которое не прошло за LIKE_TOGGLE_ATTEMPTS попыток, отклоняется с 409 и ничего не меняет
+    assert set(statuses) <= {200, 409}
+    applied = Counter(user_id for user_id, status in zip(queue, statuses) if status == 200)
+    assert applied
+
+    if buffered:
+        get_like_buffer().flush()
+
+    expected = {user_id for user_id, count in applied.items() if count % 2}
+    cur = db.cursor()
+    cur.execute('SELECT l.user_id FROM likes l JOIN articles a ON a.id = l.article_id WHERE a.slug = %s', (slug,))
+    liked = [row[0] for row in cur.fetchall()]
+    cur.execute('SELECT likes_count FROM articles WHERE slug = %s', (slug,))
+    likes_count = cur.fetchone()[0]
+    cur.execute('SELECT user_id, likes_count FROM user_stats WHERE user_id = ANY(%s)', (user_ids,))
+    user_likes = dict(cur.fetchall())
+    db.commit()
+    cur.close()
+
+    assert len(liked) == len(set(liked)), 'дубликаты лайков'
+    assert set(liked) == expected
+    assert likes_count == len(expected)
+    assert all(user_likes.get(user_id, 0) == (user_id in expected) for user_id in user_ids)
@@ -0,0 +1,230 @@
+import atexit
+import os
+import threading
+
+from psycopg2.extras import execute_values
+
+
+class CounterBuffer:
+    # Копит приращения счетчиков в памяти и пишет их в БД пачками (write-behind).
+    # Наследник задает _write(cur, batch), где batch - {ключ: сумма приращений}
+    unit = 'counts'
+    thread_name = 'counter-buffer-flusher'
+
+    def __init__(self, get_connection, flush_interval=5.0, flush_threshold=1000):
+        self._get_connection = get_connection
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._pending_total = 0
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+        self._flushes = 0
+        self._flushed = 0
+        self._failures = 0
+
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def owned_by_current_process(self):
+        return self._pid == os.getpid()
+
+    def add(self, key, count=1):
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + count
+            self._pending_total += abs(count)
+            over_threshold = self._pending_total >= self.flush_threshold
+        if over_threshold:
+            self._wakeup.set()
+
+    def pending_for(self, key):
+        with self._lock:
+            return self._pending.get(key, 0)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Error flushing {self.unit}:', e)
+
+    def _write(self, cur, batch):
+        raise NotImplementedError
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._pending_total = 0
+            # Взаимно погасившиеся приращения писать незачем
+            batch = {key: count for key, count in batch.items() if count}
+            if not batch:
+                return 0
+
+            conn = self._get_connection()
+            try:
+                cur = conn.cursor()
+                self._write(cur, batch)
+                conn.commit()
+                cur.close()
+            except Exception:
+                conn.rollback()
+                # Не теряем приращения: возвращаем их в буфер до следующей попытки
+                with self._lock:
+                    for key, count in batch.items():
+                        self._pending[key] = self._pending.get(key, 0) + count
+                        self._pending_total += abs(count)
+                    self._failures += 1
+                raise
+            finally:
+                conn.close()
+
+            total = sum(abs(count) for count in batch.values())
+            with self._lock:
+                self._flushes += 1
+                self._flushed += total
+            return total
+
+    def close(self):
+        if self._stopped or not self.owned_by_current_process():
+            return
+        self._stopped = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f'Error flushing {self.unit} on shutdown:', e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                f'pending_{self.unit}': self._pending_total,
+                'pending_keys': len(self._pending),
+                'flushes': self._flushes,
+                f'flushed_{self.unit}': self._flushed,
+                'failures': self._failures,
+                'flush_interval': self.flush_interval,
+                'flush_threshold': self.flush_threshold,
+            }
+
+
+class ViewCounterBuffer(CounterBuffer):
+    # Просмотры статей, ключ - slug
+    unit = 'views'
+    thread_name = 'view-buffer-flusher'
+
+    def _write(self, cur, batch):
+        # Строки блокируются в порядке id: воркеры не дедлочат друг друга,
+        # а инкременты аддитивны, поэтому параллельные сбросы безопасны.
+        # Агрегаты аналитики авторов получают просмотры той же пачкой
+        execute_values(cur, '''
+            WITH v(slug, cnt) AS (VALUES %s),
+            locked AS (
+                SELECT a.id, v.cnt
+                FROM articles a
+                JOIN v ON a.slug = v.slug
+                ORDER BY a.id
+                FOR UPDATE OF a
+            ),
+            updated AS (
+                UPDATE articles a
+                SET views = COALESCE(a.views, 0) + locked.cnt
+                FROM locked
+                WHERE a.id = locked.id
+                RETURNING a.author_id, COALESCE(a.category, 'general') AS category, locked.cnt
+            ),
+            by_category AS (
+                INSERT INTO author_category_stats (author_id, category, views)
+                SELECT author_id, category, SUM(cnt) FROM updated
+                GROUP BY author_id, category
+                ORDER BY author_id, category
+                ON CONFLICT (author_id, category) DO UPDATE
+                SET views = author_category_stats.views + EXCLUDED.views
+            )
+            INSERT INTO author_weekly_stats (author_id, week, views)
+            SELECT author_id, date_trunc('week', CURRENT_DATE)::date, SUM(cnt) FROM updated
+            GROUP BY author_id
+            ORDER BY author_id
+            ON CONFLICT (author_id, week) DO UPDATE
+            SET views = author_weekly_stats.views + EXCLUDED.views
+        ''', sorted(batch.items()), template='(%s, %s::integer)')
+
+
+class LikeCounterBuffer(CounterBuffer):
+    # Счетчики лайков для горячих статей, ключ - (article_id, user_id).
+    # Сами строки likes пишутся сразу, копятся только денормализованные счетчики
+    unit = 'likes'
+    thread_name = 'like-buffer-flusher'
+
+    def __init__(self, get_connection, publish=None, **kwargs):
+        self._publish = publish
+        super().__init__(get_connection, **kwargs)
+
+    def pending_for_article(self, article_id):
+        with self._lock:
+            return sum(count for (pending_article_id, _), count in self._pending.items()
+                       if pending_article_id == article_id)
+
+    def _write(self, cur, batch):
+        rows = [(article_id, user_id, count) for (article_id, user_id), count in sorted(batch.items())]
+        # Статьи и пользователи блокируются в порядке id, как и при сбросе просмотров
+        updated = execute_values(cur, '''
+            WITH v(article_id, user_id, cnt) AS (VALUES %s),
+            by_user AS (
+                INSERT INTO user_stats (user_id, likes_count)
+                SELECT user_id, SUM(cnt) FROM v
+                GROUP BY user_id
+                ORDER BY user_id
+                ON CONFLICT (user_id) DO UPDATE
+                SET likes_count = user_stats.likes_count + EXCLUDED.likes_count
+            ),
+            by_article AS (
+                SELECT article_id, SUM(cnt) AS cnt FROM v GROUP BY article_id
+            ),
+            locked AS (
+                SELECT a.id, by_article.cnt
+                FROM articles a
+                JOIN by_article ON a.id = by_article.article_id
+                ORDER BY a.id
+                FOR UPDATE OF a
+            ),
+            updated AS (
+                UPDATE articles a
+                SET likes_count = a.likes_count + locked.cnt, version = nextval('article_version_seq'),
+                    changed_xid = txid_current()
+                FROM locked
+                WHERE a.id = locked.id
+                RETURNING a.id, a.slug, a.likes_count, a.author_id,
+                          COALESCE(a.category, 'general') AS category, locked.cnt
+            ),
+            by_category AS (
+                INSERT INTO author_category_stats (author_id, category, likes)
+                SELECT author_id, category, SUM(cnt) FROM updated
+                GROUP BY author_id, category
+                ORDER BY author_id, category
+                ON CONFLICT (author_id, category) DO UPDATE
+                SET likes = author_category_stats.likes + EXCLUDED.likes
+            ),
+            by_week AS (
+                INSERT INTO author_weekly_stats (author_id, week, likes)
+                SELECT author_id, date_trunc('week', CURRENT_DATE)::date, SUM(cnt) FROM updated
+                GROUP BY author_id
+                ORDER BY author_id
+                ON CONFLICT (author_id, week) DO UPDATE
+                SET likes = author_weekly_stats.likes + EXCLUDED.likes
+            )
+            SELECT id, slug, likes_count FROM updated
+        ''', rows, template='(%s::integer, %s::integer, %s::integer)', fetch=True)
+        if self._publish is not None:
+            # Одно событие на статью за сброс вместо события на каждый лайк
+            for article_id, slug, likes_count in updated:
+                self._publish(cur, {'type': 'like', 'slug': slug, 'article_id': article_id,
+                                    'likes_count': likes_count})